@@ -1,7 +1,7 @@
 """ Module to describe a cohort of patients. """
 
 from tableone import TableOne
-import MySQLdb.cursors
+import pymysql.cursors
 import pandas as pd
 import numpy as np
 from tabulate import tabulate
@@ -80,16 +80,13 @@ def describe_phenotype(phenotype: str) -> str:
     GROUP BY field_id_label;
     """
 
-    Database = UKBDatabase(cursorclass=MySQLdb.cursors.DictCursor)
     args = [phenotype]
 
-    try:
+    with UKBDatabase(cursorclass=pymysql.cursors.DictCursor, pooled=True) as Database:
         data_by_field = Database.query(sql_report_by_field, args).fetchall()
         data_by_category = Database.query(sql_report_by_category, args).fetchall()
         data_count_pheno = Database.query(sql_count_pheno, args).fetchall()[0]['n']
         data_count_pheno_first = Database.query(sql_count_pheno_first, args).fetchall()[0]['n']
-    except Exception as e:
-        raise
 
     report_by_field = tabulate(
         data_by_field,
@@ -139,13 +136,9 @@ def describe_cohort(eids: list) -> str:
     table one summary (str)
     """
 
-    Database = UKBDatabase(cursorclass=MySQLdb.cursors.DictCursor)
-
     # TODO: move columns to fetch in a config file?
-    try:
+    with UKBDatabase(cursorclass=pymysql.cursors.DictCursor, pooled=True) as Database:
         cohort_data = Database.get_patient_cohort(eids)
-    except Exception:
-        raise
 
     df_cohort = pd.DataFrame(cohort_data)
 
@@ -2,6 +2,9 @@
 Module for manipulating the phenotype catalogue.
 """
 
+import hashlib
+import logging
+import pickle
 import pkg_resources
 import pandas as pd
 import os
@@ -13,7 +16,7 @@ except ImportError:
     from yaml import Loader, Dumper
 
 from pomegranate.phenotype_config import METADATA_FIELDS, METADATA_OPTIONAL_FIELDS
-from pomegranate.phenotype import Phenotype
+from pomegranate.phenotype import get_phenotype
 
 # Turn of YAML aliases in PyYAML which forces
 # the Dumper to avoid referencing and this way
@@ -22,6 +25,19 @@ from pomegranate.phenotype import Phenotype
 # https://stackoverflow.com/questions/13518819/avoid-references-in-pyyaml
 Dumper.ignore_aliases = lambda *args: True
 
+PHENOTYPES_DIR = "data/phenotypes/ukbiobank/"
+SNAPSHOT_FILE = "ukbiobank_catalogue.pkl"
+SNAPSHOT_VERSION = 1
+
+# The snapshot is written to a per-user cache directory rather
+# than the package, which may be installed read-only.
+CACHE_DIR = os.getenv(
+    "POMEGRANATE_CACHE_DIR",
+    os.path.join(
+        os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "pomegranate"
+    ),
+)
+
 
 class Catalogue:
     """
@@ -33,30 +49,20 @@ class Catalogue:
         Creates a new instance of the class.
         """
 
-        # During init, the catalogue loops through all YAML files and
-        # loads then in an internal data structure.
+        # During init, the catalogue loads the precompiled snapshot
+        # if it exists and matches the YAML files, otherwise it loops
+        # through all YAML files and loads them in an internal data
+        # structure.
 
-        all_phenotypes = [
-            os.path.splitext(f)[0]
-            for f in pkg_resources.resource_listdir(
-                "pomegranate", "data/phenotypes/ukbiobank/"
-            )
-            if f.endswith(".yaml")
-        ]
+        rows = load_snapshot()
+        if rows is None:
+            rows = read_catalogue_rows()
 
-        df = pd.DataFrame(columns=list(METADATA_FIELDS.keys()))
-        for p in all_phenotypes:
-            phenotype = Phenotype(p)
-            metadata = phenotype.metadata
-            row = {}
-            for k in METADATA_FIELDS.keys():
-                row[k] = [metadata[k]]
-            for k in METADATA_OPTIONAL_FIELDS.keys():
-                try:
-                    row[k] = [metadata[k]]
-                except KeyError:
-                    row[k] = None
-            df = pd.concat([df, pd.DataFrame.from_dict(row)], ignore_index=True)
+        df = pd.DataFrame(
+            rows,
+            columns=list(METADATA_FIELDS.keys()) + list(METADATA_OPTIONAL_FIELDS.keys()),
+            dtype=object,
+        )
 
         self._data = df
 
@@ -153,3 +159,138 @@ class Catalogue:
         return list(
             self._data[~self._data["complex_logic"].isna()]["variable_name"].values
         )
+
+    def get_field_ids(self) -> set:
+        """
+        Returns the set of UK Biobank field ids used by the
+        phenotype definitions, including the fields of their
+        time qualifiers.
+        """
+
+        field_ids = set()
+        for phenotype in self._data["variable_name"].values:
+            definitions = get_phenotype(phenotype).definitions or {}
+            for field_id, definition in definitions.items():
+                field_ids.add(int(field_id))
+                qualifier = (definition.get("metadata") or {}).get("time_qualifier")
+                if qualifier and qualifier.get("field_id") is not None:
+                    field_ids.add(int(qualifier["field_id"]))
+
+        return field_ids
+
+
+def get_phenotype_files() -> list:
+    """
+    Returns a sorted list of the phenotype YAML file names.
+    """
+
+    return sorted(
+        f
+        for f in pkg_resources.resource_listdir("pomegranate", PHENOTYPES_DIR)
+        if f.endswith(".yaml")
+    )
+
+
+def get_catalogue_hash() -> str:
+    """
+    Returns a SHA-256 digest of the names and contents
+    of all phenotype YAML files.
+    """
+
+    digest = hashlib.sha256()
+    for f in get_phenotype_files():
+        digest.update(f.encode("utf-8") + b"\0")
+        digest.update(pkg_resources.resource_string("pomegranate", PHENOTYPES_DIR + f))
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+def read_catalogue_rows() -> list:
+    """
+    Returns a list of dicts with the metadata of
+    every phenotype, read from the YAML files.
+    """
+
+    rows = []
+    for f in get_phenotype_files():
+        metadata = get_phenotype(os.path.splitext(f)[0], metadata_only=True).metadata
+        row = {k: metadata[k] for k in METADATA_FIELDS.keys()}
+        for k in METADATA_OPTIONAL_FIELDS.keys():
+            row[k] = metadata.get(k)
+        rows.append(row)
+
+    return rows
+
+
+def get_snapshot_file() -> str:
+    """
+    Returns the default path of the catalogue snapshot, in
+    CACHE_DIR (set with the POMEGRANATE_CACHE_DIR variable).
+    """
+
+    return os.path.join(CACHE_DIR, SNAPSHOT_FILE)
+
+
+def build_snapshot(output_file: str = None) -> str:
+    """
+    Compiles the metadata of all phenotypes into a single
+    pickle file, together with the hash of the YAML files
+    it was built from.
+
+    Arguments
+    ---------
+
+    output_file (str) : path of the snapshot, defaults to
+                        `get_snapshot_file()`
+
+    Returns
+    -------
+
+    path of the snapshot (str)
+    """
+
+    if output_file is None:
+        output_file = get_snapshot_file()
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "hash": get_catalogue_hash(),
+        "rows": read_catalogue_rows(),
+    }
+
+    with open(output_file, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return output_file
+
+
+def load_snapshot(snapshot_file: str = None):
+    """
+    Returns the catalogue rows stored in the snapshot, or None
+    if the snapshot is missing, unreadable or was built from
+    different YAML files.
+    """
+
+    if snapshot_file is None:
+        snapshot_file = get_snapshot_file()
+
+    try:
+        with open(snapshot_file, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Unable to read catalogue snapshot {snapshot_file}: {e}")
+        return None
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        logging.info("Catalogue snapshot version mismatch, reading YAML files.")
+        return None
+
+    if snapshot.get("hash") != get_catalogue_hash():
+        logging.info("Catalogue snapshot is stale, reading YAML files.")
+        return None
+
+    return snapshot["rows"]
@@ -0,0 +1,35 @@
+"""
+Script to compile all phenotype YAML definitions into the
+catalogue snapshot loaded by `Catalogue`.
+
+Run after adding or editing phenotype definitions:
+build_catalogue
+Or to write the snapshot elsewhere:
+build_catalogue -o /tmp/ukbiobank_catalogue.pkl
+"""
+
+import argparse
+import logging
+
+from pomegranate.catalogue import build_snapshot
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%m-%d-%Y %H:%M",
+    )
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-o", "--output", help="Snapshot file (default: in the user cache directory)", required=False
+    )
+    args = argparser.parse_args()
+
+    output_file = build_snapshot(args.output)
+    logging.info(f"Catalogue snapshot written to {output_file}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Script to export tables to partitioned Parquet datasets
+for local reads (see pomegranate.db.columnar).
+
+Run like export_parquet -o /data/ukb_parquet
+Or for specific tables:
+export_parquet -o /data/ukb_parquet -t phenotype_first baseline_cohort
+"""
+
+import argparse
+import logging
+
+from pomegranate.db.columnar import EXPORT_TABLES, export_table
+from pomegranate.db.ukbdb import UKBDatabase
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%m-%d-%Y %H:%M",
+    )
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("-o", "--output", help="Export directory", required=True)
+    argparser.add_argument(
+        "-t",
+        "--tables",
+        nargs="+",
+        choices=list(EXPORT_TABLES.keys()),
+        default=list(EXPORT_TABLES.keys()),
+        help="Tables to export (default: all)",
+        required=False,
+    )
+    argparser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=500000,
+        required=False,
+        help="Number of rows fetched from the database at a time.",
+    )
+
+    args = argparser.parse_args()
+
+    with UKBDatabase() as db:
+        for table in args.tables:
+            export_table(db, table, args.output, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
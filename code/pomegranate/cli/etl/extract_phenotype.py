@@ -4,18 +4,40 @@ and store the data in the database for further processing.
 
 Run like extract_phenotype -p COPD
 Or to recalculate: extract_phenotype -p COPD --refresh
+Or to extract the whole catalogue streaming each source table once:
+extract_phenotype --batch
+Or to extract the whole catalogue using 8 concurrent connections:
+extract_phenotype --workers 8
+Or to re-extract only fields whose definition or source tables changed:
+extract_phenotype --incremental
+Or to re-extract only participants changed by a delta-ingested release:
+extract_phenotype --release 2024-06
+Or to extract from a local DuckDB database instead of MySQL:
+extract_phenotype --duckdb ukb.duckdb
+Or to read baseline fields from the typed baseline_typed table:
+extract_phenotype --typed-baseline
+Or to look up birth and assessment dates in participant_constants:
+extract_phenotype --participant-constants
 """
 
 import argparse
+import multiprocessing
 
+from pomegranate.db.duckdb_backend import DuckDBDatabase
 from pomegranate.db.ukbdb import UKBDatabase
-from pomegranate.phenotype import Phenotype
+from pomegranate.db.batch_extract import BatchExtractor, BATCH_FIELDS
+from pomegranate.db.db_config import FIELD_SOURCE_TABLES
+from pomegranate.db.delta import create_changed_eids_table, get_changed_tables
+from pomegranate.phenotype import Phenotype, get_phenotype
 
 import pomegranate.catalogue
 import logging
 
 PRESCRIPTIONS = 42039
 
+# Database connection held by each extraction worker process.
+_worker_db = None
+
 
 def field_to_function(phenotype: Phenotype, f, db: UKBDatabase):
     kwargs = {}
@@ -61,12 +83,29 @@ def process_already_extracted(
     return skip_extracted
 
 
+def get_extraction_state(phenotype: Phenotype, field_id, db: UKBDatabase) -> tuple:
+    """
+    Returns a (up_to_date, definition_hash, source_version) tuple for
+    a phenotype / field, where up_to_date is True if neither the field
+    definition nor its source tables changed since it was last recorded
+    in the extraction manifest.
+    """
+
+    definition_hash = phenotype.get_field_hash(field_id)
+    source_version = db.get_source_version(field_id)
+    entry = db.get_manifest_entry(phenotype.name, field_id)
+
+    return entry == (definition_hash, source_version), definition_hash, source_version
+
+
 def extract_phenotypes(
     phenotypes_to_process: list[str],
     db: UKBDatabase,
     fields=None,
     refresh: bool = False,
     testing: bool = True,
+    stream: bool = False,
+    incremental: bool = False,
 ):
     """
     Extract phenotypes in list `phenotypes_to_process` from database `db`.
@@ -79,13 +118,23 @@ def extract_phenotypes(
         if individual field: extract that field
     refresh (bool): if True, update phenotype table with recalculated phenotypes
     testing (bool): if True, do not write to or delete tables. Instead return recalculated entries.
+    stream (bool): if True (and testing), return the entries as an iterator which fetches
+        them from the database as it is consumed, instead of a tuple.
+    incremental (bool): if True, only (re-)extract fields whose definition or source
+        tables changed since they were recorded in the extraction manifest.
+
+    Returns the recalculated entries if testing, otherwise a dict
+    {(phenotype, field): n} with the number of data points added.
     """
 
     insert = not testing
     if testing:
-        dfs = ()
+        dfs = []
+    else:
+        db.create_extraction_manifest()
+    counts = {}
     for phenotype_name in phenotypes_to_process:
-        phenotype = Phenotype(phenotype_name)
+        phenotype = get_phenotype(phenotype_name)
 
         if phenotype.is_complex:
             logging.info(f"Skipping complex phenotype: {phenotype_name}")
@@ -124,7 +173,15 @@ def extract_phenotypes(
 
             # Get already processed fields (and delete if refreshing) if not testing
             if not testing:
-                already_extracted = process_already_extracted(phenotype, f, db, refresh)
+                up_to_date, definition_hash, source_version = get_extraction_state(
+                    phenotype, f, db
+                )
+                if incremental and up_to_date and not refresh:
+                    logging.info(f"{phenotype_name} : {f} : skip : up to date.")
+                    continue
+                already_extracted = process_already_extracted(
+                    phenotype, f, db, refresh or incremental
+                )
                 if already_extracted:
                     continue
 
@@ -133,20 +190,359 @@ def extract_phenotypes(
             n = extraction_func(
                 phenotype=phenotype_name,
                 insert=insert,
+                stream=stream,
                 **kwargs,
             )
             if insert:
                 logging.info(
                     f"{phenotype_name} : {f} : extract : added {n} data points."
                 )
+                counts[(phenotype_name, f)] = n
+                db.update_manifest(
+                    phenotype_name, f, definition_hash, source_version, n
+                )
+            elif stream:
+                dfs.append(n)
             else:
                 logging.info(
                     f"Testing {phenotype_name} : {f} : extract : found {len(n)} data points."
                 )
-                dfs += n
+                dfs.append(n)
         logging.info(f"Extraction finished for phenotype {phenotype_name}")
     if testing:
-        return dfs
+        return UKBDatabase.combine_results(dfs, stream=stream)
+    return counts
+
+
+def extract_phenotypes_batch(
+    phenotypes_to_process: list[str],
+    db: UKBDatabase,
+    fields=None,
+    refresh: bool = False,
+    testing: bool = True,
+    incremental: bool = False,
+):
+    """
+    Extract phenotypes in list `phenotypes_to_process` from database `db`,
+    streaming each source table once for all phenotypes.
+
+    Fields which the batch extractor does not support (e.g. non-standard
+    baseline fields, biomarkers) are extracted one at a time using
+    `extract_phenotypes`. Arguments and return values are as in
+    `extract_phenotypes`.
+    """
+
+    insert = not testing
+    if testing:
+        dfs = []
+    else:
+        db.create_extraction_manifest()
+
+    batch = BatchExtractor(db)
+    fallback = {}
+    manifest = {}
+    for phenotype_name in phenotypes_to_process:
+        phenotype = get_phenotype(phenotype_name)
+
+        if phenotype.is_complex:
+            logging.info(f"Skipping complex phenotype: {phenotype_name}")
+            continue
+
+        phenotype_definition_fields = phenotype.get_definition_fields()
+        if fields and isinstance(fields, list):
+            fields_to_process = fields
+        elif fields and not isinstance(fields, list):
+            fields_to_process = [fields]
+        else:
+            fields_to_process = phenotype_definition_fields
+
+        for f in fields_to_process:
+            # Skip undefined fields
+            if f not in phenotype_definition_fields:
+                logging.info(
+                    f"{phenotype_name} : {f} : skip, field not defined for phenotype."
+                )
+                continue
+
+            if f not in BATCH_FIELDS or (f == 42040 and phenotype.is_biomarker):
+                fallback.setdefault(phenotype_name, []).append(f)
+                continue
+
+            # Validate fields
+            if phenotype.get_field_definition(f) is None:
+                logging.info(f"{phenotype_name} : {f} : skip, invalid field")
+                continue
+
+            if not testing:
+                up_to_date, definition_hash, source_version = get_extraction_state(
+                    phenotype, f, db
+                )
+                if incremental and up_to_date and not refresh:
+                    logging.info(f"{phenotype_name} : {f} : skip : up to date.")
+                    continue
+                already_extracted = process_already_extracted(
+                    phenotype, f, db, refresh or incremental
+                )
+                if already_extracted:
+                    continue
+                manifest[(phenotype_name, f)] = (definition_hash, source_version)
+
+            batch.add(phenotype, f)
+
+    n = batch.extract(insert=insert)
+    if insert:
+        for (phenotype_name, f), count in sorted(n.items()):
+            logging.info(
+                f"{phenotype_name} : {f} : extract : added {count} data points."
+            )
+        for (phenotype_name, f), (definition_hash, source_version) in manifest.items():
+            count = n.get((phenotype_name, f), 0)
+            db.update_manifest(phenotype_name, f, definition_hash, source_version, count)
+        counts = n
+    else:
+        logging.info(f"Testing batch : extract : found {len(n)} data points.")
+        dfs.append(n)
+
+    for phenotype_name, phenotype_fields in fallback.items():
+        n = extract_phenotypes(
+            [phenotype_name],
+            db,
+            phenotype_fields,
+            refresh,
+            testing,
+            incremental=incremental,
+        )
+        if testing:
+            dfs.append(n)
+        else:
+            counts.update(n)
+
+    if testing:
+        return UKBDatabase.combine_results(dfs)
+    return counts
+
+
+def extract_phenotypes_delta(
+    phenotypes_to_process: list[str],
+    db: UKBDatabase,
+    release: str,
+    fields=None,
+):
+    """
+    Re-extract phenotypes in list `phenotypes_to_process` for the
+    participants whose source records were changed by the
+    delta-ingested `release` (see `pomegranate.db.delta`).
+
+    Only fields read from a changed table are processed and their
+    data points are replaced for the affected participants only.
+    This requires the field definition to be unchanged since it was
+    last extracted; other fields are skipped with a warning and
+    should be re-extracted with `incremental`.
+
+    Returns a dict {(phenotype, field): n} with the number of data points added.
+    """
+
+    if fields and not isinstance(fields, list):
+        fields = [fields]
+
+    db.create_extraction_manifest()
+    changed_tables = get_changed_tables(db, release)
+    n = create_changed_eids_table(db, release, "changed_eids")
+    logging.info(f"Release {release} : {n} participants changed in {changed_tables}.")
+
+    counts = {}
+    db.set_eid_scope("changed_eids")
+    try:
+        for phenotype_name in phenotypes_to_process:
+            phenotype = get_phenotype(phenotype_name)
+
+            if phenotype.is_complex:
+                logging.info(f"Skipping complex phenotype: {phenotype_name}")
+                continue
+
+            phenotype_definition_fields = phenotype.get_definition_fields()
+            for f in fields or phenotype_definition_fields:
+                if f in ["SNOMED-CT", PRESCRIPTIONS]:
+                    continue
+                if f not in phenotype_definition_fields:
+                    continue
+                if not set(FIELD_SOURCE_TABLES.get(f, ["baseline"])) & set(changed_tables):
+                    continue
+
+                definition_hash = phenotype.get_field_hash(f)
+                entry = db.get_manifest_entry(phenotype_name, f)
+                if entry is None or entry[0] != definition_hash:
+                    logging.warning(
+                        f"{phenotype_name} : {f} : skip : definition changed since "
+                        "last extraction, re-extract with --incremental."
+                    )
+                    continue
+
+                source_version = db.get_source_version(f)
+                deleted = db.delete_phenotype_entries_by_field(
+                    phenotype_name, f, eid_table="changed_eids"
+                )
+                extraction_func, kwargs = field_to_function(phenotype, f, db)
+                n = extraction_func(phenotype=phenotype_name, insert=True, **kwargs)
+                logging.info(
+                    f"{phenotype_name} : {f} : delta : deleted {deleted}, "
+                    f"added {n} data points."
+                )
+                counts[(phenotype_name, f)] = n
+
+                total = db.count_phenotype_entries_by_field(phenotype_name, f)
+                db.update_manifest(
+                    phenotype_name, f, definition_hash, source_version, total
+                )
+    finally:
+        db.set_eid_scope(None)
+
+    return counts
+
+
+class _RecordCollector(logging.Handler):
+    """
+    Collects the log records of a worker so the parent process
+    can emit them in order.
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        # Records are sent back to the parent so they need to be picklable.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
+def _init_worker(db_config: dict):
+    """
+    Internal function, do not use directly.
+
+    Opens the database connection of a worker process.
+    """
+
+    global _worker_db
+
+    # Log records are collected per unit and emitted by the parent.
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.INFO)
+
+    _worker_db = UKBDatabase(**db_config)
+
+
+def _extract_unit(unit: tuple) -> tuple:
+    """
+    Internal function, do not use directly.
+
+    Extracts a single (phenotype, field) unit in a worker process,
+    retrying on failure. Retries always re-extract the unit from
+    scratch so that rows inserted by a failed attempt are not kept.
+    """
+
+    phenotype_name, f, refresh, testing, incremental, retries = unit
+
+    collector = _RecordCollector()
+    logging.getLogger().addHandler(collector)
+    result, error = (() if testing else {}), None
+    try:
+        for attempt in range(retries + 1):
+            try:
+                if not _worker_db.is_connected():
+                    _worker_db.connect()
+                result = extract_phenotypes(
+                    [phenotype_name],
+                    _worker_db,
+                    [f],
+                    refresh or attempt > 0,
+                    testing,
+                    incremental=incremental,
+                )
+                error = None
+                break
+            except Exception as e:
+                error = repr(e)
+                logging.warning(
+                    f"{phenotype_name} : {f} : attempt {attempt + 1} failed : {error}"
+                )
+    finally:
+        logging.getLogger().removeHandler(collector)
+
+    return phenotype_name, f, result, error, collector.records
+
+
+def extract_phenotypes_parallel(
+    phenotypes_to_process: list[str],
+    db: UKBDatabase,
+    fields=None,
+    refresh: bool = False,
+    testing: bool = True,
+    workers: int = 4,
+    retries: int = 2,
+    incremental: bool = False,
+):
+    """
+    Extract phenotypes in list `phenotypes_to_process` using a pool of
+    `workers` processes, each holding its own database connection.
+
+    Work is sharded into (phenotype, field) units. Log messages of each
+    unit are emitted in submission order, failed units are retried up
+    to `retries` times and a summary is logged at the end. Other
+    arguments and return values are as in `extract_phenotypes`.
+    """
+
+    if fields and not isinstance(fields, list):
+        fields = [fields]
+
+    units = []
+    for phenotype_name in phenotypes_to_process:
+        phenotype = get_phenotype(phenotype_name)
+        if phenotype.is_complex:
+            logging.info(f"Skipping complex phenotype: {phenotype_name}")
+            continue
+        for f in fields or phenotype.get_definition_fields():
+            units.append((phenotype_name, f, refresh, testing, incremental, retries))
+
+    logging.info(f"Extracting {len(units)} units using {workers} workers.")
+
+    if not testing:
+        db.create_extraction_manifest()
+
+    dfs = []
+    counts = {}
+    failed = []
+    with multiprocessing.Pool(
+        workers, initializer=_init_worker, initargs=(db.get_config(),)
+    ) as pool:
+        for phenotype_name, f, result, error, records in pool.imap(_extract_unit, units):
+            for record in records:
+                logging.getLogger().handle(record)
+            if error is not None:
+                failed.append((phenotype_name, f, error))
+            elif testing:
+                dfs.append(result)
+            else:
+                counts.update(result)
+
+    logging.info("Summary:")
+    for (phenotype_name, f), n in sorted(counts.items()):
+        logging.info(f"{phenotype_name} : {f} : {n} data points.")
+    logging.info(
+        f"Added {sum(counts.values())} data points for {len(counts)} units."
+    )
+    for phenotype_name, f, error in failed:
+        logging.error(f"{phenotype_name} : {f} : failed : {error}")
+
+    if testing:
+        return UKBDatabase.combine_results(dfs)
+    return counts
 
 
 def main():
@@ -173,8 +569,48 @@ def main():
         required=False,
         help="In testing mode tables aren't altered and returns df of entries.",
     )
-    # TODO: Add a bit that updates all tables based on removed eids. Specifically, weird things will happen if
-    # baseline, hesin, hesin_diag, gp_clinical are not updated
+    argparser.add_argument(
+        "--batch",
+        action="store_true",
+        required=False,
+        help="Extracts all phenotypes streaming each source table once.",
+    )
+    argparser.add_argument(
+        "--incremental",
+        action="store_true",
+        required=False,
+        help="Only re-extracts fields whose definition or source tables changed.",
+    )
+    argparser.add_argument(
+        "--release",
+        required=False,
+        help="Only re-extracts participants changed by this delta-ingested release.",
+    )
+    argparser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        required=False,
+        help="Number of worker processes, each using its own connection.",
+    )
+    argparser.add_argument(
+        "--duckdb",
+        required=False,
+        help="Extracts from this DuckDB database file (see load_duckdb) instead of MySQL.",
+    )
+    argparser.add_argument(
+        "--typed-baseline",
+        action="store_true",
+        required=False,
+        help="Reads baseline fields from baseline_typed (see rebuild_tables).",
+    )
+    argparser.add_argument(
+        "--participant-constants",
+        action="store_true",
+        required=False,
+        help="Looks up birth and assessment dates in participant_constants (see rebuild_tables).",
+    )
+    # Withdrawn participants are removed from all tables with purge_participants.
 
     args = argparser.parse_args()
     if args.testing and args.refresh:
@@ -184,7 +620,26 @@ def main():
         """
         logging.error(msg)
 
-    db = UKBDatabase()
+    if args.batch and args.workers > 1:
+        argparser.error("--batch and --workers cannot be combined.")
+
+    if args.release and (args.batch or args.workers > 1 or args.testing):
+        argparser.error("--release cannot be combined with --batch, --workers or --testing.")
+
+    if args.duckdb and (args.workers > 1 or args.release):
+        argparser.error("--duckdb cannot be combined with --workers or --release.")
+
+    if args.duckdb:
+        db = DuckDBDatabase(
+            args.duckdb,
+            typed_baseline=args.typed_baseline,
+            participant_constants=args.participant_constants,
+        )
+    else:
+        db = UKBDatabase(
+            typed_baseline=args.typed_baseline,
+            participant_constants=args.participant_constants,
+        )
 
     # Get phenotypes to process:
     phenotypes_to_process = []
@@ -197,9 +652,43 @@ def main():
         phenotypes_to_process = c.get_all_phenotypes().variable_name.values
 
     # Process phenotypes:
-    extract_phenotypes(
-        phenotypes_to_process, db, args.fields, args.refresh, args.testing
-    )
+    if args.release:
+        extract_phenotypes_delta(phenotypes_to_process, db, args.release, args.fields)
+    elif args.batch:
+        extract_phenotypes_batch(
+            phenotypes_to_process,
+            db,
+            args.fields,
+            args.refresh,
+            args.testing,
+            incremental=args.incremental,
+        )
+    elif args.workers > 1:
+        extract_phenotypes_parallel(
+            phenotypes_to_process,
+            db,
+            args.fields,
+            args.refresh,
+            args.testing,
+            workers=args.workers,
+            incremental=args.incremental,
+        )
+    elif args.testing:
+        # Entries are streamed from the server and only counted.
+        entries = extract_phenotypes(
+            phenotypes_to_process, db, args.fields, testing=True, stream=True
+        )
+        n = sum(1 for _ in entries)
+        logging.info(f"Testing : extract : found {n} data points.")
+    else:
+        extract_phenotypes(
+            phenotypes_to_process,
+            db,
+            args.fields,
+            args.refresh,
+            args.testing,
+            incremental=args.incremental,
+        )
     if not args.testing:
         db.commit()
 
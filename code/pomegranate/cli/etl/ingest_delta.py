@@ -0,0 +1,74 @@
+"""
+Script to refresh source tables from a new UK Biobank release
+by applying only the differences to the loaded tables.
+
+Create empty staging tables to load the new release into:
+ingest_delta --prepare
+Load and post-process e.g. hesin_diag_staging like hesin_diag, then
+apply the differences, recording them under the release name:
+ingest_delta --release 2024-06
+Re-extract phenotypes for the affected participants only:
+extract_phenotype --release 2024-06
+"""
+
+import argparse
+import logging
+
+from pomegranate.db.db_config import DELTA_TABLE_KEYS
+from pomegranate.db.delta import apply_delta, create_staging_table
+from pomegranate.db.ukbdb import UKBDatabase
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%m-%d-%Y %H:%M",
+    )
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-t",
+        "--tables",
+        nargs="+",
+        choices=list(DELTA_TABLE_KEYS.keys()),
+        help="Tables to refresh (default: all)",
+        required=False,
+    )
+    argparser.add_argument(
+        "--prepare",
+        action="store_true",
+        required=False,
+        help="Creates empty staging tables to load the new release into.",
+    )
+    argparser.add_argument(
+        "--release", help="Release name recorded in the change log", required=False
+    )
+    argparser.add_argument(
+        "--keep-staging",
+        action="store_true",
+        required=False,
+        help="Keeps the staging tables after applying the differences.",
+    )
+
+    args = argparser.parse_args()
+    if args.prepare == (args.release is not None):
+        argparser.error("Specify exactly one of --prepare and --release.")
+
+    tables = args.tables or list(DELTA_TABLE_KEYS.keys())
+
+    with UKBDatabase() as db:
+        if args.prepare:
+            for table in tables:
+                create_staging_table(db, table)
+                logging.info(f"Created staging table for {table}.")
+        else:
+            counts = apply_delta(
+                db, args.release, tables, drop_staging=not args.keep_staging
+            )
+            for table, (inserted, deleted) in counts.items():
+                logging.info(f"{table} : {inserted} inserted, {deleted} deleted.")
+
+
+if __name__ == "__main__":
+    main()
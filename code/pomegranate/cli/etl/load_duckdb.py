@@ -0,0 +1,48 @@
+"""
+Script to load the raw UK Biobank exports into a DuckDB
+database file, for extracting phenotypes without a MySQL
+server (see pomegranate.db.duckdb_backend).
+
+Run like load_duckdb -i /data/ukb_raw -o ukb.duckdb
+Or for specific tables:
+load_duckdb -i /data/ukb_raw -o ukb.duckdb -t hesin hesin_diag
+"""
+
+import argparse
+import logging
+
+from pomegranate.db.duckdb_backend import RAW_FILES, DuckDBDatabase, load_raw_tables
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%m-%d-%Y %H:%M",
+    )
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-i", "--input", help="Directory with the raw exports", required=True
+    )
+    argparser.add_argument("-o", "--output", help="DuckDB database file", required=True)
+    argparser.add_argument(
+        "-t",
+        "--tables",
+        nargs="+",
+        choices=list(RAW_FILES.keys()),
+        help="Tables to load (default: all files found)",
+        required=False,
+    )
+
+    args = argparser.parse_args()
+
+    with DuckDBDatabase(args.output) as db:
+        counts = load_raw_tables(db, args.input, args.tables)
+
+    for table, n in counts.items():
+        logging.info(f"{table} : {n} rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Script to load the raw UK Biobank exports into MySQL in
+bulk-load mode (see pomegranate.db.raw_loader).
+
+Run like load_tables -i /data/ukb_raw
+Or for specific tables:
+load_tables -i /data/ukb_raw -t hesin hesin_diag
+"""
+
+import argparse
+import logging
+
+from pomegranate.db.db_config import RAW_FILES
+from pomegranate.db.derived import rebuild_participant_constants
+from pomegranate.db.raw_loader import DEFAULT_CHUNK_SIZE, load_raw_tables
+from pomegranate.db.ukbdb import UKBDatabase
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%m-%d-%Y %H:%M",
+    )
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-i", "--input", help="Directory with the raw exports", required=True
+    )
+    argparser.add_argument(
+        "-t",
+        "--tables",
+        nargs="+",
+        choices=list(RAW_FILES.keys()),
+        help="Tables to load (default: all files found)",
+        required=False,
+    )
+    argparser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        required=False,
+        help="Number of rows loaded per statement.",
+    )
+
+    args = argparser.parse_args()
+
+    with UKBDatabase(local_infile=True) as db:
+        counts = load_raw_tables(db, args.input, args.tables, args.chunk_size)
+        if "baseline" in counts:
+            rebuild_participant_constants(db)
+
+    for table, n in counts.items():
+        logging.info(f"{table} : {n} rows.")
+
+
+if __name__ == "__main__":
+    main()
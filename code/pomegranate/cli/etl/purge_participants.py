@@ -0,0 +1,59 @@
+"""
+Script to remove withdrawn participants from all tables.
+
+Run like purge_participants -i withdrawals.csv
+Or to only report the number of records to delete:
+purge_participants -i withdrawals.csv --dry-run
+"""
+
+import argparse
+import logging
+
+from pomegranate.db.purge import purge_eids, read_eids
+from pomegranate.db.ukbdb import UKBDatabase
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%m-%d-%Y %H:%M",
+    )
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-i", "--input", help="Withdrawal list, one eid per line", required=True
+    )
+    argparser.add_argument(
+        "-t", "--tables", nargs="+", help="Tables to purge (default: all)", required=False
+    )
+    argparser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        required=False,
+        help="Number of eids deleted per statement.",
+    )
+    argparser.add_argument(
+        "--dry-run",
+        action="store_true",
+        required=False,
+        help="Only reports the number of records to delete.",
+    )
+
+    args = argparser.parse_args()
+
+    eids = read_eids(args.input)
+    logging.info(f"Read {len(eids)} eids from {args.input}.")
+
+    with UKBDatabase() as db:
+        counts = purge_eids(db, eids, args.tables, args.batch_size, args.dry_run)
+
+    logging.info("Summary:")
+    for table, n in counts.items():
+        logging.info(f"{table} : {n} records.")
+    logging.info(f"Total : {sum(counts.values())} records.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Script to rebuild the derived tables without downtime.
+
+Run like rebuild_tables -t baseline_cohort cohort_phenotype_first
+Or to swap a table back with its previous version:
+rebuild_tables -t baseline_cohort --rollback
+"""
+
+import argparse
+import logging
+
+from pomegranate.db.derived import (
+    rebuild_baseline_cohort,
+    rebuild_baseline_typed,
+    rebuild_cohort_phenotype_first,
+    rebuild_participant_constants,
+)
+from pomegranate.db.first_events import build_phenotype_first
+from pomegranate.db.ukbdb import UKBDatabase
+
+# Rebuild functions, in the order the tables depend on each other.
+REBUILDS = {
+    "baseline_typed": rebuild_baseline_typed,
+    "participant_constants": rebuild_participant_constants,
+    "baseline_cohort": rebuild_baseline_cohort,
+    "phenotype_first": build_phenotype_first,
+    "cohort_phenotype_first": rebuild_cohort_phenotype_first,
+}
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%m-%d-%Y %H:%M",
+    )
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-t",
+        "--tables",
+        nargs="+",
+        choices=list(REBUILDS),
+        help="Tables to rebuild (default: all)",
+        required=False,
+    )
+    argparser.add_argument(
+        "--rollback",
+        action="store_true",
+        required=False,
+        help="Swaps the tables back with their previous version.",
+    )
+
+    args = argparser.parse_args()
+
+    tables = [t for t in REBUILDS if args.tables is None or t in args.tables]
+
+    with UKBDatabase() as db:
+        for table in tables:
+            if args.rollback:
+                db.restore_previous_table(table)
+                logging.info(f"{table} : restored previous version.")
+            else:
+                REBUILDS[table](db)
+
+
+if __name__ == "__main__":
+    main()
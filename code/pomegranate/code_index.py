@@ -0,0 +1,174 @@
+"""
+Module for looking up which phenotypes use a given code.
+
+The codes of all phenotype definitions are kept in sorted NumPy
+arrays so that exact and prefix queries are answered with binary
+search (O(log n)) instead of scanning every definition.
+"""
+
+import numpy as np
+import pandas as pd
+
+from pomegranate.catalogue import get_phenotype_files
+from pomegranate.db.code_ranges import prefix_successor
+from pomegranate.phenotype import get_phenotype, normalise_code
+
+INDEX_COLUMNS = ["code", "phenotype", "field", "type", "group", "ontology"]
+
+
+class CodeIndex:
+    """
+    Reverse index of code -> phenotype definitions.
+    """
+
+    def __init__(self, codes_df: pd.DataFrame) -> None:
+        """
+        Creates a new index.
+
+        Arguments
+        ---------
+
+        codes_df (pd.DataFrame) : one row per code with the columns
+                                  in INDEX_COLUMNS, codes are
+                                  normalised with `normalise_code`
+        """
+
+        codes = np.array(
+            [
+                normalise_code(str(c), f)
+                for c, f in zip(codes_df["code"], codes_df["field"])
+            ],
+            dtype=str,
+        )
+        phenotypes = codes_df["phenotype"].to_numpy(dtype=object)
+        fields = codes_df["field"].to_numpy(dtype=np.int64)
+
+        order = np.lexsort((fields, phenotypes.astype(str), codes))
+
+        self._codes = codes[order]
+        self._fields = fields[order]
+        self._columns = {
+            "phenotype": phenotypes[order],
+            "type": codes_df["type"].to_numpy(dtype=object)[order],
+            "group": codes_df["group"].to_numpy(dtype=object)[order],
+            "ontology": codes_df["ontology"].to_numpy(dtype=object)[order],
+        }
+
+    @classmethod
+    def from_phenotypes(cls, phenotypes: list):
+        """
+        Builds an index of the codes of the given phenotypes.
+        """
+
+        dfs = []
+        for p in phenotypes:
+            phenotype = get_phenotype(p)
+            dfs.append(phenotype.codes_df.assign(phenotype=phenotype.name))
+
+        if dfs:
+            codes_df = pd.concat(dfs, ignore_index=True)
+        else:
+            codes_df = pd.DataFrame(columns=INDEX_COLUMNS)
+
+        return cls(codes_df[INDEX_COLUMNS])
+
+    @classmethod
+    def from_catalogue(cls):
+        """
+        Builds an index of the codes of every phenotype
+        in the catalogue.
+        """
+
+        return cls.from_phenotypes([f[:-len(".yaml")] for f in get_phenotype_files()])
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def lookup(self, code: str, field_id: int = None, prefix: bool = False) -> pd.DataFrame:
+        """
+        Returns the index entries for a code.
+
+        Arguments
+        ---------
+
+        code (str) : code to look up, e.g. 'I44.0' or '14B4.'
+        field_id (int) : only return entries for this field; the
+                         code is normalised for the field (e.g. dots
+                         removed from ICD-10 codes), otherwise only
+                         dots inside the code are removed
+        prefix (bool) : return all entries whose code starts with `code`
+
+        Returns
+        -------
+
+        Dataframe (pd.DataFrame) with the columns in INDEX_COLUMNS
+        """
+
+        code = _normalise_query(code, field_id)
+        low = np.searchsorted(self._codes, code, side="left")
+        if prefix:
+            successor = prefix_successor(code)
+            if successor is None:
+                high = len(self._codes)
+            else:
+                high = np.searchsorted(self._codes, successor, side="left")
+        else:
+            high = np.searchsorted(self._codes, code, side="right")
+
+        return self._select(np.arange(low, high), field_id)
+
+    def covering(self, code: str, field_id: int = None) -> pd.DataFrame:
+        """
+        Returns the index entries whose code is a prefix of `code`,
+        i.e. the definitions a recorded code is matched by during
+        extraction (I44 and I440 both cover I4400).
+        """
+
+        code = _normalise_query(code, field_id)
+        positions = []
+        for i in range(1, len(code) + 1):
+            low = np.searchsorted(self._codes, code[:i], side="left")
+            high = np.searchsorted(self._codes, code[:i], side="right")
+            positions.append(np.arange(low, high))
+
+        return self._select(np.concatenate(positions) if positions else [], field_id)
+
+    def get_phenotypes(self, code: str, field_id: int = None, prefix: bool = False) -> list:
+        """
+        Returns a sorted list of the phenotypes using a code.
+        """
+
+        return sorted(set(self.lookup(code, field_id, prefix)["phenotype"]))
+
+    def _select(self, positions, field_id: int = None) -> pd.DataFrame:
+        """
+        Internal function, do not use directly.
+        """
+
+        positions = np.asarray(positions, dtype=np.int64)
+        if field_id is not None:
+            positions = positions[self._fields[positions] == int(field_id)]
+
+        data = {
+            "code": self._codes[positions],
+            "phenotype": self._columns["phenotype"][positions],
+            "field": self._fields[positions],
+            "type": self._columns["type"][positions],
+            "group": self._columns["group"][positions],
+            "ontology": self._columns["ontology"][positions],
+        }
+
+        return pd.DataFrame(data, columns=INDEX_COLUMNS)
+
+
+def _normalise_query(code: str, field_id: int = None) -> str:
+    """
+    Internal function, do not use directly.
+    """
+
+    if field_id is not None:
+        return normalise_code(code, int(field_id))
+
+    # Without a field, keep trailing dots which pad Read codes.
+    stripped = code.rstrip(".")
+    return stripped.replace(".", "") + code[len(stripped):]
@@ -4,9 +4,12 @@
     and date-related QC.
 """
 from typing import Optional, List
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from pomegranate.db.columnar import read_phenotype_first
+from pomegranate.db.participant_constants import get_participant_constants
 from pomegranate.db.ukbdb import UKBDatabase
 from pomegranate.etl_config import (
     PRIMARY_CARE_CENSORING,
@@ -14,6 +17,9 @@ from pomegranate.etl_config import (
     CANCER_CENSORING,
     DEATH_CENSORING)
 
+# Nanoseconds per day.
+DAY_NS = 24 * 60 * 60 * 10 ** 9
+
 
 def clean_dates_UKB(
     df: pd.DataFrame,
@@ -98,7 +104,9 @@ def clean_dates_HES(
 
 def get_baseline_date(eids: Optional[List[str]] = None) -> pd.DataFrame:
     """
-    Returns a DataFrame with the baseline date for each subject.
+    Returns a DataFrame with the baseline date for each subject,
+    read from the cached participant constants
+    (see pomegranate.db.participant_constants).
 
     Args:
     eids : list of strs, default None
@@ -109,23 +117,8 @@ def get_baseline_date(eids: Optional[List[str]] = None) -> pd.DataFrame:
     pd.DataFrame:
         A pandas DataFrame with columns 'eid' and 'date_baseline_assessment'.
     """
-    cols = ["eid", "date_baseline_assessment"]
-    sql = """
-    SELECT
-        eid,
-        f53 AS 'date_baseline_assessment'
-    FROM
-        baseline_cohort
-    """
-    if eids is not None:
-        sql += f" WHERE eid IN {tuple(eids)}"
-    df = pd.DataFrame(data=UKBDatabase().query(sql).fetchall(), columns=cols)
-    df["date_baseline_assessment"] = pd.to_datetime(
-        df["date_baseline_assessment"])
-    assert len(df) == df.eid.nunique(), AssertionError(
-        "There are duplicate eids in the baseline cohort."
-    )
-    return df
+    df = get_participant_constants().to_frame(["date_assessment_0"], eids)
+    return df.rename(columns={"date_assessment_0": "date_baseline_assessment"})
 
 
 def get_time_since_baseline(
@@ -157,8 +150,14 @@ def get_time_since_baseline(
         number of days between the event date
         and the corresponding individual's baseline assessment date.
     """
-    baseline_dates = get_baseline_date()
-    df = df.merge(baseline_dates, on=id_col)
+    # Gather the baseline date of every row from the cached
+    # constants, keeping the rows of participants found (as an
+    # inner merge with get_baseline_date() would).
+    constants = get_participant_constants()
+    positions, found = constants.positions(df[id_col].to_numpy())
+    df = df.loc[found].reset_index(drop=True)
+    baseline_dates = constants.columns["date_assessment_0"][positions[found]]
+    df["date_baseline_assessment"] = baseline_dates.astype("datetime64[ns]")
     df["time_since_baseline"] = (
         df[date_col] - df["date_baseline_assessment"]
     ).dt.days
@@ -169,7 +168,9 @@ def get_dod(eids: Optional[List[str]] = None,
             drop_alive: bool = True) -> pd.DataFrame:
     """
     Returns a DataFrame with the death date for each subject.
-    This is derived from the baseline_cohort table, rather than raw deaths.
+    This is derived from the baseline, rather than raw deaths, and read
+    from the cached participant constants
+    (see pomegranate.db.participant_constants).
 
     Args:
     eids : list of strs, default None
@@ -182,22 +183,7 @@ def get_dod(eids: Optional[List[str]] = None,
         A pandas DataFrame with columns 'eid' and 'dod'.
 
     """
-    cols = ["eid", "dod"]
-    sql = """
-    SELECT
-        eid,
-        f40000 AS 'dod'
-    FROM
-        baseline_cohort
-    """
-    if eids is not None:
-        sql += f" WHERE eid IN {tuple(eids)}"
-
-    df = pd.DataFrame(data=UKBDatabase().query(sql).fetchall(), columns=cols)
-    df["dod"] = pd.to_datetime(df["dod"])
-    assert len(df) == df.eid.nunique(), AssertionError(
-        "There are duplicate eids in the baseline_cohort."
-    )
+    df = get_participant_constants().to_frame(["dod"], eids)
     if drop_alive:
         df = df.loc[~df.dod.isna()]
     return df
@@ -206,7 +192,8 @@ def get_dod(eids: Optional[List[str]] = None,
 def get_dob(eids: Optional[List[str]] = None) -> pd.DataFrame:
     """
     Returns a DataFrame with the date of birth for each subject.
-    This is derived from the baseline_cohort table.
+    This is read from the cached participant constants
+    (see pomegranate.db.participant_constants).
 
     Args:
     eids : list of strs, default None
@@ -217,29 +204,15 @@ def get_dob(eids: Optional[List[str]] = None) -> pd.DataFrame:
     pd.DataFrame:
         A pandas DataFrame with columns 'eid' and 'dob'.
     """
-    cols = ["eid", "dob"]
-    sql = """
-    SELECT
-        eid,
-        dob
-    FROM
-        baseline_cohort
-    """
-    if eids is not None:
-        sql += f" WHERE eid IN {tuple(eids)}"
-
-    df = pd.DataFrame(data=UKBDatabase().query(sql).fetchall(), columns=cols)
-    df["dob"] = pd.to_datetime(df["dob"])
-    assert len(df) == df.eid.nunique(), AssertionError(
-        "There are duplicate eids in baseline_cohort."
-    )
-    return df
+    return get_participant_constants().to_frame(["dob"], eids)
 
 
 def get_phenotype_first(phenotypes: Optional[List[str]] = None,
                         fields: Optional[List[str]] = None,
                         first_only: bool = True,
-                        limit: Optional[int] = None
+                        limit: Optional[int] = None,
+                        parquet_dir: Optional[str] = None,
+                        chunk_size: Optional[int] = None
                         ) -> pd.DataFrame:
     """
     Returns a DataFrame with the first recorded date for each phenotype.
@@ -257,6 +230,14 @@ def get_phenotype_first(phenotypes: Optional[List[str]] = None,
     limit : int, default None
         Limit the number of rows returned by SQL query.
         If None (default), returns all rows.
+    parquet_dir : str, default None
+        Read from the Parquet export in this directory
+        (see `export_parquet`) instead of the database.
+    chunk_size : int, default None
+        Stream the rows from the database in chunks of this size,
+        reducing each chunk to its first events (if first_only)
+        as it arrives, so that all-phenotype pulls are never held
+        in memory in full. If None (default), reads all rows at once.
 
     Returns:
     pd.DataFrame:
@@ -266,6 +247,9 @@ def get_phenotype_first(phenotypes: Optional[List[str]] = None,
     # Coerce to list if single string
     if isinstance(phenotypes, str):
         phenotypes = [phenotypes]
+    if parquet_dir is not None:
+        df = read_phenotype_first(parquet_dir, phenotypes, fields, limit)
+        return _select_phenotype_first(df, first_only)
     cols = ['eid', 'phenotype', 'eventdate', 'field_id']
     sql = f"""
     SELECT
@@ -291,19 +275,90 @@ def get_phenotype_first(phenotypes: Optional[List[str]] = None,
               (may return fewer due to duplicate dates or different fields)
               """)
         sql += f" LIMIT {limit}"
-    df = pd.DataFrame(
-        data=UKBDatabase().query(sql).fetchall(),
-        columns=cols
-    )
+    if chunk_size is not None:
+        return _stream_phenotype_first(sql, cols, first_only, chunk_size)
+    with UKBDatabase(pooled=True) as db:
+        df = pd.DataFrame(data=db.query(sql).fetchall(), columns=cols)
+    return _select_phenotype_first(df, first_only)
+
+
+def _stream_phenotype_first(sql: str,
+                            cols: list,
+                            first_only: bool,
+                            chunk_size: int) -> pd.DataFrame:
+    """
+    Internal function, do not use directly.
+    """
+    if first_only:
+        print("filtering to first eventdate for each eid/phenotype")
+    frames = []
+    with UKBDatabase(pooled=True) as db:
+        for rows in db.query_stream(sql, chunk_size=chunk_size):
+            df = _select_phenotype_first(pd.DataFrame(data=rows, columns=cols),
+                                         first_only=False)
+            if first_only:
+                # The first events so far come first, so that they are
+                # kept on equal dates, as they would be in one frame.
+                df = _first_events(pd.concat(frames + [df]))
+                frames = []
+            frames.append(df)
+    if not frames:
+        return _select_phenotype_first(pd.DataFrame(columns=cols), first_only)
+    return pd.concat(frames).reset_index(drop=True)
+
+
+def _select_phenotype_first(df: pd.DataFrame,
+                            first_only: bool) -> pd.DataFrame:
+    """
+    Internal function, do not use directly.
+    """
     df = clean_dates_UKB(df)
     df['eventdate'] = pd.to_datetime(df['eventdate'])
     if first_only:
         print("filtering to first eventdate for each eid/phenotype")
-        df = df.loc[df.groupby(['eid', 'phenotype'])['eventdate'].idxmin()]
-        assert df.groupby(['eid', 'phenotype']).size().max() == 1, ValueError()
+        df = _first_events(df).reset_index(drop=True)
     return df
 
 
+def _first_events(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Internal function, do not use directly.
+
+    Keeps the row with the earliest eventdate for each
+    eid/phenotype (the first one on equal dates, rows without a
+    date last), sorted by eid and phenotype. Phenotypes are
+    encoded as integer codes and the rows are ordered with a
+    single stable sort, instead of grouping them.
+    """
+    eids = df['eid'].to_numpy()
+    if eids.dtype.kind not in 'iu':
+        eids = pd.factorize(eids, sort=True)[0]
+    eids = eids.astype(np.int64)
+    codes, phenotypes = pd.factorize(df['phenotype'], sort=True)
+    dates = df['eventdate'].to_numpy(dtype='datetime64[ns]').view('i8')
+    missing = dates == np.iinfo(np.int64).min
+    days = dates // DAY_NS
+    packed = (
+        (dates[~missing] % DAY_NS == 0).all()
+        and (np.abs(days[~missing]) < 2 ** 19).all()
+        and eids.max(initial=0) * (len(phenotypes) + 1) < 2 ** 42
+    )
+    if packed:
+        # Dates are days, so eid, phenotype and day (missing last)
+        # fit in one int64 key, which sorts faster than three.
+        days = np.where(missing, 2 ** 20 - 1, days + 2 ** 19)
+        keys = ((eids * (len(phenotypes) + 1) + codes + 1) << 20) | days
+        order = np.argsort(keys, kind='stable')
+    else:
+        dates = np.where(missing, np.iinfo(np.int64).max, dates)
+        order = np.lexsort((dates, codes, eids))
+    eids = eids[order]
+    codes = codes[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (eids[1:] != eids[:-1]) | (codes[1:] != codes[:-1])
+    return df.iloc[order[first]]
+
+
 def get_min_censor_date() -> pd.Timestamp:
     """
     Returns the minimum censoring date across all data sources and providers.
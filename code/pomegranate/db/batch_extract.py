@@ -0,0 +1,372 @@
+"""
+A module for extracting many phenotypes in a single pass
+over each source table.
+
+Instead of running one query per phenotype and field, a lookup
+of code -> [(phenotype, prevalent)] is built across all phenotypes
+and each source table is streamed exactly once. Every streamed
+record is matched against the lookup and emits one `phenotypes`
+row per matching phenotype.
+"""
+
+import logging
+from datetime import date
+
+from pomegranate.db.db_config import PHENOTYPES_COLUMNS
+from pomegranate.db.ukbdb import UKBDatabase
+from pomegranate.phenotype import Phenotype
+
+PREVALENT_DATE = date(1900, 1, 1)
+
+# Fields handled by the batch extractor and whether their
+# codes are matched as prefixes (ICD-10 / OPCS-4) or exactly.
+BATCH_FIELDS = {
+    41202: "prefix",
+    41204: "prefix",
+    41200: "prefix",
+    41210: "prefix",
+    40001: "prefix",
+    40002: "prefix",
+    40006: "prefix",
+    42040: "exact",
+    20001: "exact",
+    20002: "exact",
+    20004: "exact",
+}
+
+# Fields for which prevalent codes are extracted in addition
+# to incident ('any') codes.
+PREVALENT_FIELDS = [41202, 41204, 42040]
+
+# Baseline fields and the field holding their event date.
+BASELINE_DATE_FIELDS = {
+    20001: 20006,
+    20002: 20008,
+    20004: 20010,
+    40006: 40005,
+}
+
+
+class CodeLookup:
+    """
+    Code to phenotype lookup for a single field.
+    """
+
+    def __init__(self, field_id: int, match: str = "exact") -> None:
+        """
+        Creates a new, empty lookup.
+        """
+
+        assert match in ["exact", "prefix"]
+
+        self.field_id = field_id
+        self.match = match
+        self._codes = {}
+        self._resolved = {}
+        self._max_len = 0
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def add(self, phenotype: str, codes: list, prevalent: bool = False):
+        """
+        Register `codes` for `phenotype`.
+        """
+
+        for code in codes:
+            self._codes.setdefault(code, set()).add((phenotype, prevalent))
+            self._max_len = max(self._max_len, len(code))
+        self._resolved = {}
+
+    def get(self, code: str) -> list:
+        """
+        Returns a list of (phenotype, prevalent) tuples matching
+        `code`. Results are memoised per distinct code.
+        """
+
+        try:
+            return self._resolved[code]
+        except KeyError:
+            pass
+
+        if code is None:
+            matches = set()
+        elif self.match == "exact":
+            matches = self._codes.get(code, set())
+        else:
+            matches = set()
+            for i in range(1, min(len(code), self._max_len) + 1):
+                matches |= self._codes.get(code[:i], set())
+
+        self._resolved[code] = sorted(matches)
+        return self._resolved[code]
+
+
+class BatchExtractor:
+    """
+    Extracts phenotypes from all supported source tables,
+    streaming each table once.
+    """
+
+    def __init__(
+        self, db: UKBDatabase, chunk_size: int = 10000, method: str = "executemany"
+    ) -> None:
+        """
+        Creates a new instance of the class.
+
+        Arguments
+        ---------
+
+        db (UKBDatabase) : database used for writing
+        chunk_size (int) : number of rows fetched / inserted at a time
+        method (str) : bulk insert method, see MySQLDatabase.bulk_insert
+        """
+
+        self.db = db
+        self.chunk_size = chunk_size
+        self.method = method
+        self.lookups = {f: CodeLookup(f, m) for f, m in BATCH_FIELDS.items()}
+
+    def add(self, phenotype: Phenotype, field_id: int):
+        """
+        Registers the codes of `field_id` in `phenotype`
+        for extraction.
+        """
+
+        lookup = self.lookups[field_id]
+        lookup.add(phenotype.name, phenotype.get_values_for_field(field_id))
+        if field_id in PREVALENT_FIELDS:
+            lookup.add(
+                phenotype.name,
+                phenotype.get_values_for_field(field_id, type="prevalent"),
+                prevalent=True,
+            )
+
+    def extract(self, insert: bool = False):
+        """
+        Streams all source tables with registered codes.
+
+        Returns a dict {(phenotype, field_id): n} with the number
+        of rows inserted if insert is True, otherwise a tuple with
+        all extracted rows.
+        """
+
+        sources = [
+            ([41202, 41204], self._stream_hospital_diagnoses),
+            ([41200, 41210], self._stream_hospital_procedures),
+            ([40001, 40002], self._stream_mortality),
+            ([42040], self._stream_primary_care),
+            ([20001, 20002, 20004, 40006], self._stream_baseline),
+        ]
+
+        counts = {}
+        rows = []
+        for field_ids, stream in sources:
+            if not any(len(self.lookups[f]) for f in field_ids):
+                continue
+
+            logging.info(f"Batch extraction : {stream.__name__} : start.")
+            matched = self._count(self._match(stream()), counts)
+            if insert:
+                self.db.bulk_insert(
+                    "phenotypes",
+                    matched,
+                    PHENOTYPES_COLUMNS,
+                    method=self.method,
+                    chunk_size=self.chunk_size,
+                )
+            else:
+                rows.extend(matched)
+            logging.info(f"Batch extraction : {stream.__name__} : done.")
+
+        if insert:
+            return counts
+        return tuple(rows)
+
+    @staticmethod
+    def _count(rows, counts: dict):
+        """
+        Internal function, do not use directly.
+        """
+
+        for row in rows:
+            counts[(row[1], row[2])] = counts.get((row[1], row[2]), 0) + 1
+            yield row
+
+    def _match(self, records):
+        """
+        Internal function, do not use directly.
+
+        Records are (eid, field_id, code, eventdate) tuples.
+        """
+
+        for eid, field_id, code, eventdate in records:
+            for phenotype, prevalent in self.lookups[field_id].get(code):
+                yield (
+                    eid,
+                    phenotype,
+                    field_id,
+                    code,
+                    PREVALENT_DATE if prevalent else eventdate,
+                    None,
+                )
+
+    def _stream(self, sql: str):
+        """
+        Internal function, do not use directly.
+        """
+
+        reader = self.db.clone()
+        try:
+            for chunk in reader.query_stream(sql, chunk_size=self.chunk_size):
+                yield from chunk
+        finally:
+            reader.disconnect()
+
+    def _stream_hospital_diagnoses(self):
+        """
+        Internal function, do not use directly.
+        """
+
+        sql = """
+            SELECT
+                hd.eid,
+                IF(hd.level = 1, 41202, 41204) AS field_id,
+                hd.diag_icd10,
+                IF(
+                    hi.admidate IS NOT NULL,
+                    hi.admidate,
+                    hi.epistart
+                ) AS eventdate
+            FROM
+                hesin hi,
+                hesin_diag hd
+            WHERE
+                hi.eid = hd.eid
+            AND
+                hi.ins_index = hd.ins_index
+            AND
+                hd.level IN (1, 2)
+            AND
+                hd.diag_icd10 IS NOT NULL
+        """
+
+        return self._stream(sql)
+
+    def _stream_hospital_procedures(self):
+        """
+        Internal function, do not use directly.
+        """
+
+        sql = """
+            SELECT
+                ho.eid,
+                IF(ho.level = 1, 41200, 41210) AS field_id,
+                ho.oper4,
+                COALESCE(
+                    ho.opdate,
+                    hi.admidate,
+                    hi.epistart,
+                    STR_TO_DATE('1900-01-01', '%Y-%m-%d')
+                ) AS eventdate
+            FROM
+                hesin hi,
+                hesin_oper ho
+            WHERE
+                hi.eid = ho.eid
+            AND
+                hi.ins_index = ho.ins_index
+            AND
+                ho.level IN (1, 2)
+            AND
+                ho.oper4 IS NOT NULL
+        """
+
+        return self._stream(sql)
+
+    def _stream_mortality(self):
+        """
+        Internal function, do not use directly.
+        """
+
+        sql = """
+            SELECT
+                b1.eid,
+                IF(b2.level = 1, 40001, 40002) AS field_id,
+                b2.cause_icd10,
+                b1.date_of_death AS eventdate
+            FROM
+                death b1,
+                death_cause b2
+            WHERE
+                b1.eid = b2.eid
+            AND
+                b2.level IN (1, 2)
+            AND
+                b2.cause_icd10 IS NOT NULL
+        """
+
+        return self._stream(sql)
+
+    def _stream_primary_care(self):
+        """
+        Internal function, do not use directly.
+        """
+
+        sql = """
+            SELECT
+                eid,
+                42040 AS field_id,
+                read_code,
+                IF(
+                    eventdate IS NOT NULL,
+                    eventdate,
+                    STR_TO_DATE('1900-01-01', '%Y-%m-%d')
+                ) AS eventdate
+            FROM
+                gp_clinical
+            WHERE
+                read_code IS NOT NULL
+        """
+
+        return self._stream(sql)
+
+    def _stream_baseline(self):
+        """
+        Internal function, do not use directly.
+
+        Self-reported fields are dated using the year recorded in
+        their date qualifier field, cancer registry records use
+        the date field verbatim. Dates are returned as
+        'YYYY-MM-DD' strings.
+        """
+
+        date_field = " ".join(
+            f"WHEN {f} THEN {d}" for f, d in BASELINE_DATE_FIELDS.items()
+        )
+        fields = ", ".join(str(f) for f in BASELINE_DATE_FIELDS)
+        baseline = self.db.baseline_table()
+        value = self.db.baseline_number_sql("b2")
+
+        sql = f"""
+            SELECT
+                b1.eid,
+                b1.field AS field_id,
+                b1.value,
+                CASE
+                    WHEN b1.field = 40006 THEN b2.value
+                    WHEN {value} > 0 THEN CONCAT(ROUND({value}), '-01-01')
+                    ELSE '1900-01-01'
+                END AS eventdate
+            FROM
+                {baseline} b1
+            LEFT OUTER JOIN {baseline} b2
+                ON b2.eid = b1.eid
+                AND b2.i = b1.i
+                AND b2.n = b1.n
+                AND b2.field = CASE b1.field {date_field} END
+            WHERE
+                b1.field IN ({fields})
+        """
+
+        return self._stream(sql)
@@ -0,0 +1,180 @@
+"""
+Module for loading large numbers of rows into MySQL tables.
+
+Rows are streamed in chunks, either with parameterized
+`executemany` INSERTs or with `LOAD DATA LOCAL INFILE` from a
+temporary TSV file, so neither Python memory nor the server's
+`max_allowed_packet` limit the size of a load.
+"""
+
+import logging
+import math
+import os
+import tempfile
+import time
+from datetime import date, datetime
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+BULK_METHODS = ["executemany", "infile"]
+
+TSV_NULL = "\\N"
+
+
+def to_sql_value(value):
+    """
+    Converts a single value to a type understood by the
+    database driver. Missing values (None, NaN, NaT) become
+    None and pandas / numpy scalars become Python builtins.
+    """
+
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            return None
+    return value
+
+
+def to_tsv_field(value) -> str:
+    """
+    Formats a single value for `LOAD DATA INFILE` using the
+    default escaping rules: missing values are written as \\N,
+    dates in ISO format and backslashes, tabs and newlines are
+    escaped.
+    """
+
+    value = to_sql_value(value)
+    if value is None:
+        return TSV_NULL
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return str(int(value))
+
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def iter_rows(data):
+    """
+    Returns an iterator of tuples for a DataFrame or any
+    iterable of row sequences, with values converted using
+    `to_sql_value`.
+    """
+
+    if isinstance(data, pd.DataFrame):
+        data = data.itertuples(index=False, name=None)
+
+    for row in data:
+        yield tuple(to_sql_value(x) for x in row)
+
+
+def iter_chunks(rows, chunk_size: int):
+    """
+    Splits an iterable into lists of at most `chunk_size` items.
+    """
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_insert(
+    db,
+    table: str,
+    data,
+    columns: list = None,
+    method: str = "executemany",
+    chunk_size: int = 10000,
+) -> int:
+    """
+    Inserts rows into `table` in chunks.
+
+    Arguments
+    ---------
+
+    db (MySQLDatabase) : database to load into
+    table (str) : table name
+    data (pd.DataFrame or iterable of tuples) : rows to insert
+    columns (list) : column names, defaults to the DataFrame columns
+    method (str) : 'executemany' for parameterized INSERTs or 'infile'
+                   for LOAD DATA LOCAL INFILE (requires the connection
+                   to be created with local_infile=True)
+    chunk_size (int) : rows per statement
+
+    Returns
+    -------
+
+    number of rows inserted (int)
+    """
+
+    assert method in BULK_METHODS
+
+    if columns is None and isinstance(data, pd.DataFrame):
+        columns = list(data.columns)
+    if columns is None:
+        raise ValueError("Column names are required when loading tuples.")
+
+    column_sql = ", ".join(columns)
+    start = time.time()
+    n = 0
+
+    for chunk in iter_chunks(iter_rows(data), chunk_size):
+        if method == "executemany":
+            placeholders = ", ".join(["%s"] * len(columns))
+            sql = f"INSERT INTO {table} ({column_sql}) VALUES ({placeholders})"
+            db.cursor.executemany(sql, chunk)
+        else:
+            _load_infile(db, table, column_sql, chunk)
+        n += len(chunk)
+
+    elapsed = time.time() - start
+    rate = n / elapsed if elapsed > 0 else float("inf")
+    logging.info(
+        f"Loaded {n} rows into {table} in {elapsed:.1f}s ({rate:.0f} rows/sec)."
+    )
+
+    return n
+
+
+def _load_infile(db, table: str, column_sql: str, chunk: list):
+    """
+    Internal function, do not use directly.
+    """
+
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".tsv", delete=False, encoding="utf-8", newline="\n"
+    ) as f:
+        for row in chunk:
+            f.write("\t".join(to_tsv_field(x) for x in row) + "\n")
+
+    try:
+        sql = f"""
+        LOAD DATA LOCAL INFILE %s
+        INTO TABLE {table}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+        LINES TERMINATED BY '\\n'
+        ({column_sql})
+        """
+        db.cursor.execute(sql, [f.name])
+    finally:
+        os.remove(f.name)
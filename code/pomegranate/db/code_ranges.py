@@ -0,0 +1,134 @@
+"""
+Module for turning lists of code prefixes into index-friendly
+predicates and ranges.
+
+Phenotype definitions list ICD-10 / OPCS-4 codes as prefixes, i.e.
+`I44` matches `I440`, `I441`, ... Matching these with
+`REGEXP '^(I44|I45)'` cannot use an index on the code column, whereas
+the equivalent `col LIKE 'I44%' OR col LIKE 'I45%'` can. The
+half-open ranges of `prefix_ranges` are for matching in Python,
+where strings sort by code point.
+"""
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+def prefix_successor(prefix: str):
+    """
+    Returns the smallest string that is greater than every
+    string starting with `prefix`, or None if no such string
+    exists (i.e. the range is unbounded).
+
+    'I44' => 'I45'
+    'C9' => 'C:'
+    """
+
+    chars = list(prefix)
+    while chars and chars[-1] == MAX_CHAR:
+        chars.pop()
+
+    if not chars:
+        return None
+
+    chars[-1] = chr(ord(chars[-1]) + 1)
+    return "".join(chars)
+
+
+def prefix_ranges(prefixes: list) -> list:
+    """
+    Returns a sorted list of non-overlapping half-open ranges
+    [(low, high), ...] covering every string which starts with
+    one of `prefixes`.
+
+    Duplicate prefixes and prefixes covered by a shorter prefix
+    are dropped, and adjacent ranges are merged.
+
+    ['I45', 'I44', 'I441', 'I44'] => [('I44', 'I46')]
+
+    An empty prefix matches everything and yields [('', None)].
+    """
+
+    ranges = []
+    for prefix in sorted(set(prefixes)):
+        # Sorting guarantees that a covering prefix comes before
+        # the prefixes it covers.
+        if ranges and ranges[-1][1] is None:
+            break
+        if ranges and (ranges[-1][1] > prefix):
+            continue
+
+        high = prefix_successor(prefix)
+        if ranges and ranges[-1][1] == prefix:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((prefix, high))
+
+    return ranges
+
+
+def collapse_prefixes(prefixes: list) -> list:
+    """
+    Returns the sorted list of `prefixes` without duplicates
+    and without the prefixes covered by a shorter one.
+
+    ['I45', 'I44', 'I441', 'I44'] => ['I44', 'I45']
+    """
+
+    collapsed = []
+    for prefix in sorted(set(prefixes)):
+        # Sorting guarantees that a covering prefix comes before
+        # the prefixes it covers.
+        if collapsed and prefix.startswith(collapsed[-1]):
+            continue
+        collapsed.append(prefix)
+
+    return collapsed
+
+
+def prefix_ranges_to_sql(column: str, prefixes: list) -> str:
+    """
+    Returns a SQL predicate matching `column` against any
+    of `prefixes`, as `LIKE 'prefix%'` comparisons.
+
+    prefix_ranges_to_sql('hd.diag_icd10', ['I44', 'I45', 'I441'])
+    => "(hd.diag_icd10 LIKE 'I44%' OR hd.diag_icd10 LIKE 'I45%')"
+
+    MySQL runs a LIKE with a constant prefix as a range scan of
+    the index on `column`, with bounds computed in the column's
+    collation. Ranges built with `prefix_successor` are only
+    correct in collations sorting by code point ('C9' < 'C90' <
+    'C:'), which is not the case of e.g. utf8mb4_0900_ai_ci.
+
+    An empty list of prefixes yields a predicate that never
+    matches.
+    """
+
+    prefixes = collapse_prefixes(prefixes)
+    if not prefixes:
+        return "(1 = 0)"
+
+    predicates = []
+    for prefix in prefixes:
+        if any(c in prefix for c in "%_!"):
+            pattern = _quote(_escape_like(prefix) + "%")
+            predicates.append(f"{column} LIKE {pattern} ESCAPE '!'")
+        else:
+            predicates.append(f"{column} LIKE {_quote(prefix + '%')}")
+
+    return "(" + " OR ".join(predicates) + ")"
+
+
+def _escape_like(value: str) -> str:
+    """
+    Internal function, do not use directly.
+    """
+
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def _quote(value: str) -> str:
+    """
+    Internal function, do not use directly.
+    """
+
+    return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
@@ -0,0 +1,262 @@
+"""
+Module for exporting tables to partitioned Parquet datasets and
+reading them back without going through the database.
+
+Each table is written to its own directory under the export
+directory as a hive-partitioned dataset (e.g.
+`phenotype_first/phenotype=asthma/field_id_label=ehr_hospital/`).
+Reads use pyarrow datasets, so filters on the partition columns
+skip whole directories, other filters are pushed down to the
+Parquet row groups and only the requested columns are decoded.
+"""
+
+import logging
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from pomegranate.db.db_config import BASELINE_COHORT_FIELDS
+
+
+def _get_baseline_cohort_schema() -> pa.Schema:
+    """
+    Internal function, do not use directly.
+    """
+
+    fields = [("eid", pa.int64())]
+    fields += [
+        (f"f{field}", pa.date32() if type == "DATE" else pa.string())
+        for field, type, _ in BASELINE_COHORT_FIELDS
+    ]
+    fields += [
+        ("country", pa.string()),
+        ("dob", pa.date32()),
+        ("gp_ehr", pa.int32()),
+        ("gp_ehr_data_provider", pa.int32()),
+        ("gp_ehr_single_reg", pa.int32()),
+        ("gp_ehr_deduct_date", pa.date32()),
+    ]
+
+    return pa.schema(fields)
+
+
+# Arrow schema and partition columns of each exported table.
+# Schemas are fixed rather than inferred, since a chunk with only
+# NULLs in a column would otherwise get a different type.
+EXPORT_TABLES = {
+    "phenotypes": (
+        pa.schema(
+            [
+                ("eid", pa.int64()),
+                ("phenotype", pa.string()),
+                ("field_id", pa.int32()),
+                ("field_value", pa.string()),
+                ("eventdate", pa.date32()),
+                ("data_value", pa.float64()),
+            ]
+        ),
+        ["phenotype"],
+    ),
+    "phenotype_first": (
+        pa.schema(
+            [
+                ("eid", pa.int64()),
+                ("phenotype", pa.string()),
+                ("field_id", pa.int32()),
+                ("field_id_label", pa.string()),
+                ("eventdate", pa.date32()),
+            ]
+        ),
+        ["phenotype", "field_id_label"],
+    ),
+    "baseline_cohort": (_get_baseline_cohort_schema(), []),
+}
+
+
+def get_dataset_dir(base_dir: str, table: str) -> str:
+    """
+    Returns the directory of the dataset of `table`.
+    """
+
+    return os.path.join(base_dir, table)
+
+
+def write_table(frames, table: str, base_dir: str) -> int:
+    """
+    Writes an iterable of DataFrames to the dataset of `table`,
+    replacing any partitions it already contains.
+
+    Arguments
+    ---------
+
+    frames (iterable of pd.DataFrame) : rows of the table, with at
+                                        least the columns of its
+                                        schema in EXPORT_TABLES
+    table (str) : table name
+    base_dir (str) : export directory
+
+    Returns
+    -------
+
+    number of rows written (int)
+    """
+
+    schema, partition_cols = EXPORT_TABLES[table]
+    num_rows = 0
+
+    def batches():
+        nonlocal num_rows
+        for df in frames:
+            batch = pa.RecordBatch.from_pandas(
+                df[schema.names], schema=schema, preserve_index=False
+            )
+            num_rows += batch.num_rows
+            yield batch
+
+    partitioning = None
+    if partition_cols:
+        partitioning = ds.partitioning(
+            pa.schema([schema.field(c) for c in partition_cols]), flavor="hive"
+        )
+
+    ds.write_dataset(
+        batches(),
+        get_dataset_dir(base_dir, table),
+        schema=schema,
+        format="parquet",
+        partitioning=partitioning,
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+        max_partitions=4096,
+    )
+
+    return num_rows
+
+
+def export_table(db, table: str, base_dir: str, chunk_size: int = 500000) -> int:
+    """
+    Exports a table from the database to Parquet, streaming
+    it in chunks of `chunk_size` rows. Any previous export of
+    the table is removed first.
+
+    Returns the number of rows exported.
+    """
+
+    schema, _ = EXPORT_TABLES[table]
+    sql = f"SELECT {', '.join(schema.names)} FROM {table}"
+
+    dataset_dir = get_dataset_dir(base_dir, table)
+    if os.path.isdir(dataset_dir):
+        shutil.rmtree(dataset_dir)
+
+    logging.info(f"Exporting {table} to {dataset_dir}.")
+    num_rows = write_table(
+        db.query_stream(sql, chunk_size=chunk_size, as_frame=True), table, base_dir
+    )
+    logging.info(f"Exported {num_rows} rows from {table}.")
+
+    return num_rows
+
+
+def read_table(
+    table: str,
+    base_dir: str,
+    filters: dict = None,
+    columns: list = None,
+    limit: int = None,
+):
+    """
+    Reads (part of) an exported table.
+
+    Arguments
+    ---------
+
+    table (str) : table name
+    base_dir (str) : export directory
+    filters (dict) : {column: value or list of values}, rows must
+                     match all of them
+    columns (list) : columns to read (default: all)
+    limit (int) : maximum number of rows to return
+
+    Returns
+    -------
+
+    Dataframe (pd.DataFrame)
+    """
+
+    schema, partition_cols = EXPORT_TABLES[table]
+
+    partitioning = None
+    if partition_cols:
+        partitioning = ds.partitioning(
+            pa.schema([schema.field(c) for c in partition_cols]), flavor="hive"
+        )
+
+    dataset = ds.dataset(
+        get_dataset_dir(base_dir, table),
+        schema=schema,
+        format="parquet",
+        partitioning=partitioning,
+    )
+
+    expression = None
+    for column, values in (filters or {}).items():
+        if isinstance(values, (list, tuple, set)):
+            condition = ds.field(column).isin(list(values))
+        else:
+            condition = ds.field(column) == values
+        expression = condition if expression is None else expression & condition
+
+    if columns is None:
+        columns = schema.names
+
+    if limit is not None:
+        data = dataset.head(limit, columns=columns, filter=expression)
+    else:
+        data = dataset.to_table(columns=columns, filter=expression)
+
+    return data.to_pandas()
+
+
+def read_phenotype_first(
+    base_dir: str,
+    phenotypes: list = None,
+    fields: list = None,
+    limit: int = None,
+    columns: list = None,
+):
+    """
+    Reads the exported phenotype_first table, with the same
+    filters as `pomegranate.dates.get_phenotype_first`.
+
+    Arguments
+    ---------
+
+    base_dir (str) : export directory
+    phenotypes (list) : phenotypes to read (default: all)
+    fields (list) : field ids to read (default: all)
+    limit (int) : maximum number of rows to return
+    columns (list) : columns to read
+                     (default: eid, phenotype, eventdate, field_id)
+
+    Returns
+    -------
+
+    Dataframe (pd.DataFrame)
+    """
+
+    if isinstance(phenotypes, str):
+        phenotypes = [phenotypes]
+
+    filters = {}
+    if phenotypes is not None:
+        filters["phenotype"] = phenotypes
+    if fields is not None:
+        filters["field_id"] = [int(f) for f in fields]
+
+    if columns is None:
+        columns = ["eid", "phenotype", "eventdate", "field_id"]
+
+    return read_table("phenotype_first", base_dir, filters, columns, limit)
@@ -11,6 +11,12 @@ from pomegranate.db.schemas.hesin_diag import SCHEMA_HESIN_DIAG
 from pomegranate.db.schemas.hesin_oper import SCHEMA_HESIN_OPER
 
 from pomegranate.db.schemas.phenotypes import SCHEMA_PHENOTYPES
+from pomegranate.db.schemas.extraction_manifest import SCHEMA_EXTRACTION_MANIFEST
+from pomegranate.db.schemas.source_versions import (
+    SCHEMA_SOURCE_VERSIONS,
+    SCHEMA_SOURCE_CHANGELOG,
+)
+from pomegranate.db.schemas.table_builds import SCHEMA_TABLE_BUILDS
 
 DB_TABLES = {
     'baseline': SCHEMA_BASELINE,
@@ -23,25 +29,116 @@ DB_TABLES = {
     'gp_prescriptions': SCHEMA_GP_PRESCRIPTIONS,
     'gp_clinical': SCHEMA_GP_CLINICAL,
     'phenotypes': SCHEMA_PHENOTYPES,
+    'extraction_manifest': SCHEMA_EXTRACTION_MANIFEST,
+    'source_versions': SCHEMA_SOURCE_VERSIONS,
+    'source_changelog': SCHEMA_SOURCE_CHANGELOG,
+    'table_builds': SCHEMA_TABLE_BUILDS,
 }
 
+# Tables built from the source and phenotypes tables
+# which are not listed in DB_TABLES.
+DERIVED_TABLES = [
+    'baseline_typed',
+    'participant_constants',
+    'baseline_cohort',
+    'phenotype_first',
+    'cohort_phenotype_first',
+    'complex_phenotypes',
+]
+
+# Columns of the 'phenotypes' table, in the order
+# returned by the extraction queries.
+PHENOTYPES_COLUMNS = [
+    'eid',
+    'phenotype',
+    'field_id',
+    'field_value',
+    'eventdate',
+    'data_value',
+]
+
+# Queries filtered on more eids than EID_FILTER_THRESHOLD join an
+# indexed temporary table of the eids, others bind them as
+# parameters of IN lists of at most EID_FILTER_CHUNK_SIZE eids
+# (see UKBDatabase.query_eids).
+EID_FILTER_THRESHOLD = 10000
+EID_FILTER_CHUNK_SIZE = 1000
+
+# Source tables which can be refreshed with delta ingestion and
+# the columns identifying their records. Tables without a record
+# key are compared per participant.
+DELTA_TABLE_KEYS = {
+    'hesin': ['eid', 'ins_index'],
+    'hesin_diag': ['eid', 'ins_index', 'arr_index'],
+    'hesin_oper': ['eid', 'ins_index', 'arr_index'],
+    'death': ['eid', 'ins_index'],
+    'death_cause': ['eid', 'ins_index', 'arr_index'],
+    'gp_clinical': ['eid'],
+}
+
+# Raw UK Biobank exports and the tables they are loaded into.
+# The baseline file is the long format written by transpose.py,
+# the others are the record-level exports.
+RAW_FILES = {
+    'baseline': 'baseline.csv.gz',
+    'death': 'death.txt',
+    'death_cause': 'death_cause.txt',
+    'hesin': 'hesin.txt',
+    'hesin_diag': 'hesin_diag.txt',
+    'hesin_oper': 'hesin_oper.txt',
+    'gp_registrations': 'gp_registrations.txt',
+    'gp_prescriptions': 'gp_scripts.txt',
+    'gp_clinical': 'gp_clinical.txt',
+}
+
+# Format of the dates in the raw record-level exports.
+RAW_DATE_FORMAT = '%d/%m/%Y'
+
+# Columns derived after loading, which are not in the raw files.
+DERIVED_COLUMNS = {
+    'gp_clinical': ['read_code'],
+}
+
+# Source tables read when extracting each field. Fields
+# not listed here are extracted from the baseline table.
+FIELD_SOURCE_TABLES = {
+    20001: ['baseline'],
+    20002: ['baseline'],
+    20004: ['baseline'],
+    40006: ['baseline'],
+    41200: ['hesin', 'hesin_oper'],
+    41210: ['hesin', 'hesin_oper'],
+    41202: ['hesin', 'hesin_diag'],
+    41204: ['hesin', 'hesin_diag'],
+    40001: ['death', 'death_cause'],
+    40002: ['death', 'death_cause'],
+    42040: ['gp_clinical'],
+}
+
+# Baseline fields (instance 0, array index 0) pivoted into the
+# 'baseline_cohort' table as columns f<field>: field id, column
+# type and nice name.
+BASELINE_COHORT_FIELDS = [
+    (31, 'VARCHAR(50)', 'sex'),
+    (34, 'VARCHAR(50)', 'yob'),
+    (52, 'VARCHAR(50)', 'mob'),
+    (53, 'VARCHAR(50)', 'date_assess'),
+    (54, 'VARCHAR(50)', 'assess_centre'),
+    (21003, 'VARCHAR(50)', 'age_assess'),
+    (189, 'VARCHAR(50)', 'depriv'),
+    (21001, 'VARCHAR(50)', 'bmi'),
+    (50, 'VARCHAR(50)', 'height'),
+    (21002, 'VARCHAR(50)', 'weight'),
+    (95, 'VARCHAR(50)', 'sysbp'),
+    (94, 'VARCHAR(50)', 'diasbp'),
+    (20116, 'VARCHAR(50)', 'smoking'),
+    (20117, 'VARCHAR(50)', 'alcohol'),
+    (21000, 'VARCHAR(50)', 'ethnic'),
+    (40000, 'DATE', 'dod'),
+]
+
 BASELINE_COHORT_NICENAMES = {
-    "f31": "sex",
-    "f34": "yob",
-    "f52": "mob",
-    "f53": "date_assess",
-    "f54": "assess_centre",
-    "f21003": "age_assess",
-    "f189": "depriv",
-    "f21001": "bmi",
-    "f50": "height",
-    "f21002": "weight",
-    "f95": "sysbp",
-    "f94": "diasbp",
-    "f20116": "smoking",
-    "f20117": "alcohol",
-    "f21000": "ethnic",
-    "f40000": "dod",
+    f"f{field}": nicename for field, _, nicename in BASELINE_COHORT_FIELDS
 }
 
 BASELINE_COHORT_FIELD_VALUES = {
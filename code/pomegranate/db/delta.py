@@ -0,0 +1,266 @@
+"""
+Module for refreshing source tables from a new data release
+without reloading them.
+
+A new release of a table is loaded into a staging table (e.g.
+`hesin_diag_staging`, created with `create_staging_table` and
+loaded / post-processed exactly like the live table). Each table is
+then diffed against its staging table by record key (see
+DELTA_TABLE_KEYS): every key whose rows differ between the two
+tables has its live rows replaced by the staging rows. Tables without
+a record key (`gp_clinical`) are compared per participant.
+
+Changes are applied in a single transaction per table and recorded
+per participant in `source_changelog`, so that extraction can be
+limited to the affected participants afterwards.
+"""
+
+import logging
+
+from pomegranate.db.db_config import DELTA_TABLE_KEYS
+from pomegranate.db.schemas.source_versions import (
+    CREATE_SOURCE_VERSIONS,
+    CREATE_SOURCE_CHANGELOG,
+)
+from pomegranate.db.ukbdb import UKBDatabase
+
+STAGING_SUFFIX = "_staging"
+
+
+def get_staging_table(table: str) -> str:
+    """
+    Returns the name of the staging table of `table`.
+    """
+
+    return table + STAGING_SUFFIX
+
+
+def create_staging_table(db, table: str):
+    """
+    (Re-)creates an empty staging table for `table` with
+    the same columns and indexes.
+    """
+
+    assert table in DELTA_TABLE_KEYS
+
+    staging = get_staging_table(table)
+    db.query(f"DROP TABLE IF EXISTS {staging}")
+    db.query(f"CREATE TABLE {staging} LIKE {table}")
+
+
+def apply_delta(
+    db, release: str, tables: list = None, drop_staging: bool = True
+) -> dict:
+    """
+    Applies the differences between the staging and the live
+    tables.
+
+    Arguments
+    ---------
+
+    db (MySQLDatabase) : database
+    release (str) : name of the release, recorded in the change log
+    tables (list) : tables to refresh (default: all tables in
+                    DELTA_TABLE_KEYS)
+    drop_staging (bool) : drop each staging table once applied
+
+    Returns
+    -------
+
+    dict {table: (rows_inserted, rows_deleted)}
+    """
+
+    if tables is None:
+        tables = list(DELTA_TABLE_KEYS.keys())
+
+    db.query(CREATE_SOURCE_VERSIONS)
+    db.query(CREATE_SOURCE_CHANGELOG)
+
+    counts = {}
+    for table in tables:
+        logging.info(f"Delta {release} : {table} : start.")
+        n_keys = diff_table(db, table)
+        inserted, deleted = _apply_table(db, release, table)
+        counts[table] = (inserted, deleted)
+        logging.info(
+            f"Delta {release} : {table} : {n_keys} changed keys, "
+            f"{inserted} rows inserted, {deleted} rows deleted."
+        )
+        if drop_staging:
+            db.query(f"DROP TABLE IF EXISTS {get_staging_table(table)}")
+
+    return counts
+
+
+def diff_table(db, table: str) -> int:
+    """
+    Creates the temporary table `delta_keys` with the record
+    keys of `table` whose rows differ from the staging table
+    (including keys present in only one of them).
+
+    Returns the number of changed keys.
+    """
+
+    keys = DELTA_TABLE_KEYS[table]
+    staging = get_staging_table(table)
+    columns = db.get_column_names(db.config["db"], table)
+    row = _row_string(columns)
+    key_sql = ", ".join(keys)
+
+    # Rows are summarised per key in both tables: keys with a
+    # single summary exist in one table only, keys with two
+    # different summaries were changed.
+    summary = f"""
+        SELECT
+            {key_sql},
+            COUNT(*) AS num_rows,
+            SUM(CRC32({row})) AS h1,
+            BIT_XOR(CAST(CONV(LEFT(MD5({row}), 16), 16, 10) AS UNSIGNED)) AS h2
+        FROM
+            {{table}}
+        GROUP BY
+            {key_sql}
+    """
+
+    db.query("DROP TEMPORARY TABLE IF EXISTS delta_summary")
+    db.query(
+        f"""
+        CREATE TEMPORARY TABLE delta_summary
+        {summary.format(table=table)}
+        UNION ALL
+        {summary.format(table=staging)}
+        """
+    )
+
+    db.query("DROP TEMPORARY TABLE IF EXISTS delta_keys")
+    db.query(
+        f"""
+        CREATE TEMPORARY TABLE delta_keys (INDEX k ({key_sql}))
+        SELECT {key_sql}
+        FROM delta_summary
+        GROUP BY {key_sql}
+        HAVING COUNT(*) = 1 OR COUNT(DISTINCT num_rows, h1, h2) > 1
+        """
+    )
+    db.query("DROP TEMPORARY TABLE IF EXISTS delta_summary")
+
+    return db.query("SELECT COUNT(*) FROM delta_keys").fetchall()[0][0]
+
+
+def get_changed_tables(db, release: str) -> list:
+    """
+    Returns the tables changed by `release`.
+    """
+
+    sql = """
+        SELECT DISTINCT table_name
+        FROM source_changelog
+        WHERE release_name = %s
+    """
+
+    return sorted(x[0] for x in db.query(sql, [release]).fetchall())
+
+
+def create_changed_eids_table(
+    db, release: str, table: str = "changed_eids", source_tables: list = None
+) -> int:
+    """
+    Creates the temporary table `table` with the eids of the
+    participants changed by `release`, optionally only counting
+    changes to `source_tables`.
+
+    Returns the number of eids.
+    """
+
+    sql = f"""
+        CREATE TEMPORARY TABLE {table} (PRIMARY KEY (eid))
+        SELECT DISTINCT eid
+        FROM source_changelog
+        WHERE release_name = %s
+        AND eid IS NOT NULL
+    """
+
+    if source_tables is not None:
+        sql += f" AND table_name IN {UKBDatabase.list_to_sql(source_tables)}"
+
+    db.query(f"DROP TEMPORARY TABLE IF EXISTS {table}")
+    db.query(sql, [release])
+
+    return db.query(f"SELECT COUNT(*) FROM {table}").fetchall()[0][0]
+
+
+def _apply_table(db, release: str, table: str) -> tuple:
+    """
+    Internal function, do not use directly.
+
+    Replaces the live rows of all keys in `delta_keys` with the
+    staging rows in one transaction and records the change log.
+    """
+
+    keys = DELTA_TABLE_KEYS[table]
+    staging = get_staging_table(table)
+    columns = [f"`{c}`" for c in db.get_column_names(db.config["db"], table)]
+
+    def join(alias):
+        return " AND ".join(f"{alias}.{k} <=> d.{k}" for k in keys)
+
+    changelog = """
+        INSERT INTO source_changelog
+        (release_name, table_name, eid, change_type, num_rows, applied_at)
+        SELECT %s, %s, x.eid, %s, COUNT(*), NOW()
+        FROM {source} x
+        JOIN delta_keys d ON {join}
+        GROUP BY x.eid
+    """
+
+    db.connection.begin()
+    try:
+        db.query(
+            changelog.format(source=table, join=join("x")), [release, table, "delete"]
+        )
+        deleted = db.query(
+            f"DELETE x FROM {table} x JOIN delta_keys d ON {join('x')}"
+        ).rowcount
+
+        db.query(
+            changelog.format(source=staging, join=join("x")), [release, table, "insert"]
+        )
+        inserted = db.query(
+            f"""
+            INSERT INTO {table} ({", ".join(columns)})
+            SELECT {", ".join("x." + c for c in columns)}
+            FROM {staging} x
+            JOIN delta_keys d ON {join('x')}
+            """
+        ).rowcount
+
+        db.query(
+            """
+            REPLACE INTO source_versions
+            (table_name, release_name, rows_inserted, rows_deleted, loaded_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            """,
+            [table, release, inserted, deleted],
+        )
+        db.connection.commit()
+    except Exception:
+        db.connection.rollback()
+        raise
+    finally:
+        db.query("DROP TEMPORARY TABLE IF EXISTS delta_keys")
+
+    return inserted, deleted
+
+
+def _row_string(columns: list) -> str:
+    """
+    Internal function, do not use directly.
+
+    Returns a SQL expression concatenating all columns of a
+    row, distinguishing NULL from empty values.
+    """
+
+    values = ", ".join(f"ISNULL(`{c}`), IFNULL(`{c}`, '')" for c in columns)
+
+    return f"CONCAT_WS('|', {values})"
+
@@ -0,0 +1,116 @@
+"""
+Module for rebuilding the tables derived from the source and
+phenotypes tables.
+
+Every rebuild goes through `MySQLDatabase.rebuild_table`, which
+builds into a shadow table and swaps it in atomically, so the
+derived tables can be rebuilt while they are being queried. The
+previous version of each table is kept for rollback with
+`MySQLDatabase.restore_previous_table`.
+"""
+
+import logging
+
+from pomegranate.db.participant_constants import clear_participant_constants
+from pomegranate.db.schemas.baseline_cohort import (
+    get_baseline_cohort_gp_ehr,
+    get_baseline_cohort_schema,
+)
+from pomegranate.db.schemas.baseline_typed import (
+    INDEX_BASELINE_TYPED,
+    SCHEMA_BASELINE_TYPED,
+)
+from pomegranate.db.schemas.participant_constants import (
+    SCHEMA_PARTICIPANT_CONSTANTS,
+)
+from pomegranate.db.schemas.cohort_phenotype_first import (
+    SCHEMA_COHORT_PHENOTYPE_FIRST_INDEX,
+    SCHEMA_COHORT_PHENOTYPE_FIRST_MERGE,
+    SCHEMA_COHORT_PHENOTYPE_FIRST_MERGE_BASIC,
+)
+from pomegranate.etl_config import NAME_COHORT_EVENTS
+
+
+def rebuild_baseline_typed(db) -> int:
+    """
+    Rebuilds the `baseline_typed` table from `baseline`
+    (see UKBDatabase.set_typed_baseline).
+
+    Returns the number of values in the new table.
+    """
+
+    n = db.rebuild_table("baseline_typed", SCHEMA_BASELINE_TYPED, INDEX_BASELINE_TYPED)
+    logging.info(f"baseline_typed : swapped in {n} values.")
+
+    # Fields extracted with --typed-baseline are versioned by this table.
+    db.record_source_version("baseline_typed", "rebuild", n)
+
+    return n
+
+
+def rebuild_participant_constants(db) -> int:
+    """
+    Rebuilds the `participant_constants` table from `baseline`
+    (see UKBDatabase.set_participant_constants and
+    pomegranate.db.participant_constants).
+
+    Returns the number of participants in the new table.
+    """
+
+    n = db.rebuild_table("participant_constants", SCHEMA_PARTICIPANT_CONSTANTS)
+    logging.info(f"participant_constants : swapped in {n} participants.")
+    clear_participant_constants()
+
+    return n
+
+
+def rebuild_baseline_cohort(db) -> int:
+    """
+    Rebuilds the `baseline_cohort` table.
+
+    Returns the number of participants in the new table.
+    """
+
+    # The statements are generated for the table name "{table}",
+    # which `rebuild_table` replaces with the shadow table.
+    n = db.rebuild_table(
+        "baseline_cohort",
+        [
+            get_baseline_cohort_schema(table="{table}"),
+            get_baseline_cohort_gp_ehr(table="{table}"),
+        ],
+    )
+    logging.info(f"baseline_cohort : swapped in {n} participants.")
+
+    return n
+
+
+def rebuild_cohort_phenotype_first(db, basic: bool = False) -> int:
+    """
+    Rebuilds the `cohort_phenotype_first` table, joining
+    `baseline_cohort` with `phenotype_first`.
+
+    Arguments
+    ---------
+
+    db (UKBDatabase) : database
+    basic (bool) : only include the basic baseline columns
+
+    Returns
+    -------
+
+    number of rows in the new table (int)
+    """
+
+    merge = SCHEMA_COHORT_PHENOTYPE_FIRST_MERGE
+    if basic:
+        merge = SCHEMA_COHORT_PHENOTYPE_FIRST_MERGE_BASIC
+
+    n = db.rebuild_table(
+        NAME_COHORT_EVENTS,
+        "CREATE TABLE {table} AS " + merge,
+        SCHEMA_COHORT_PHENOTYPE_FIRST_INDEX,
+    )
+    logging.info(f"{NAME_COHORT_EVENTS} : swapped in {n} rows.")
+
+    return n
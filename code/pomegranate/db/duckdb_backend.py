@@ -0,0 +1,563 @@
+"""
+Module for running extractions against an in-process DuckDB
+database instead of a MySQL server.
+
+`DuckDBDatabase` implements the query interface of MySQLDatabase
+on a DuckDB connection, so all UKBDatabase extractors run
+unchanged: their MySQL statements are translated to DuckDB
+(`translate_sql`) before they are executed. `load_raw_tables`
+loads the raw UK Biobank exports into the same tables as the
+MySQL loaders (see TECHSTACK.md), including the post-processing
+of gp_clinical, so that extractions return the same `phenotypes`
+rows.
+
+Differences to keep in mind:
+    * string comparisons are case-sensitive (as for gp_clinical
+      in MySQL), codes in the other tables are upper case;
+    * secondary indexes are not created, DuckDB scans columns
+      using min/max zone maps instead;
+    * LOAD DATA INFILE is not available, `bulk_insert` inserts
+      DataFrames directly.
+"""
+
+import logging
+import os
+import re
+
+import duckdb
+import pandas as pd
+
+from pomegranate.db.bulk_loader import bulk_insert
+from pomegranate.db.db_config import (
+    DB_TABLES,
+    DERIVED_COLUMNS,
+    RAW_DATE_FORMAT,
+    RAW_FILES,
+)
+from pomegranate.db.ukbdb import UKBDatabase
+
+# Post-processing of the loaded tables, see TECHSTACK.md.
+POST_PROCESS = {
+    "gp_clinical": [
+        """
+        UPDATE gp_clinical
+        SET read_code = CASE
+            WHEN read_2 IS NOT NULL AND read_3 IS NULL THEN read_2
+            WHEN read_2 IS NULL AND read_3 IS NOT NULL THEN read_3
+        END
+        """,
+        """
+        UPDATE gp_clinical
+        SET eventdate = CAST(TRY_STRPTIME(b.value || '-07-01', '%Y-%m-%d') AS DATE)
+        FROM baseline b
+        WHERE YEAR(gp_clinical.eventdate) IN (1902, 1903)
+        AND gp_clinical.eid = b.eid
+        AND b.field = 34
+        AND b.i = 0
+        """,
+    ],
+    "gp_registrations": [
+        """
+        UPDATE gp_registrations
+        SET reg_date = CAST(TRY_STRPTIME(b.value || '-07-01', '%Y-%m-%d') AS DATE)
+        FROM baseline b
+        WHERE YEAR(gp_registrations.reg_date) IN (1902, 1903)
+        AND gp_registrations.eid = b.eid
+        AND b.field = 34
+        AND b.i = 0
+        """,
+        """
+        UPDATE gp_registrations
+        SET deduct_date = CAST(TRY_STRPTIME(b.value || '-07-01', '%Y-%m-%d') AS DATE)
+        FROM baseline b
+        WHERE YEAR(gp_registrations.deduct_date) IN (1902, 1903)
+        AND gp_registrations.eid = b.eid
+        AND b.field = 34
+        AND b.i = 0
+        """,
+    ],
+}
+
+# Quoted strings and identifiers, in MySQL syntax.
+_QUOTED_RE = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`", re.S
+)
+_PARAM_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+_LITERAL_RE = re.compile(r"\x00(\d+)\x00")
+_INT_RE = re.compile(r"\bINT\s*\(\s*\d+\s*\)(\s+UNSIGNED)?", re.I)
+_UNSIGNED_RE = re.compile(r"\s+UNSIGNED\b", re.I)
+_CREATE_INDEX_RE = re.compile(r"CREATE\s+INDEX\s+\w+\s+ON\s+\w+\s*\([^)]*\)\s*;?", re.I)
+_INLINE_INDEX_RE = re.compile(r",\s*(?:INDEX|KEY)\s+\w+\s*\([^)]*\)", re.I)
+_REGEXP_RE = re.compile(r"([\w.]+)\s+(NOT\s+)?REGEXP\s+(\x00\d+\x00)", re.I)
+_DML_RE = re.compile(r"^\s*(INSERT|UPDATE|DELETE)\b", re.I)
+
+
+def translate_sql(sql: str) -> str:
+    """
+    Translates a MySQL statement to DuckDB.
+
+    Double-quoted strings become single-quoted, backticks
+    become double quotes, `STR_TO_DATE` is replaced with
+    `TRY_STRPTIME`, single-argument `ROUND` rounds half to
+    even (as MySQL does for numbers converted from text, see
+    `number_sql`) and returns an integer, `NOW()` returns the
+    local time without time zone, and `REGEXP`, `REPLACE INTO`,
+    `DROP TEMPORARY TABLE`, integer display widths and index
+    definitions are rewritten or removed.
+    """
+
+    literals = []
+
+    def quote(match):
+        token = match.group(0)
+        if token[0] == "`":
+            return '"' + token[1:-1] + '"'
+        literals.append(_unescape(token[1:-1], token[0]))
+        return f"\x00{len(literals) - 1}\x00"
+
+    sql = _QUOTED_RE.sub(quote, sql)
+
+    sql = _CREATE_INDEX_RE.sub("", sql)
+    sql = _INLINE_INDEX_RE.sub("", sql)
+    sql = _INT_RE.sub("INTEGER", sql)
+    sql = _UNSIGNED_RE.sub("", sql)
+    sql = re.sub(r"\bDROP\s+TEMPORARY\s+TABLE\b", "DROP TABLE", sql, flags=re.I)
+    sql = re.sub(r"\bREPLACE\s+INTO\b", "INSERT OR REPLACE INTO", sql, flags=re.I)
+    sql = re.sub(r"\bNOW\s*\(\s*\)", "LOCALTIMESTAMP", sql, flags=re.I)
+    sql = _REGEXP_RE.sub(
+        lambda m: f"{m.group(2) or ''}REGEXP_MATCHES({m.group(1)}, {m.group(3)}, 'i')",
+        sql,
+    )
+
+    sql = _rewrite_calls(
+        sql,
+        "STR_TO_DATE",
+        lambda args: f"CAST(TRY_STRPTIME(CAST({args[0]} AS VARCHAR), {args[1]}) AS DATE)",
+    )
+    sql = _rewrite_calls(
+        sql,
+        "ROUND",
+        lambda args: (
+            f"CAST(ROUND_EVEN({args[0]}, 0) AS BIGINT)"
+            if len(args) == 1
+            else f"ROUND({', '.join(args)})"
+        ),
+    )
+
+    def unquote(match):
+        return "'" + literals[int(match.group(1))].replace("'", "''") + "'"
+
+    return _LITERAL_RE.sub(unquote, sql)
+
+
+def _unescape(value: str, quote: str) -> str:
+    """
+    Internal function, do not use directly.
+
+    Returns the value of a MySQL string literal.
+    """
+
+    value = value.replace(quote * 2, quote)
+
+    return re.sub(
+        r"\\(.)",
+        lambda m: {"n": "\n", "t": "\t", "r": "\r", "0": "\0"}.get(
+            m.group(1), m.group(1) if m.group(1) not in "%_" else m.group(0)
+        ),
+        value,
+    )
+
+
+def _rewrite_calls(sql: str, name: str, rewrite) -> str:
+    """
+    Internal function, do not use directly.
+
+    Replaces every call of function `name` with
+    rewrite(list of argument strings), innermost first.
+    """
+
+    pattern = re.compile(rf"\b{name}\s*\(", re.I)
+    parts = []
+    pos = 0
+
+    while True:
+        match = pattern.search(sql, pos)
+        if match is None:
+            break
+
+        args = []
+        depth = 1
+        start = match.end()
+        i = start
+        while depth > 0:
+            c = sql[i]
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth -= 1
+            if (c == "," and depth == 1) or depth == 0:
+                args.append(_rewrite_calls(sql[start:i].strip(), name, rewrite))
+                start = i + 1
+            i += 1
+
+        parts.append(sql[pos:match.start()])
+        parts.append(rewrite(args))
+        pos = i
+
+    parts.append(sql[pos:])
+
+    return "".join(parts)
+
+
+def _prepare(sql: str, sql_params=None) -> tuple:
+    """
+    Internal function, do not use directly.
+
+    Converts PyMySQL placeholders to DuckDB placeholders
+    and translates the statement.
+    """
+
+    if sql_params is not None:
+        sql = _PARAM_RE.sub(
+            lambda m: "%" if m.group(0) == "%%" else (f"${m.group(1)}" if m.group(1) else "?"),
+            sql,
+        )
+        if not isinstance(sql_params, dict):
+            sql_params = list(sql_params)
+
+    return translate_sql(sql), sql_params
+
+
+class DuckDBCursor:
+    """
+    PyMySQL-like cursor on a DuckDB connection.
+    """
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+
+    def execute(self, sql: str, sql_params=None):
+        sql, sql_params = _prepare(sql, sql_params)
+        if sql_params:
+            self.connection.execute(sql, sql_params)
+        else:
+            self.connection.execute(sql)
+
+        # DuckDB returns the number of affected rows as a result.
+        last = sql.strip().rstrip(";").split(";")[-1]
+        if _DML_RE.match(last):
+            self.rowcount = self.connection.fetchone()[0]
+            self.description = None
+        else:
+            self.rowcount = -1
+            self.description = self.connection.description
+
+        return self.rowcount
+
+    def executemany(self, sql: str, rows):
+        rows = [list(row) for row in rows]
+        sql, _ = _prepare(sql, [])
+        self.connection.executemany(sql, rows)
+        self.rowcount = len(rows)
+        self.description = None
+
+        return self.rowcount
+
+    def fetchone(self):
+        return self.connection.fetchone() if self.description else None
+
+    def fetchmany(self, size: int):
+        return self.connection.fetchmany(size) if self.description else []
+
+    def fetchall(self):
+        return self.connection.fetchall() if self.description else []
+
+    def nextset(self):
+        return False
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class DuckDBDatabase(UKBDatabase):
+    """
+    UK Biobank queries on an in-process DuckDB database.
+    """
+
+    def __init__(
+        self,
+        database: str = ":memory:",
+        read_only: bool = False,
+        connection=None,
+        typed_baseline: bool = False,
+        participant_constants: bool = False,
+    ) -> None:
+        """
+        Creates a new instance of the class.
+
+        Parameters
+        ----------
+        database : DuckDB database file, or ':memory:'
+        read_only : open the database file read-only
+        connection : DuckDB connection to share the database of
+                     (used by `clone`)
+        typed_baseline : extract from `baseline_typed`, see
+                         UKBDatabase.set_typed_baseline
+        participant_constants : look up birth and assessment dates in
+                                `participant_constants`, see
+                                UKBDatabase.set_participant_constants
+        """
+
+        self.config = {
+            "db": "main",
+            "database": database,
+            "read_only": read_only,
+            "pooled": False,
+            "autocommit": True,
+            "typed_baseline": typed_baseline,
+            "participant_constants": participant_constants,
+        }
+        self._parent = connection
+        self.connect()
+        self._init_extractors()
+
+    def connect(self):
+        """
+        Connect to the database.
+        """
+
+        if self._parent is not None:
+            self.connection = self._parent.cursor()
+        else:
+            self.connection = duckdb.connect(
+                self.config["database"], read_only=self.config["read_only"]
+            )
+        self.cursor = DuckDBCursor(self.connection)
+
+    def is_connected(self):
+        """
+        Check if we are still connected to the database.
+        """
+
+        return self.connection is not None
+
+    def commit(self):
+        """
+        Commit the current transaction, if one was started
+        with `connection.begin()`. Otherwise statements are
+        committed as they run.
+        """
+
+        try:
+            self.connection.commit()
+        except duckdb.TransactionException:
+            pass
+
+    def get_config(self) -> dict:
+        """
+        Returns the keyword arguments needed to create a new
+        instance with the same configuration.
+        """
+
+        return {
+            "database": self.config["database"],
+            "read_only": self.config["read_only"],
+            "typed_baseline": self.config["typed_baseline"],
+            "participant_constants": self.config["participant_constants"],
+        }
+
+    def clone(self, **kwargs):
+        """
+        Returns a new instance with its own connection to the
+        same database.
+        """
+
+        return type(self)(connection=self.connection, **self.get_config())
+
+    def number_sql(self, expr: str) -> str:
+        """
+        Returns a SQL expression using the text expression `expr`
+        as a number, NULL if it is not numeric.
+        """
+
+        return f"TRY_CAST({expr} AS DOUBLE)"
+
+    def query_stream(
+        self,
+        sql: str,
+        sql_params: list = None,
+        chunk_size: int = 10000,
+        as_frame: bool = False,
+    ):
+        """
+        Execute a query and yield the results in chunks.
+        See MySQLDatabase.query_stream.
+        """
+
+        cursor = self.connection.cursor()
+        try:
+            sql, sql_params = _prepare(sql, sql_params)
+            if sql_params:
+                cursor.execute(sql, sql_params)
+            else:
+                cursor.execute(sql)
+
+            columns = [x[0] for x in cursor.description]
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                if as_frame:
+                    yield pd.DataFrame(chunk, columns=columns)
+                else:
+                    yield chunk
+        finally:
+            cursor.close()
+
+    def bulk_insert(
+        self,
+        table: str,
+        data,
+        columns: list = None,
+        method: str = "executemany",
+        chunk_size: int = 10000,
+    ) -> int:
+        """
+        Inserts a DataFrame or an iterable of tuples into a table.
+        DataFrames are inserted in a single statement, whatever
+        the method.
+        """
+
+        if not isinstance(data, pd.DataFrame):
+            return bulk_insert(self, table, data, columns, "executemany", chunk_size)
+
+        if columns is None:
+            columns = list(data.columns)
+        frame = data[columns].astype(object).where(data[columns].notna(), None)
+
+        self.connection.register("bulk_insert_frame", frame)
+        try:
+            self.connection.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"SELECT {', '.join(columns)} FROM bulk_insert_frame"
+            )
+            n = self.connection.fetchone()[0]
+        finally:
+            self.connection.unregister("bulk_insert_frame")
+
+        logging.info(f"Loaded {n} rows into {table}.")
+
+        return n
+
+
+def create_table(db, table: str):
+    """
+    (Re-)creates a table of DB_TABLES, without its indexes.
+    """
+
+    db.query(DB_TABLES[table])
+
+
+def load_raw_table(db, table: str, file: str) -> int:
+    """
+    Loads a raw UK Biobank export into `table`, replacing its
+    contents, and records the load in `source_versions`.
+
+    Columns are matched by position, empty values are loaded
+    as NULL and dates are parsed with RAW_DATE_FORMAT, as in
+    the MySQL loaders.
+
+    Returns the number of rows loaded.
+    """
+
+    create_table(db, table)
+
+    sql = """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = 'main'
+        AND table_name = %s
+        ORDER BY ordinal_position
+    """
+    columns = db.query(sql, [table]).fetchall()
+    derived = DERIVED_COLUMNS.get(table, [])
+    columns = [(c, t) for c, t in columns if c not in derived]
+
+    if table == "baseline":
+        delimiter = ","
+        date_format = "%Y-%m-%d"
+    else:
+        delimiter = "\t"
+        date_format = RAW_DATE_FORMAT
+
+    expressions = []
+    for column, data_type in columns:
+        if data_type == "DATE":
+            expressions.append(
+                f"CAST(TRY_STRPTIME(NULLIF({column}, ''), '{date_format}') AS DATE)"
+            )
+        elif data_type == "VARCHAR":
+            expressions.append(f"NULLIF({column}, '')")
+        else:
+            expressions.append(f"TRY_CAST(NULLIF({column}, '') AS {data_type})")
+
+    raw_columns = ", ".join(f"'{c}': 'VARCHAR'" for c, _ in columns)
+    db.connection.execute(
+        f"""
+        INSERT INTO {table} ({", ".join(c for c, _ in columns)})
+        SELECT {", ".join(expressions)}
+        FROM read_csv(
+            '{file}',
+            delim = '{delimiter}',
+            header = true,
+            quote = '"',
+            columns = {{{raw_columns}}}
+        )
+        """
+    )
+    n = db.connection.fetchone()[0]
+
+    for sql in POST_PROCESS.get(table, []):
+        db.connection.execute(sql)
+
+    db.record_source_version(table, os.path.basename(file), n)
+
+    logging.info(f"Loaded {n} rows from {file} into {table}.")
+
+    return n
+
+
+def load_raw_tables(db, source_dir: str, tables: list = None) -> dict:
+    """
+    Loads the raw exports in `source_dir` (named as in
+    RAW_FILES) and creates an empty `phenotypes` table if
+    there is none. The baseline is loaded first, as the
+    post-processing of the GP tables uses it.
+
+    Returns a dict {table: number of rows loaded}.
+    """
+
+    if tables is None:
+        tables = [
+            t for t in RAW_FILES if os.path.exists(os.path.join(source_dir, RAW_FILES[t]))
+        ]
+    tables = sorted(tables, key=list(RAW_FILES.keys()).index)
+
+    counts = {}
+    for table in tables:
+        counts[table] = load_raw_table(
+            db, table, os.path.join(source_dir, RAW_FILES[table])
+        )
+
+    existing = db.query(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'phenotypes'"
+    ).fetchall()[0][0]
+    if not existing:
+        create_table(db, "phenotypes")
+
+    return counts
@@ -0,0 +1,130 @@
+"""
+Module for building the `phenotype_first` table.
+
+A full build computes the first events into a shadow table and
+swaps it with the live table (see `MySQLDatabase.rebuild_table`),
+so readers never see a missing or partially built table. An
+incremental build only recomputes the given phenotypes, replacing
+their rows in one transaction.
+
+Each build is recorded in `table_builds`, so that the phenotypes
+extracted since the last build can be found in the extraction
+manifest (see `get_changed_phenotypes`).
+"""
+
+import logging
+
+from pomegranate.db.schemas.phenotype_first import (
+    INDEX_PHENOTYPE_FIRST,
+    get_phenotype_first_select,
+)
+from pomegranate.db.schemas.table_builds import CREATE_TABLE_BUILDS
+
+FIRST_EVENTS_TABLE = "phenotype_first"
+
+
+def build_phenotype_first(db, phenotypes: list = None) -> int:
+    """
+    Builds the `phenotype_first` table.
+
+    Arguments
+    ---------
+
+    db (UKBDatabase) : database
+    phenotypes (list) : only recompute these phenotypes (default:
+                        rebuild the whole table)
+
+    Returns
+    -------
+
+    number of first events written (int)
+    """
+
+    db.query(CREATE_TABLE_BUILDS)
+    started_at = db.query("SELECT NOW()").fetchall()[0][0]
+
+    if phenotypes is None or not db.table_exists(FIRST_EVENTS_TABLE):
+        n = _build_full(db)
+        build_type = "full"
+    else:
+        n = _build_incremental(db, phenotypes)
+        build_type = "incremental"
+
+    db.query(
+        """
+        REPLACE INTO table_builds
+        (table_name, build_type, num_rows, built_at)
+        VALUES (%s, %s, %s, %s)
+        """,
+        [FIRST_EVENTS_TABLE, build_type, n, started_at],
+    )
+
+    return n
+
+
+def get_changed_phenotypes(db) -> list:
+    """
+    Returns the phenotypes extracted since `phenotype_first`
+    was last built, or None if no build was recorded.
+    """
+
+    db.query(CREATE_TABLE_BUILDS)
+    r = db.query(
+        "SELECT built_at FROM table_builds WHERE table_name = %s",
+        [FIRST_EVENTS_TABLE],
+    ).fetchall()
+    if len(r) == 0:
+        return None
+
+    sql = """
+        SELECT DISTINCT phenotype
+        FROM extraction_manifest
+        WHERE extracted_at >= %s
+    """
+
+    return sorted(x[0] for x in db.query(sql, [r[0][0]]).fetchall())
+
+
+def _build_full(db) -> int:
+    """
+    Internal function, do not use directly.
+    """
+
+    n = db.rebuild_table(
+        FIRST_EVENTS_TABLE,
+        "CREATE TABLE {table} AS " + get_phenotype_first_select(),
+        INDEX_PHENOTYPE_FIRST,
+    )
+    logging.info(f"{FIRST_EVENTS_TABLE} : swapped in {n} events.")
+
+    return n
+
+
+def _build_incremental(db, phenotypes: list) -> int:
+    """
+    Internal function, do not use directly.
+    """
+
+    phenotypes_sql = db.list_to_sql(phenotypes)
+
+    db.connection.begin()
+    try:
+        deleted = db.query(
+            f"DELETE FROM {FIRST_EVENTS_TABLE} WHERE phenotype IN {phenotypes_sql}"
+        ).rowcount
+        n = db.query(
+            f"INSERT INTO {FIRST_EVENTS_TABLE} "
+            + get_phenotype_first_select(phenotypes_sql)
+        ).rowcount
+        db.connection.commit()
+    except Exception:
+        db.connection.rollback()
+        raise
+
+    logging.info(
+        f"{FIRST_EVENTS_TABLE} : {len(phenotypes)} phenotypes : "
+        f"replaced {deleted} with {n} events."
+    )
+
+    return n
+
@@ -2,7 +2,10 @@
 
 import os
 
+import pandas as pd
 import pymysql
+from pomegranate.db.bulk_loader import bulk_insert
+from pomegranate.db.pool import DEFAULT_POOL_SIZE, get_pool
 from pomegranate.exceptions import GenericException
 from pomegranate.error_codes import ErrorCode
 from sqlalchemy import create_engine
@@ -29,6 +32,10 @@ class MySQLDatabase:
         passwd : MySQL password
         autocommit : autocommit flag (default: True)
         cursorclass : cursor class (default pymysql.cursors.Cursor)
+        local_infile : allow LOAD DATA LOCAL INFILE (default: False)
+        pooled : check the connection out of a process-wide pool,
+                 disconnect() returns it to the pool (default: False)
+        pool_size : maximum connections in the pool (default: 8)
 
         Note:
         ------
@@ -53,6 +60,9 @@ class MySQLDatabase:
         )
         self.config["autocommit"] = kwargs.get("autocommit", True)
         self.config["cursorclass"] = kwargs.get("cursorclass", pymysql.cursors.Cursor)
+        self.config["local_infile"] = kwargs.get("local_infile", False)
+        self.config["pooled"] = kwargs.get("pooled", False)
+        self.config["pool_size"] = kwargs.get("pool_size", DEFAULT_POOL_SIZE)
         self.connect()
 
     def connect(self):
@@ -62,17 +72,12 @@ class MySQLDatabase:
 
         try:
 
-            self.connection = pymysql.connect(
-                host=self.config["host"],
-                user=self.config["user"],
-                passwd=self.config["passwd"],
-                port=self.config["port"],
-                db=self.config["db"],
-                cursorclass=self.config["cursorclass"],
-                client_flag=pymysql.constants.CLIENT.MULTI_STATEMENTS,
-            )
+            if self.config["pooled"]:
+                self.connection = self._get_pool().acquire()
+            else:
+                self.connection = self._new_connection()
 
-            self.cursor = self.connection.cursor()
+            self.cursor = self.connection.cursor(self.config["cursorclass"])
             self.connection.autocommit(self.config["autocommit"])
 
         except Exception as e:
@@ -83,6 +88,37 @@ class MySQLDatabase:
 
             raise db_connection_not_working
 
+    def _new_connection(self):
+        """
+        Internal function, do not use directly.
+        """
+
+        return pymysql.connect(
+            host=self.config["host"],
+            user=self.config["user"],
+            passwd=self.config["passwd"],
+            port=self.config["port"],
+            db=self.config["db"],
+            cursorclass=self.config["cursorclass"],
+            client_flag=pymysql.constants.CLIENT.MULTI_STATEMENTS,
+            local_infile=self.config["local_infile"],
+        )
+
+    def _get_pool(self):
+        """
+        Internal function, do not use directly.
+        """
+
+        key = (
+            self.config["host"],
+            self.config["port"],
+            self.config["db"],
+            self.config["user"],
+            self.config["local_infile"],
+        )
+
+        return get_pool(key, self._new_connection, self.config["pool_size"])
+
     def commit(self):
         """
         Commit all pending transaction queries
@@ -93,18 +129,26 @@ class MySQLDatabase:
 
     def disconnect(self):
         """
-        Terminate connection to database.
+        Terminate connection to database, or return it to the
+        pool if the connection is pooled.
         """
 
+        if self.connection is None:
+            return
+
         self.cursor.close()
-        self.connection.close()
+        if self.config["pooled"]:
+            self._get_pool().release(self.connection)
+        else:
+            self.connection.close()
+        self.connection = None
 
     def is_connected(self):
         """
         Check if we are still connected to the database.
         """
 
-        return self.connection.open
+        return self.connection is not None and self.connection.open
 
     def get_connection(self):
         """
@@ -113,6 +157,32 @@ class MySQLDatabase:
 
         return self.connection
 
+    def get_config(self) -> dict:
+        """
+        Returns the keyword arguments needed to create a new
+        instance with the same configuration.
+        """
+
+        config = dict(self.config)
+        config["username"] = config.pop("user")
+
+        return config
+
+    def clone(self, **kwargs):
+        """
+        Returns a new instance of the same class with its own
+        connection, using the same configuration. Any keyword
+        arguments override the current configuration.
+
+        Useful when one connection is busy streaming a result
+        set while another one is needed for writing.
+        """
+
+        config = self.get_config()
+        config.update(kwargs)
+
+        return type(self)(**config)
+
     def count_rows(self, table: str) -> int:
         """
         Count the rows in a table.
@@ -136,6 +206,137 @@ class MySQLDatabase:
 
         return self.query("DROP TABLE IF EXISTS %s" % table)
 
+    def table_exists(self, table: str) -> bool:
+        """
+        Check if a table exists in the current database.
+        """
+
+        sql = """
+        SELECT COUNT(*)
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_NAME = %s
+        AND TABLE_SCHEMA = %s
+        """
+
+        return self.query(sql, [table, self.config["db"]]).fetchall()[0][0] > 0
+
+    def rebuild_table(
+        self,
+        table: str,
+        build_sql,
+        index_sql=None,
+        min_ratio: float = 0.5,
+        allow_empty: bool = False,
+        keep_previous: bool = True,
+    ) -> int:
+        """
+        Rebuilds a table without downtime.
+
+        The table is built into the shadow table `<table>_new`,
+        indexed and validated, then swapped with the live table
+        in a single (atomic) RENAME TABLE. The live table stays
+        readable throughout and is left untouched if any step
+        fails. The previous version is kept as `<table>_old`,
+        see `restore_previous_table`.
+
+        Parameters
+        ----------
+            table = table name (str)
+            build_sql = statement(s) creating and populating the
+                        table, with `{table}` in place of the table
+                        name (str or list of str)
+            index_sql = statement(s) creating the indexes, with
+                        `{table}` in place of the table name
+                        (str or list of str)
+            min_ratio = minimum number of rows, as a fraction of the
+                        rows of the live table (float)
+            allow_empty = accept an empty table (bool)
+            keep_previous = keep the previous version (bool)
+
+        Returns
+        -------
+            number of rows in the new table (int)
+        """
+
+        shadow = f"{table}_new"
+        previous = f"{table}_old"
+
+        self.drop_table_if_exists(shadow)
+        for sql in self._as_statements(build_sql):
+            self.execute_multiple(sql.format(table=shadow))
+        for sql in self._as_statements(index_sql):
+            self.execute_multiple(sql.format(table=shadow))
+
+        num_rows = self._count(shadow)
+        num_rows_live = self._count(table) if self.table_exists(table) else None
+
+        if num_rows == 0 and not allow_empty:
+            raise GenericException(
+                ErrorCode.TABLE_VALIDATION_FAILED, f"{shadow} is empty."
+            )
+        if num_rows_live is not None and num_rows < min_ratio * num_rows_live:
+            raise GenericException(
+                ErrorCode.TABLE_VALIDATION_FAILED,
+                f"{shadow} has {num_rows} rows, {table} has {num_rows_live}.",
+            )
+
+        self.drop_table_if_exists(previous)
+        if num_rows_live is not None:
+            self.query(
+                f"RENAME TABLE {table} TO {previous}, {shadow} TO {table}"
+            )
+        else:
+            self.query(f"RENAME TABLE {shadow} TO {table}")
+
+        if not keep_previous:
+            self.drop_table_if_exists(previous)
+
+        return num_rows
+
+    def restore_previous_table(self, table: str):
+        """
+        Swaps a table rebuilt with `rebuild_table` back with its
+        previous version, so that calling it again undoes the
+        rollback.
+        """
+
+        previous = f"{table}_old"
+        if not self.table_exists(previous):
+            raise GenericException(
+                ErrorCode.TABLE_NOT_FOUND, f"{previous} does not exist."
+            )
+
+        swap = f"{table}_swap"
+        self.drop_table_if_exists(swap)
+        self.query(
+            f"""
+            RENAME TABLE
+                {table} TO {swap},
+                {previous} TO {table},
+                {swap} TO {previous}
+            """
+        )
+
+    @staticmethod
+    def _as_statements(sql) -> list:
+        """
+        Internal function, do not use directly.
+        """
+
+        if sql is None:
+            return []
+        if isinstance(sql, str):
+            return [sql]
+
+        return list(sql)
+
+    def _count(self, table: str) -> int:
+        """
+        Internal function, do not use directly.
+        """
+
+        return self.query(f"SELECT COUNT(*) FROM {table}").fetchall()[0][0]
+
     def query(self, sql: str, sql_params: list = None):
         """
         Execute a query.
@@ -166,6 +367,58 @@ class MySQLDatabase:
 
         return self.cursor
 
+    def query_stream(
+        self,
+        sql: str,
+        sql_params: list = None,
+        chunk_size: int = 10000,
+        as_frame: bool = False,
+    ):
+        """
+        Execute a query using a server-side (unbuffered) cursor and
+        yield the results in chunks, so that large result sets are
+        never held in memory at once.
+
+        No other query may run on this connection until the
+        generator is exhausted or closed.
+
+        Parameters
+        ----------
+            sql = sql statement (str)
+            sql_params = sql statement params (list)
+            chunk_size = number of rows per chunk (int)
+            as_frame = yield pandas DataFrames instead of lists (bool)
+
+        Output
+        ------
+            generator of lists of rows (or pd.DataFrame)
+
+        """
+
+        if issubclass(self.config["cursorclass"], pymysql.cursors.DictCursorMixin):
+            cursor = self.connection.cursor(pymysql.cursors.SSDictCursor)
+        else:
+            cursor = self.connection.cursor(pymysql.cursors.SSCursor)
+
+        try:
+            try:
+                cursor.execute(sql, sql_params)
+            except Exception as e:
+                print("Query failed: ", sql, "params: ", sql_params, " exception: ", e)
+                raise
+
+            columns = [x[0] for x in cursor.description]
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                if as_frame:
+                    yield pd.DataFrame(list(chunk), columns=columns)
+                else:
+                    yield chunk
+        finally:
+            cursor.close()
+
     def execute_multiple(self, sql: str, sql_params: list = None):
         """
         Execute multiple SQL statements separated by semicolons.
@@ -204,6 +457,42 @@ class MySQLDatabase:
             )
             raise
 
+    def bulk_insert(
+        self,
+        table: str,
+        data,
+        columns: list = None,
+        method: str = "executemany",
+        chunk_size: int = 10000,
+    ) -> int:
+        """
+        Inserts a DataFrame or an iterable of tuples into a table
+        in chunks. See `pomegranate.db.bulk_loader.bulk_insert`.
+
+        Parameters
+        ----------
+            table = table name (str)
+            data = rows to insert (pd.DataFrame or iterable of tuples)
+            columns = column names, defaults to the DataFrame columns (list)
+            method = 'executemany' or 'infile' (str)
+            chunk_size = rows per statement (int)
+
+        Returns
+        -------
+            number of rows inserted (int)
+        """
+
+        return bulk_insert(self, table, data, columns, method, chunk_size)
+
+    def number_sql(self, expr: str) -> str:
+        """
+        Returns a SQL expression using the text expression `expr`
+        as a number. MySQL converts text to numbers implicitly,
+        so `expr` is returned unchanged.
+        """
+
+        return expr
+
     def get_column_names(self, database: str, table: str) -> list:
         """
         Returns the column names for a given schema / table
@@ -0,0 +1,187 @@
+"""
+Module for the in-memory cache of the `participant_constants`
+table (see pomegranate.db.derived.rebuild_participant_constants).
+
+The year and date of birth, assessment centre dates and date of
+death of every participant are read once per process and held as
+NumPy arrays aligned on the sorted eids, so that the constants of
+any set of participants are looked up with `np.searchsorted`
+instead of a query, and dates are gathered for every row of
+an event frame at once (see pomegranate.dates).
+"""
+
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from pomegranate.db.schemas.participant_constants import (
+    PARTICIPANT_CONSTANTS_COLUMNS,
+)
+from pomegranate.db.ukbdb import UKBDatabase
+
+# Columns of `baseline_cohort` the constants are read from
+# if the `participant_constants` table has not been built.
+BASELINE_COHORT_CONSTANTS = {
+    "eid": "eid",
+    "yob": "f34",
+    "dob": "dob",
+    "date_assessment_0": "f53",
+    "dod": "f40000",
+}
+
+# Seconds after which the cached constants are read again, so
+# that long-running processes pick up rebuilds of the table.
+CACHE_TTL = 12 * 60 * 60
+
+_constants = None
+_loaded_at = 0.0
+
+
+class ParticipantConstants:
+    """
+    Constants of a set of participants, held as NumPy arrays
+    aligned on their sorted eids. Dates are `datetime64[D]`
+    arrays (NaT if missing), the year of birth a float array
+    (NaN if missing).
+    """
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        """
+        Creates a new instance of the class from a dataframe
+        with an `eid` column and columns of constants.
+        """
+
+        df = df.sort_values("eid")
+        self.eids = df["eid"].to_numpy(dtype=np.int64)
+        assert np.all(self.eids[1:] != self.eids[:-1]), AssertionError(
+            "There are duplicate eids in the participant constants."
+        )
+
+        self.columns = {}
+        for column in df.columns:
+            if column == "eid":
+                continue
+            if column == "yob":
+                values = pd.to_numeric(df[column], errors="coerce")
+                self.columns[column] = values.to_numpy(dtype=np.float64)
+            else:
+                values = pd.to_datetime(df[column], errors="coerce")
+                self.columns[column] = values.to_numpy(dtype="datetime64[D]")
+
+    def __len__(self) -> int:
+        return len(self.eids)
+
+    def positions(self, eids) -> tuple:
+        """
+        Returns a tuple of the positions of `eids` in the arrays
+        (np.ndarray) and a mask of the eids found (np.ndarray).
+        """
+
+        eids = np.asarray(eids, dtype=np.int64)
+        if len(self.eids) == 0:
+            return np.zeros(len(eids), dtype=np.int64), np.zeros(len(eids), dtype=bool)
+
+        positions = np.searchsorted(self.eids, eids)
+        positions = np.minimum(positions, len(self.eids) - 1)
+
+        return positions, self.eids[positions] == eids
+
+    def lookup(self, column: str, eids) -> np.ndarray:
+        """
+        Returns the values of `column` for `eids`, in the same
+        order, with NaT (or NaN) for the eids not found.
+        """
+
+        values = self.columns[column]
+        positions, found = self.positions(eids)
+        if values.dtype.kind == "f":
+            missing = np.nan
+        else:
+            missing = np.datetime64("NaT")
+
+        return np.where(found, values[positions], missing)
+
+    def to_frame(self, columns: list, eids=None) -> pd.DataFrame:
+        """
+        Returns a dataframe with the `eid` column and `columns`,
+        with one row per participant of `eids` found (default: all
+        participants). Dates are returned as `datetime64[ns]`.
+        """
+
+        if eids is None:
+            positions = np.arange(len(self.eids))
+        else:
+            positions, found = self.positions(np.unique(np.asarray(eids, dtype=np.int64)))
+            positions = positions[found]
+
+        df = pd.DataFrame({"eid": self.eids[positions]})
+        for column in columns:
+            values = self.columns[column][positions]
+            if values.dtype.kind == "M":
+                values = values.astype("datetime64[ns]")
+            df[column] = values
+
+        return df
+
+
+def load_participant_constants(db) -> ParticipantConstants:
+    """
+    Reads the `participant_constants` table, or the matching
+    columns of `baseline_cohort` if it has not been built, for
+    all participants.
+    """
+
+    if db.table_exists("participant_constants"):
+        columns = PARTICIPANT_CONSTANTS_COLUMNS
+        sql = f"SELECT {', '.join(columns)} FROM participant_constants"
+    else:
+        logging.warning(
+            "participant_constants has not been built, reading baseline_cohort."
+        )
+        columns = list(BASELINE_COHORT_CONSTANTS.keys())
+        sql = f"""
+            SELECT {', '.join(BASELINE_COHORT_CONSTANTS.values())}
+            FROM baseline_cohort
+        """
+
+    rows = db.query(sql).fetchall()
+
+    return ParticipantConstants(pd.DataFrame(data=rows, columns=columns))
+
+
+def get_participant_constants(
+    refresh: bool = False, ttl: float = CACHE_TTL
+) -> ParticipantConstants:
+    """
+    Returns the constants of all participants, read from the
+    database on the first call and cached for the lifetime of
+    the process. They are read again if `refresh` is True or if
+    they were read more than `ttl` seconds ago (None: never).
+    """
+
+    global _constants, _loaded_at
+
+    expired = ttl is not None and time.monotonic() - _loaded_at > ttl
+
+    if _constants is None or refresh or expired:
+        with UKBDatabase(pooled=True) as db:
+            _constants = load_participant_constants(db)
+        _loaded_at = time.monotonic()
+        logging.info(f"Cached the constants of {len(_constants)} participants.")
+
+    return _constants
+
+
+def clear_participant_constants():
+    """
+    Drops the cached constants, e.g. after rebuilding the
+    `participant_constants` table, so that the next call to
+    `get_participant_constants` reads them again.
+    """
+
+    global _constants, _loaded_at
+
+    _constants = None
+    _loaded_at = 0.0
@@ -0,0 +1,183 @@
+"""
+A module for sharing database connections within a process.
+
+Opening a MySQL connection costs a TCP and authentication round
+trip. Helpers which are called in loops (e.g. from notebooks) check
+connections out of a process-wide pool instead of opening a new one
+each time.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from pomegranate.exceptions import GenericException
+from pomegranate.error_codes import ErrorCode
+
+DEFAULT_POOL_SIZE = int(os.getenv("POMEGRANATE_DB_POOL_SIZE", "8"))
+DEFAULT_IDLE_TIMEOUT = int(os.getenv("POMEGRANATE_DB_POOL_IDLE_TIMEOUT", "300"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections.
+    """
+
+    def __init__(
+        self,
+        connect,
+        size: int = DEFAULT_POOL_SIZE,
+        idle_timeout: int = DEFAULT_IDLE_TIMEOUT,
+    ) -> None:
+        """
+        Creates a new, empty pool.
+
+        Arguments
+        ---------
+
+        connect (callable) : returns a new connection
+        size (int) : maximum number of connections checked out at once
+        idle_timeout (int) : seconds after which idle connections are closed
+        """
+
+        self._connect = connect
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout: float = None):
+        """
+        Checks out a connection, reusing an idle one if it is still
+        alive and opening a new one otherwise. Blocks if `size`
+        connections are checked out already.
+        """
+
+        if not self._slots.acquire(timeout=timeout):
+            raise GenericException(
+                ErrorCode.DB_POOL_EXHAUSTED,
+                f"No connection available after {timeout} seconds.",
+            )
+
+        try:
+            connection = self._get_idle()
+            if connection is None:
+                connection = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        return connection
+
+    def release(self, connection):
+        """
+        Returns a connection to the pool. Uncommitted work is
+        rolled back and closed connections are discarded.
+        """
+
+        try:
+            if connection.open:
+                if not connection.get_autocommit():
+                    connection.rollback()
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        except Exception:
+            _close_quietly(connection)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+
+        with self._lock:
+            while self._idle:
+                _close_quietly(self._idle.popleft()[0])
+
+    def num_idle(self) -> int:
+        """
+        Returns the number of idle connections.
+        """
+
+        return len(self._idle)
+
+    def _get_idle(self):
+        """
+        Internal function, do not use directly.
+
+        Returns the most recently used healthy idle connection,
+        evicting connections idle for longer than `idle_timeout`.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                _close_quietly(self._idle.popleft()[0])
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection = self._idle.pop()[0]
+            if _is_healthy(connection):
+                return connection
+            _close_quietly(connection)
+
+
+def get_pool(key: tuple, connect, size: int = DEFAULT_POOL_SIZE) -> ConnectionPool:
+    """
+    Returns the process-wide pool for `key`, creating it with
+    the `connect` factory if needed. Pools are not shared with
+    forked child processes.
+    """
+
+    global _pools_pid
+
+    with _pools_lock:
+        if os.getpid() != _pools_pid:
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if key not in _pools:
+            _pools[key] = ConnectionPool(connect, size=size)
+        return _pools[key]
+
+
+def close_pools():
+    """
+    Closes the idle connections of all pools in this process.
+    """
+
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def _is_healthy(connection) -> bool:
+    """
+    Internal function, do not use directly.
+    """
+
+    try:
+        connection.ping(reconnect=True)
+        return True
+    except Exception:
+        return False
+
+
+def _close_quietly(connection):
+    """
+    Internal function, do not use directly.
+    """
+
+    try:
+        connection.close()
+    except Exception:
+        pass
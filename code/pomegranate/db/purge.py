@@ -0,0 +1,151 @@
+"""
+Module for removing withdrawn participants from the database.
+
+The eids to remove are loaded into a temporary table, split into
+batches, and every table with an `eid` column is purged by joining
+against it a batch at a time. Tables without an index on `eid` are
+purged with a single join instead, to avoid one full scan per batch.
+The previous versions of rebuilt tables (`<table>_old`, see
+MySQLDatabase.rebuild_table) and leftover staging tables (see
+pomegranate.db.delta) are purged too, so that a rollback cannot
+bring the records back. All deletes run in one transaction.
+"""
+
+import logging
+import math
+
+from pomegranate.db.db_config import DB_TABLES, DERIVED_TABLES
+from pomegranate.db.delta import get_staging_table
+
+PURGE_TABLE = "purge_eids"
+
+# Suffix of the previous version of a table, see
+# MySQLDatabase.rebuild_table.
+PREVIOUS_SUFFIX = "_old"
+
+
+def read_eids(file: str) -> list:
+    """
+    Reads a withdrawal list with one eid per line.
+    Empty lines and non-numeric lines (e.g. headers)
+    are ignored.
+    """
+
+    eids = []
+    with open(file, "r") as f:
+        for line in f:
+            line = line.strip().split(",")[0]
+            if line.isdigit():
+                eids.append(int(line))
+
+    return eids
+
+
+def get_table_copies(table: str) -> list:
+    """
+    Returns the names of the other tables which may hold records
+    of `table`: its previous version and its staging table.
+    """
+
+    return [table + PREVIOUS_SUFFIX, get_staging_table(table)]
+
+
+def get_purge_tables(db, tables: list = None) -> dict:
+    """
+    Returns a dict {table: indexed} with the tables in `tables`
+    (default: DB_TABLES and DERIVED_TABLES) and their copies (see
+    `get_table_copies`) which exist and have an `eid` column, and
+    whether an index on the table starts with `eid`.
+    """
+
+    if tables is None:
+        tables = list(DB_TABLES.keys()) + DERIVED_TABLES
+    tables = [t for table in tables for t in [table] + get_table_copies(table)]
+
+    sql = f"""
+        SELECT
+            c.TABLE_NAME,
+            MAX(s.COLUMN_NAME IS NOT NULL) AS indexed
+        FROM information_schema.COLUMNS c
+        LEFT OUTER JOIN information_schema.STATISTICS s
+            ON s.TABLE_SCHEMA = c.TABLE_SCHEMA
+            AND s.TABLE_NAME = c.TABLE_NAME
+            AND s.COLUMN_NAME = c.COLUMN_NAME
+            AND s.SEQ_IN_INDEX = 1
+        WHERE c.TABLE_SCHEMA = DATABASE()
+        AND c.COLUMN_NAME = 'eid'
+        AND c.TABLE_NAME IN {db.list_to_sql(tables)}
+        GROUP BY c.TABLE_NAME
+    """
+
+    found = {t: bool(indexed) for t, indexed in db.query(sql).fetchall()}
+
+    return {t: found[t] for t in tables if t in found}
+
+
+def purge_eids(
+    db, eids, tables: list = None, batch_size: int = 10000, dry_run: bool = False
+) -> dict:
+    """
+    Deletes all records of the participants in `eids`.
+
+    Arguments
+    ---------
+
+    db (UKBDatabase) : database
+    eids (iterable) : eids to delete
+    tables (list) : tables to purge (default: see `get_purge_tables`)
+    batch_size (int) : number of eids deleted per statement
+    dry_run (bool) : only count the records which would be deleted
+
+    Returns
+    -------
+
+    dict {table: number of records (to be) deleted}
+    """
+
+    purge_tables = get_purge_tables(db, tables)
+
+    n_eids = db.create_eid_table(PURGE_TABLE, eids, batch_size=batch_size)
+    n_batches = math.ceil(n_eids / batch_size)
+    logging.info(
+        f"Purging {n_eids} eids from {len(purge_tables)} tables "
+        f"in {n_batches} batches."
+    )
+
+    counts = {}
+    try:
+        if dry_run:
+            for table in purge_tables:
+                sql = f"SELECT COUNT(*) FROM {table} t JOIN {PURGE_TABLE} p ON p.eid = t.eid"
+                counts[table] = db.query(sql).fetchall()[0][0]
+                logging.info(f"{table} : dry run : {counts[table]} records.")
+        else:
+            _delete(db, purge_tables, n_batches, counts)
+    finally:
+        db.query(f"DROP TEMPORARY TABLE IF EXISTS {PURGE_TABLE}")
+
+    return counts
+
+
+def _delete(db, purge_tables: dict, n_batches: int, counts: dict):
+    """
+    Internal function, do not use directly.
+    """
+
+    db.connection.begin()
+    try:
+        for table, indexed in purge_tables.items():
+            sql = f"DELETE t FROM {table} t JOIN {PURGE_TABLE} p ON p.eid = t.eid"
+            if indexed:
+                counts[table] = 0
+                for batch in range(n_batches):
+                    sql_batch = sql + " WHERE p.batch = %s"
+                    counts[table] += db.query(sql_batch, [batch]).rowcount
+            else:
+                counts[table] = db.query(sql).rowcount
+            logging.info(f"{table} : deleted {counts[table]} records.")
+        db.connection.commit()
+    except Exception:
+        db.connection.rollback()
+        raise
@@ -0,0 +1,320 @@
+"""
+Module for the initial load of the raw UK Biobank exports into
+MySQL.
+
+Loading into indexed tables with a transaction per statement is
+dominated by index maintenance and log flushes, so tables are
+loaded in bulk-load mode instead:
+    * tables are created without their secondary indexes
+      (see `split_schema`);
+    * unique and foreign key checks and autocommit are turned
+      off for the session (see `bulk_load_session`);
+    * the files are loaded with LOAD DATA LOCAL INFILE in chunks
+      of `chunk_size` rows, committing after each chunk so the
+      undo log stays small;
+    * the indexes are built once the table is loaded, with a
+      single ALTER TABLE per table.
+
+The connection must be created with `local_infile=True`.
+"""
+
+import gzip
+import logging
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+
+from pomegranate.db.db_config import (
+    DB_TABLES,
+    DERIVED_COLUMNS,
+    RAW_DATE_FORMAT,
+    RAW_FILES,
+)
+
+DEFAULT_CHUNK_SIZE = 5000000
+
+# Post-processing of the loaded tables, see TECHSTACK.md.
+POST_LOAD = {
+    "gp_clinical": [
+        # Case-sensitive Read codes ('44f..' is not '44F..').
+        "ALTER TABLE gp_clinical CONVERT TO CHARACTER SET utf8 COLLATE utf8_bin",
+        """
+        UPDATE gp_clinical
+        SET read_code = CASE
+            WHEN read_2 IS NOT NULL AND read_3 IS NULL THEN read_2
+            WHEN read_2 IS NULL AND read_3 IS NOT NULL THEN read_3
+        END
+        """,
+        """
+        UPDATE gp_clinical g, baseline b
+        SET g.eventdate = STR_TO_DATE(CONCAT(b.value, '-07-01'), '%Y-%m-%d')
+        WHERE YEAR(g.eventdate) IN (1902, 1903)
+        AND g.eid = b.eid
+        AND b.field = 34
+        AND b.i = 0
+        """,
+    ],
+    "gp_registrations": [
+        """
+        UPDATE gp_registrations g, baseline b
+        SET g.reg_date = STR_TO_DATE(CONCAT(b.value, '-07-01'), '%Y-%m-%d')
+        WHERE YEAR(g.reg_date) IN (1902, 1903)
+        AND g.eid = b.eid
+        AND b.field = 34
+        AND b.i = 0
+        """,
+        """
+        UPDATE gp_registrations g, baseline b
+        SET g.deduct_date = STR_TO_DATE(CONCAT(b.value, '-07-01'), '%Y-%m-%d')
+        WHERE YEAR(g.deduct_date) IN (1902, 1903)
+        AND g.eid = b.eid
+        AND b.field = 34
+        AND b.i = 0
+        """,
+    ],
+}
+
+_CREATE_INDEX_RE = re.compile(
+    r"CREATE\s+INDEX\s+(\w+)\s+ON\s+(\w+)\s*(\(.*?\))\s*;", re.I | re.S
+)
+
+
+def split_schema(sql: str):
+    """
+    Splits a table schema into the statements creating the
+    table and its CREATE INDEX statements.
+
+    Arguments
+    ---------
+
+    sql (str) : schema, e.g. DB_TABLES['hesin']
+
+    Returns
+    -------
+
+    tuple of the table statements (str) and the index
+    statements (list of str)
+    """
+
+    indexes = [m.group(0) for m in _CREATE_INDEX_RE.finditer(sql)]
+    table_sql = _CREATE_INDEX_RE.sub("", sql).strip() + "\n"
+
+    return table_sql, indexes
+
+
+def get_add_indexes_sql(table: str, indexes: list) -> str:
+    """
+    Returns a single ALTER TABLE statement building all the
+    indexes of `table` given as CREATE INDEX statements, so
+    the table is only read once.
+    """
+
+    definitions = []
+    for sql in indexes:
+        name, _, columns = _CREATE_INDEX_RE.match(sql.strip()).groups()
+        definitions.append(f"ADD INDEX {name} {columns}")
+
+    return f"ALTER TABLE {table} " + ", ".join(definitions)
+
+
+@contextmanager
+def bulk_load_session(db):
+    """
+    Context manager turning off unique and foreign key checks
+    and autocommit on the connection of `db`. Pending changes
+    are committed on exit, or rolled back on error, and the
+    session settings are restored.
+    """
+
+    db.query("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+    db.connection.autocommit(False)
+
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.connection.rollback()
+        raise
+    finally:
+        db.connection.autocommit(db.config["autocommit"])
+        db.query("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+
+
+def iter_file_chunks(file: str, chunk_size: int):
+    """
+    Splits a delimited text file (optionally gzipped) into
+    temporary files of at most `chunk_size` rows, skipping the
+    header. Rows spanning several lines inside double quotes
+    are kept together. Each temporary file is removed once the
+    next one is requested.
+
+    Yields tuples of the temporary file name and its number of rows.
+    """
+
+    opener = gzip.open if file.endswith(".gz") else open
+
+    with opener(file, "rb") as f:
+        next(f, None)
+        exhausted = False
+
+        while not exhausted:
+            n = 0
+            quoted = False
+            with tempfile.NamedTemporaryFile(
+                "wb", suffix=".txt", delete=False
+            ) as chunk:
+                for line in f:
+                    chunk.write(line)
+                    if line.count(b'"') % 2 == 1:
+                        quoted = not quoted
+                    if not quoted:
+                        n += 1
+                        if n == chunk_size:
+                            break
+                else:
+                    exhausted = True
+
+            try:
+                if n > 0:
+                    yield chunk.name, n
+            finally:
+                os.remove(chunk.name)
+
+
+def load_raw_table(
+    db, table: str, file: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    Loads a raw UK Biobank export into `table` in bulk-load
+    mode, replacing its contents, and records the load in
+    `source_versions`.
+
+    Columns are matched by position, empty values are loaded
+    as NULL and dates are parsed with RAW_DATE_FORMAT. Call
+    within `bulk_load_session`.
+
+    Arguments
+    ---------
+
+    db (MySQLDatabase) : database, with local_infile=True
+    table (str) : table name, one of RAW_FILES
+    file (str) : raw export
+    chunk_size (int) : rows per LOAD DATA statement
+
+    Returns
+    -------
+
+    number of rows loaded (int)
+    """
+
+    table_sql, indexes = split_schema(DB_TABLES[table])
+    db.execute_multiple(table_sql)
+
+    sql = """
+        SELECT COLUMN_NAME, DATA_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = %s
+        ORDER BY ORDINAL_POSITION
+    """
+    columns = db.query(sql, [db.config["db"], table]).fetchall()
+    derived = DERIVED_COLUMNS.get(table, [])
+    columns = [(c, t) for c, t in columns if c not in derived]
+
+    # The baseline is the comma separated output of transpose.py.
+    delimiter = "," if table == "baseline" else "\\t"
+
+    # Percent signs are escaped as the statement is sent with parameters.
+    date_format = RAW_DATE_FORMAT.replace("%", "%%")
+    assignments = []
+    for column, data_type in columns:
+        if data_type.lower() == "date":
+            assignments.append(
+                f"`{column}` = IF(@{column} = '', NULL,"
+                f" STR_TO_DATE(@{column}, '{date_format}'))"
+            )
+        else:
+            assignments.append(f"`{column}` = NULLIF(@{column}, '')")
+
+    load_sql = f"""
+        LOAD DATA LOCAL INFILE %s
+        INTO TABLE {table}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY '{delimiter}' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        ({", ".join(f"@{c}" for c, _ in columns)})
+        SET {", ".join(assignments)}
+    """
+
+    start = time.time()
+    n = 0
+    for chunk, _ in iter_file_chunks(file, chunk_size):
+        n += db.query(load_sql, [chunk]).rowcount
+        db.commit()
+        logging.info(f"{table} : loaded {n} rows.")
+
+    for sql in POST_LOAD.get(table, []):
+        db.query(sql)
+        db.commit()
+
+    if indexes:
+        logging.info(f"{table} : building {len(indexes)} indexes.")
+        db.query(get_add_indexes_sql(table, indexes))
+
+    db.record_source_version(table, os.path.basename(file), n)
+    db.commit()
+
+    elapsed = time.time() - start
+    rate = n / elapsed if elapsed > 0 else float("inf")
+    logging.info(
+        f"Loaded {n} rows from {file} into {table} in {elapsed:.1f}s"
+        f" ({rate:.0f} rows/sec)."
+    )
+
+    return n
+
+
+def load_raw_tables(
+    db, source_dir: str, tables: list = None, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> dict:
+    """
+    Loads the raw exports in `source_dir` (named as in
+    RAW_FILES) in bulk-load mode and creates an empty
+    `phenotypes` table if there is none. The baseline is
+    loaded (and indexed) first, as the post-processing of
+    the GP tables uses it.
+
+    Arguments
+    ---------
+
+    db (MySQLDatabase) : database, with local_infile=True
+    source_dir (str) : directory with the raw exports
+    tables (list) : tables to load (default: all files found)
+    chunk_size (int) : rows per LOAD DATA statement
+
+    Returns
+    -------
+
+    dict of {table: number of rows loaded}
+    """
+
+    counts = {}
+
+    with bulk_load_session(db):
+        for table, name in RAW_FILES.items():
+            if tables is not None and table not in tables:
+                continue
+
+            file = os.path.join(source_dir, name)
+            if not os.path.exists(file):
+                logging.warning(f"{table} : {file} not found, skipping.")
+                continue
+
+            counts[table] = load_raw_table(db, table, file, chunk_size)
+
+        if not db.table_exists("phenotypes"):
+            db.execute_multiple(DB_TABLES["phenotypes"])
+
+    return counts
@@ -1,183 +1,103 @@
 """ Schema for the 'baseline_cohort' table. """
 
-SCHEMA_BASELINE_COHORT = """
-DROP TABLE IF EXISTS baseline_cohort;
-CREATE TABLE baseline_cohort AS
+from pomegranate.db.db_config import BASELINE_COHORT_FIELDS
+
+
+def get_baseline_cohort_pivot(fields: list = BASELINE_COHORT_FIELDS) -> str:
+    """
+    Returns a SELECT statement pivoting the baseline fields in
+    `fields` (see BASELINE_COHORT_FIELDS) into one row per eid
+    with a single scan of the `baseline` table.
+    """
+
+    columns = ",\n".join(
+        f"        MAX(CASE WHEN b.field = {field} AND b.i = 0 AND b.n = 0"
+        f" THEN b.value END) AS f{field}"
+        for field, _, _ in fields
+    )
+
+    return f"""
     SELECT
-        DISTINCT(eid)
+        b.eid,
+{columns}
     FROM
-        baseline;
-
-CREATE INDEX e ON baseline_cohort(eid);
-
-ALTER TABLE baseline_cohort
-    ADD COLUMN f31 VARCHAR(50),
-    ADD COLUMN f34 VARCHAR(50),
-    ADD COLUMN f52 VARCHAR(50),
-    ADD COLUMN f53 VARCHAR(50),
-    ADD COLUMN f54 VARCHAR(50),
-    ADD COLUMN country CHAR(1),
-    ADD COLUMN dob DATE,
-    ADD COLUMN f21003 VARCHAR(50),
-    ADD COLUMN f189 VARCHAR(50),
-    ADD COLUMN f21001 VARCHAR(50),
-    ADD COLUMN f50 VARCHAR(50),
-    ADD COLUMN f21002 VARCHAR(50),
-    ADD COLUMN f95 VARCHAR(50),
-    ADD COLUMN f94 VARCHAR(50),
-    ADD COLUMN f20116 VARCHAR(50),
-    ADD COLUMN f20117 VARCHAR(50),
-    ADD COLUMN f21000 VARCHAR(50),
-    ADD COLUMN f40000 DATE,
-    ADD COLUMN gp_ehr INT(1),
-    ADD COLUMN gp_ehr_data_provider INT(1);
-
-UPDATE baseline_cohort c, baseline b
-SET c.f31 = b.value
-WHERE b.field = 31
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f34 = b.value
-WHERE b.field = 34
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f52 = b.value
-WHERE b.field = 52
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f53 = b.value
-WHERE b.field = 53
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f21003 = b.value
-WHERE b.field = 21003
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f189 = b.value
-WHERE b.field = 189
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f21001 = b.value
-WHERE b.field = 21001
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f50 = b.value
-WHERE b.field = 50
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f21002 = b.value
-WHERE b.field = 21002
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE  baseline_cohort c, baseline b
-SET c.f94 = b.value
-WHERE b.field = 94
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f95 = b.value
-WHERE b.field = 95
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f20116 = b.value
-WHERE b.field = 20116
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f20117 = b.value
-WHERE b.field = 20117
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f21000 = b.value
-WHERE b.field = 21000
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c, baseline b
-SET c.f54 = b.value
-WHERE b.field = 54
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c
-SET c.country = IF( -- Glasgow, Edinburgh
-                    c.f54 IN (11005, 11004), 'S',
-                   -- Cardiff, Swansea, Wrexham
-                   IF(c.f54 IN (11003, 11022, 11023), 'W',
-                   'E'));
-
-UPDATE baseline_cohort c, baseline b
-SET c.f40000 = b.value
-WHERE b.field = 40000
-AND b.eid = c.eid
-AND b.i = 0
-AND b.n = 0;
-
-UPDATE baseline_cohort c
-SET c.dob = STR_TO_DATE(
-    CONCAT(f34, '-', f52, '-', 1),
-    '%Y-%m-%d'
+        baseline b
+    GROUP BY
+        b.eid
+"""
+
+
+def get_baseline_cohort_schema(
+    fields: list = BASELINE_COHORT_FIELDS, table: str = "baseline_cohort"
+) -> str:
+    """
+    Returns the SQL statements (re-)creating the
+    `baseline_cohort` table, named `table`.
+    """
+
+    column_defs = "\n".join(f"    f{field} {type}," for field, type, _ in fields)
+    column_names = ", ".join(f"f{field}" for field, _, _ in fields)
+
+    # Every eid in baseline gets a row, even if it has
+    # none of the pivoted fields.
+    pivot = get_baseline_cohort_pivot(fields)
+
+    return f"""
+DROP TABLE IF EXISTS {table};
+CREATE TABLE {table}(
+    eid INT,
+{column_defs}
+    country CHAR(1),
+    dob DATE,
+    gp_ehr INT(1),
+    gp_ehr_data_provider INT(1),
+    gp_ehr_single_reg INT(1) DEFAULT 0,
+    gp_ehr_deduct_date DATE
 );
 
-UPDATE baseline_cohort c, gp_registrations g
+INSERT INTO {table} (eid, {column_names}, country, dob)
+SELECT
+    p.*,
+    -- Glasgow, Edinburgh
+    IF(p.f54 IN (11005, 11004), 'S',
+    -- Cardiff, Swansea, Wrexham
+    IF(p.f54 IN (11003, 11022, 11023), 'W',
+    'E')),
+    STR_TO_DATE(CONCAT(p.f34, '-', p.f52, '-', 1), '%Y-%m-%d')
+FROM ({pivot}) p;
+
+CREATE INDEX e ON {table}(eid);
+
+"""
+
+
+def get_baseline_cohort_gp_ehr(table: str = "baseline_cohort") -> str:
+    """
+    Returns the SQL statements filling in the primary care
+    columns of the `baseline_cohort` table, named `table`.
+    """
+
+    return f"""UPDATE {table} c, gp_registrations g
 SET c.gp_ehr = 1 WHERE c.eid = g.eid;
 
-UPDATE baseline_cohort c, gp_clinical n
+UPDATE {table} c, gp_clinical n
 SET c.gp_ehr = 1 WHERE c.eid = n.eid;
 
-UPDATE baseline_cohort c, gp_prescriptions p
+UPDATE {table} c, gp_prescriptions p
 SET c.gp_ehr = 1 WHERE c.eid = p.eid;
 
-UPDATE baseline_cohort c
+UPDATE {table} c
 SET c.gp_ehr = 0 WHERE c.gp_ehr IS NULL;
 
-UPDATE baseline_cohort c, gp_registrations g
+UPDATE {table} c, gp_registrations g
 SET c.gp_ehr_data_provider = g.data_provider
 WHERE c.eid = g.eid;
 
-UPDATE baseline_cohort c, gp_clinical n
+UPDATE {table} c, gp_clinical n
 SET c.gp_ehr_data_provider = n.data_provider
 WHERE c.eid = n.eid;
 
-UPDATE baseline_cohort c, gp_prescriptions p
+UPDATE {table} c, gp_prescriptions p
 SET c.gp_ehr_data_provider = p.data_provider
 WHERE c.eid = p.eid;
 
@@ -197,14 +117,11 @@ UPDATE temp_single_reg t, gp_registrations g
 SET t.gp_ehr_deduct_date = g.deduct_date
 WHERE t.eid = g.eid;
 
-ALTER TABLE baseline_cohort
-ADD COLUMN gp_ehr_single_reg int (1) default 0;
-
-ALTER TABLE baseline_cohort
-ADD COLUMN gp_ehr_deduct_date DATE;
-
-UPDATE baseline_cohort c, temp_single_reg t
+UPDATE {table} c, temp_single_reg t
 SET c.gp_ehr_single_reg = 1, c.gp_ehr_deduct_date = t.gp_ehr_deduct_date
 WHERE c.eid = t.eid;
 
 """
+
+
+SCHEMA_BASELINE_COHORT = get_baseline_cohort_schema() + get_baseline_cohort_gp_ehr()
@@ -0,0 +1,42 @@
+""" Schema for the 'baseline_typed' table. """
+
+# Typed copy of the `baseline` table, partitioned by field so that
+# queries on a field only read its partition. `value_num` and
+# `value_date` hold the values which are numbers or ISO dates, and
+# NULL otherwise. Values are truncated to 255 characters (free text
+# fields are kept in full in `baseline`).
+# `{table}` is the table being built, see MySQLDatabase.rebuild_table.
+SCHEMA_BASELINE_TYPED = """
+CREATE TABLE {table}(
+    eid INT,
+    field INT(5),
+    i INT(2),
+    n INT(2),
+    value VARCHAR(255),
+    value_num DOUBLE,
+    value_date DATE
+)
+PARTITION BY HASH(field) PARTITIONS 64;
+
+INSERT INTO {table} (eid, field, i, n, value, value_num, value_date)
+SELECT
+    b.eid,
+    b.field,
+    b.i,
+    b.n,
+    LEFT(b.value, 255),
+    IF(b.value REGEXP '^-?[0-9]+([.][0-9]+)?([eE][-+]?[0-9]+)?$', b.value, NULL),
+    IF(
+        b.value REGEXP '^[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]$',
+        STR_TO_DATE(b.value, '%Y-%m-%d'),
+        NULL
+    )
+FROM
+    baseline b;
+"""
+
+# Indexes of the table, created on the table `{table}` being built.
+INDEX_BASELINE_TYPED = """
+CREATE INDEX fv ON {table}(field, value, eid);
+CREATE INDEX e ON {table}(eid, field, i, n);
+"""
@@ -34,8 +34,9 @@ ON
     b.eid = f.eid
 """
 
+# Indexes of the table, created on the table `{table}` being built.
 SCHEMA_COHORT_PHENOTYPE_FIRST_INDEX = """
-CREATE INDEX r ON cohort_phenotype_first(eid, phenotype(25), field_id);
+CREATE INDEX r ON {table}(eid, phenotype(25), field_id);
 """
 
 SCHEMA_COHORT_PHENOTYPE_FIRST_MERGE_BASIC = """
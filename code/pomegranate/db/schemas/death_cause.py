@@ -11,4 +11,5 @@ CREATE TABLE IF NOT EXISTS death_cause(
 );
 
 CREATE INDEX e ON death_cause(eid,level,cause_icd10);
+CREATE INDEX c ON death_cause(level,cause_icd10,eid);
 """
@@ -0,0 +1,17 @@
+""" Schema for the 'extraction_manifest' table. """
+
+CREATE_EXTRACTION_MANIFEST = """
+CREATE TABLE IF NOT EXISTS extraction_manifest(
+    phenotype VARCHAR(128),
+    field_id INT(10),
+    definition_hash CHAR(64),
+    source_version VARCHAR(1024),
+    num_rows INT(15),
+    extracted_at DATETIME,
+    PRIMARY KEY (phenotype, field_id)
+);
+"""
+
+SCHEMA_EXTRACTION_MANIFEST = """
+DROP TABLE IF EXISTS extraction_manifest;
+""" + CREATE_EXTRACTION_MANIFEST
@@ -14,4 +14,5 @@ CREATE TABLE IF NOT EXISTS hesin_diag(
 );
 
 CREATE INDEX hesr ON hesin_diag(eid, ins_index, level, diag_icd10);
+CREATE INDEX hesc ON hesin_diag(level, diag_icd10, eid, ins_index);
 """
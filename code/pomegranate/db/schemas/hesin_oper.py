@@ -17,4 +17,5 @@ CREATE TABLE IF NOT EXISTS hesin_oper(
 );
 
 CREATE INDEX hesr ON hesin_oper(eid, ins_index, level, oper4);
+CREATE INDEX hesc ON hesin_oper(level, oper4, eid, ins_index);
 """
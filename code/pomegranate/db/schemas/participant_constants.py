@@ -0,0 +1,67 @@
+""" Schema for the 'participant_constants' table. """
+
+# Instances of the assessment centre visit (field 53) kept
+# as columns date_assessment_<instance>.
+ASSESSMENT_INSTANCES = [0, 1, 2, 3]
+
+PARTICIPANT_CONSTANTS_COLUMNS = (
+    ["eid", "yob", "dob"]
+    + [f"date_assessment_{i}" for i in ASSESSMENT_INSTANCES]
+    + ["dod"]
+)
+
+# Baseline values pivoted by the table: column, field, instance.
+_PIVOT = (
+    [("yob", 34, 0), ("mob", 52, 0)]
+    + [(f"date_assessment_{i}", 53, i) for i in ASSESSMENT_INSTANCES]
+    + [("dod", 40000, 0)]
+)
+
+_PIVOT_COLUMNS = ",\n".join(
+    f"        MAX(CASE WHEN b.field = {field} AND b.i = {i} AND b.n = 0"
+    f" THEN b.value END) AS {column}"
+    for column, field, i in _PIVOT
+)
+
+_DATE_COLUMNS = ",\n".join(
+    f"    STR_TO_DATE(p.{column}, '%Y-%m-%d')"
+    for column in PARTICIPANT_CONSTANTS_COLUMNS[3:]
+)
+
+_ASSESSMENT_DEFS = "\n".join(
+    f"    date_assessment_{i} DATE," for i in ASSESSMENT_INSTANCES
+)
+
+# One row per participant with the dates the extraction queries
+# and the dates module look up per eid: year and date of birth
+# (fields 34 and 52), date of each assessment centre visit
+# (field 53) and date of death (field 40000), read with a single
+# scan of these fields in `baseline`.
+# `{table}` is the table being built, see MySQLDatabase.rebuild_table.
+SCHEMA_PARTICIPANT_CONSTANTS = f"""
+CREATE TABLE {{table}}(
+    eid INT NOT NULL PRIMARY KEY,
+    yob SMALLINT,
+    dob DATE,
+{_ASSESSMENT_DEFS}
+    dod DATE
+);
+
+INSERT INTO {{table}} ({", ".join(PARTICIPANT_CONSTANTS_COLUMNS)})
+SELECT
+    p.eid,
+    p.yob,
+    STR_TO_DATE(CONCAT(p.yob, '-', p.mob, '-', 1), '%Y-%m-%d'),
+{_DATE_COLUMNS}
+FROM (
+    SELECT
+        b.eid,
+{_PIVOT_COLUMNS}
+    FROM
+        baseline b
+    WHERE
+        b.field IN (34, 52, 53, 40000)
+    GROUP BY
+        b.eid
+) p;
+"""
@@ -2,37 +2,57 @@
 
 # TODO: Move field id labels to configuration file
 
-SCHEMA_PHENOTYPE_FIRST = """
-CREATE TABLE phenotype_first AS
-SELECT
-    p.eid,
-    p.phenotype,
-    p.field_id,
+FIELD_ID_LABEL = """
     CASE
         WHEN p.field_id IN (41202, 41204, 41200, 41240) THEN 'ehr_hospital'
         WHEN p.field_id IN (40001, 40002) THEN 'ehr_death'
         WHEN p.field_id IN (42040, 42039) THEN 'ehr_primary_care'
         WHEN p.field_id IN (40006) THEN 'ehr_cancer'
         ELSE 'selfreport'
-    END AS 'field_id_label',
-    MIN(p.eventdate) AS eventdate
+    END"""
+
+# Placeholder dates which are not clamped to the date of birth.
+UNDATED_EVENTS = "('1900-01-01', '1901-01-01')"
+
+
+def get_phenotype_first_select(phenotypes_sql: str = None) -> str:
+    """
+    Returns a SELECT statement computing the first event date
+    per eid, phenotype and field, with the source label, in a
+    single pass over `phenotypes`. Dates on or before the date
+    of birth are set to the date of birth, except placeholder
+    dates (see UNDATED_EVENTS).
+
+    phenotypes_sql (str) : optional SQL list, e.g. "('asthma')",
+                           of the phenotypes to select
+    """
+
+    where = ""
+    if phenotypes_sql is not None:
+        where = f"WHERE p.phenotype IN {phenotypes_sql}"
+
+    return f"""
+SELECT
+    p.eid,
+    p.phenotype,
+    p.field_id,
+    {FIELD_ID_LABEL.strip()} AS 'field_id_label',
+    CASE
+        WHEN MIN(p.eventdate) <= b.dob
+        AND MIN(p.eventdate) NOT IN {UNDATED_EVENTS}
+        THEN b.dob
+        ELSE MIN(p.eventdate)
+    END AS eventdate
 FROM
-    phenotypes p,
-    baseline_cohort b
-WHERE p.eid = b.eid
-GROUP BY p.eid, p.phenotype, p.field_id;
+    phenotypes p
+JOIN baseline_cohort b
+    ON b.eid = p.eid
+{where}
+GROUP BY p.eid, p.phenotype, p.field_id, b.dob
 """
 
-INDEX_PHENOTYPE_FIRST = """
-CREATE INDEX r ON phenotype_first(eid, phenotype, field_id);
-"""
 
-POST_CREATE_PHENOTYPE_FIRST = """
-UPDATE
-  baseline_cohort b,
-  phenotype_first p
-SET p.eventdate = b.dob
-WHERE b.eid = p.eid
-AND p.eventdate <= b.dob
-AND p.eventdate NOT IN ('1900-01-01', '1901-01-01');
+# Indexes of the table, created on the table `{table}` being built.
+INDEX_PHENOTYPE_FIRST = """
+CREATE INDEX r ON {table}(eid, phenotype, field_id);
 """
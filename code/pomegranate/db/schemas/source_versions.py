@@ -0,0 +1,32 @@
+""" Schema for the 'source_versions' and 'source_changelog' tables. """
+
+CREATE_SOURCE_VERSIONS = """
+CREATE TABLE IF NOT EXISTS source_versions(
+    table_name VARCHAR(64),
+    release_name VARCHAR(64),
+    rows_inserted INT(15),
+    rows_deleted INT(15),
+    loaded_at DATETIME,
+    PRIMARY KEY (table_name)
+);
+"""
+
+CREATE_SOURCE_CHANGELOG = """
+CREATE TABLE IF NOT EXISTS source_changelog(
+    release_name VARCHAR(64),
+    table_name VARCHAR(64),
+    eid INT(7) UNSIGNED,
+    change_type VARCHAR(6),
+    num_rows INT(10),
+    applied_at DATETIME,
+    INDEX rte (release_name, table_name, eid)
+);
+"""
+
+SCHEMA_SOURCE_VERSIONS = """
+DROP TABLE IF EXISTS source_versions;
+""" + CREATE_SOURCE_VERSIONS
+
+SCHEMA_SOURCE_CHANGELOG = """
+DROP TABLE IF EXISTS source_changelog;
+""" + CREATE_SOURCE_CHANGELOG
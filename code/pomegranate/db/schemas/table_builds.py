@@ -0,0 +1,18 @@
+""" Schema for the 'table_builds' table. """
+
+# Last build of each table computed from the phenotypes table
+# (e.g. `phenotype_first`), kept apart from the source table
+# versions in `source_versions`.
+CREATE_TABLE_BUILDS = """
+CREATE TABLE IF NOT EXISTS table_builds(
+    table_name VARCHAR(64),
+    build_type VARCHAR(16),
+    num_rows INT(15),
+    built_at DATETIME,
+    PRIMARY KEY (table_name)
+);
+"""
+
+SCHEMA_TABLE_BUILDS = """
+DROP TABLE IF EXISTS table_builds;
+""" + CREATE_TABLE_BUILDS
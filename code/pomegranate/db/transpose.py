@@ -0,0 +1,294 @@
+"""
+Module for transposing the UK Biobank baseline file from the
+wide showcase format (one column per field-instance.array) to
+the long format of the `baseline` table (eid, field, i, n, value).
+
+The header is parsed once into (field, instance, array) per
+column. The rest of the file is split into byte ranges aligned
+on line starts, which are transposed in parallel by a pool of
+processes, each one parsing blocks of rows with pandas and
+keeping the non-empty cells with numpy. Missing (empty) values
+are not written, to save space.
+
+Rows must not contain line breaks inside quoted values, which
+is the case for the showcase CSV files.
+"""
+
+import csv
+import gzip
+import io
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+TRANSPOSE_FORMATS = ["gzip", "parquet"]
+
+LONG_COLUMNS = ["eid", "field", "i", "n", "value"]
+
+LONG_SCHEMA = pa.schema(
+    [
+        ("eid", pa.int64()),
+        ("field", pa.int32()),
+        ("i", pa.int16()),
+        ("n", pa.int16()),
+        ("value", pa.string()),
+    ]
+)
+
+# Number of rows parsed at once by each process.
+BLOCK_ROWS = 1000
+
+
+def parse_field_name(column: str) -> tuple:
+    """
+    Given a UK Biobank baseline column name, returns a tuple
+    with the field id, the instance and the array index.
+
+    '123-1.0' => (123, 1, 0)
+    """
+
+    try:
+        field, rest = column.split("-")
+        instance, array = rest.split(".")
+    except ValueError:
+        return (int(column.split("-")[0]), 0, 0)
+
+    return (int(field), int(instance), int(array))
+
+
+def parse_header(file: str, fields: set = None):
+    """
+    Parses the header of a wide baseline file.
+
+    Arguments
+    ---------
+
+    file (str) : wide baseline CSV
+    fields (set) : field ids to keep (default: all)
+
+    Returns
+    -------
+
+    tuple of the byte offset where the data start (int), the
+    positions of the columns to keep (list of int) and an array
+    of their (field, instance, array) rows (np.ndarray)
+    """
+
+    with open(file, "rb") as f:
+        line = f.readline()
+
+    columns = next(csv.reader([line.decode("utf-8", errors="ignore")]))
+    positions = []
+    info = []
+    for position, column in enumerate(columns[1:], start=1):
+        field_info = parse_field_name(column)
+        if fields is None or field_info[0] in fields:
+            positions.append(position)
+            info.append(field_info)
+
+    return len(line), positions, np.array(info, dtype=np.int64).reshape(-1, 3)
+
+
+def get_byte_ranges(file: str, start: int, num_ranges: int) -> list:
+    """
+    Splits `file` from byte `start` into at most `num_ranges`
+    (start, end) byte ranges of about the same size, each
+    starting at the beginning of a line.
+    """
+
+    size = os.path.getsize(file)
+    offsets = [start]
+
+    with open(file, "rb") as f:
+        for k in range(1, num_ranges):
+            f.seek(max(start + (size - start) * k // num_ranges - 1, offsets[-1]))
+            f.readline()
+            offset = f.tell()
+            if offset >= size:
+                break
+            if offset > offsets[-1]:
+                offsets.append(offset)
+
+    offsets.append(size)
+
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def transpose_block(data: bytes, positions: list, info: np.ndarray) -> pd.DataFrame:
+    """
+    Transposes a block of rows of the wide baseline file.
+
+    Arguments
+    ---------
+
+    data (bytes) : complete lines of the wide file, without header
+    positions (list) : positions of the columns to keep
+    info (np.ndarray) : (field, instance, array) of these columns
+
+    Returns
+    -------
+
+    Dataframe with LONG_COLUMNS (pd.DataFrame)
+    """
+
+    # Only empty values are missing, "NA" and the like are values.
+    df = pd.read_csv(
+        io.BytesIO(data),
+        header=None,
+        usecols=[0] + positions,
+        dtype=str,
+        keep_default_na=False,
+        na_values=[""],
+        encoding="utf-8",
+        encoding_errors="ignore",
+    )
+
+    values = df[positions].to_numpy(dtype=object)
+    rows, cols = np.nonzero(pd.notna(values))
+
+    return pd.DataFrame(
+        {
+            "eid": df[0].to_numpy(dtype=np.int64)[rows],
+            "field": info[cols, 0],
+            "i": info[cols, 1],
+            "n": info[cols, 2],
+            "value": values[rows, cols],
+        }
+    )
+
+
+def _iter_blocks(file: str, start: int, end: int, block_rows: int):
+    """
+    Internal function, do not use directly.
+    """
+
+    with open(file, "rb") as f:
+        f.seek(start)
+        while f.tell() < end:
+            lines = []
+            while len(lines) < block_rows and f.tell() < end:
+                lines.append(f.readline())
+            yield b"".join(lines)
+
+
+def _transpose_range(args) -> tuple:
+    """
+    Internal function, do not use directly.
+    """
+
+    file, start, end, positions, info, output, output_format, header = args
+
+    num_rows = 0
+    num_cells = 0
+
+    if output_format == "parquet":
+        writer = pq.ParquetWriter(output, LONG_SCHEMA)
+    else:
+        writer = gzip.open(output, "wt", encoding="utf-8", newline="")
+        if header:
+            csv.writer(writer).writerow(LONG_COLUMNS)
+
+    try:
+        for data in _iter_blocks(file, start, end, BLOCK_ROWS):
+            df = transpose_block(data, positions, info)
+            num_rows += data.count(b"\n")
+            num_cells += len(df)
+            if output_format == "parquet":
+                writer.write_table(
+                    pa.Table.from_pandas(df, schema=LONG_SCHEMA, preserve_index=False)
+                )
+            else:
+                df.to_csv(writer, header=False, index=False)
+    finally:
+        writer.close()
+
+    return num_rows, num_cells
+
+
+def transpose_baseline(
+    file: str,
+    output: str,
+    output_format: str = "gzip",
+    fields: set = None,
+    workers: int = None,
+    num_ranges: int = None,
+) -> int:
+    """
+    Transposes the wide baseline file to the long format.
+
+    With output_format='gzip' the output is a single gzipped CSV
+    with a header, made of one gzip member per byte range (which
+    gzip readers, MySQL loaders and DuckDB read as one file). With
+    output_format='parquet' it is a directory with one Parquet
+    file per byte range.
+
+    Arguments
+    ---------
+
+    file (str) : wide baseline CSV
+    output (str) : output file (gzip) or directory (parquet)
+    output_format (str) : 'gzip' or 'parquet'
+    fields (set) : field ids to keep (default: all),
+                   e.g. Catalogue().get_field_ids()
+    workers (int) : number of processes (default: CPU count)
+    num_ranges (int) : number of byte ranges (default: 4 per process)
+
+    Returns
+    -------
+
+    number of long format rows written (int)
+    """
+
+    assert output_format in TRANSPOSE_FORMATS
+
+    workers = workers or os.cpu_count()
+    num_ranges = num_ranges or 4 * workers
+
+    start, positions, info = parse_header(file, fields)
+    ranges = get_byte_ranges(file, start, num_ranges)
+    logging.info(
+        f"Transposing {len(positions)} columns of {file} in {len(ranges)} parts"
+        f" with {workers} processes."
+    )
+
+    if output_format == "parquet":
+        os.makedirs(output, exist_ok=True)
+        parts_dir = output
+        names = [f"part-{k:05d}.parquet" for k in range(len(ranges))]
+    else:
+        parts_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output)))
+        names = [f"part-{k:05d}.csv.gz" for k in range(len(ranges))]
+
+    tasks = [
+        (file, s, e, positions, info, os.path.join(parts_dir, name), output_format, k == 0)
+        for k, ((s, e), name) in enumerate(zip(ranges, names))
+    ]
+
+    num_rows = 0
+    num_cells = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for rows, cells in executor.map(_transpose_range, tasks):
+                num_rows += rows
+                num_cells += cells
+                logging.info(f"Transposed {num_rows} participants.")
+
+        if output_format == "gzip":
+            with open(output, "wb") as f:
+                for name in names:
+                    with open(os.path.join(parts_dir, name), "rb") as part:
+                        shutil.copyfileobj(part, f)
+    finally:
+        if output_format == "gzip":
+            shutil.rmtree(parts_dir)
+
+    logging.info(f"Wrote {num_cells} values for {num_rows} participants to {output}.")
+
+    return num_cells
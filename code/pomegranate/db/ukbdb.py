@@ -1,10 +1,22 @@
 """A module for UK Biobank specific functions."""
 
 import logging
+from itertools import chain
 
 import pandas as pd
 from pomegranate.db.mysql import MySQLDatabase
-from pomegranate.phenotype import Phenotype
+from pomegranate.db.code_ranges import prefix_ranges_to_sql
+from pomegranate.db.bulk_loader import iter_chunks
+from pomegranate.db.db_config import (
+    EID_FILTER_CHUNK_SIZE,
+    EID_FILTER_THRESHOLD,
+    FIELD_SOURCE_TABLES,
+    PHENOTYPES_COLUMNS,
+)
+from pomegranate.db.schemas.extraction_manifest import CREATE_EXTRACTION_MANIFEST
+from pomegranate.db.schemas.participant_constants import ASSESSMENT_INSTANCES
+from pomegranate.db.schemas.source_versions import CREATE_SOURCE_VERSIONS
+from pomegranate.phenotype import get_phenotype
 
 
 class UKBDatabase(MySQLDatabase):
@@ -14,6 +26,15 @@ class UKBDatabase(MySQLDatabase):
 
     def __init__(self, **kwargs):
         MySQLDatabase.__init__(self, **kwargs)
+        self._init_extractors()
+
+    def _init_extractors(self):
+        """
+        Internal function, do not use directly.
+        """
+
+        # Table of eids extraction queries are restricted to, see set_eid_scope.
+        self.eid_table = None
 
         self.extract_field_map = {
             20001: self.extract_cancer_self_report,
@@ -33,17 +54,272 @@ class UKBDatabase(MySQLDatabase):
     def list_to_sql(lst: list[str]) -> str:
         return "(" + ",".join([f"'{x}'" for x in lst]) + ")"
 
-    def query_insert(self, sql_list: list[str], table: str, insert=False):
+    def query_insert(
+        self, sql_list: list[str], table: str, insert=False, stream=False
+    ):
         """
         Adds 'INSERT INTO' if insert==True, to insert sql output into table and
         returns either rowcount (if insert) or all entries.
+
+        If stream==True (and insert==False) entries are returned as an iterator
+        backed by a server-side cursor, so they are never all held in memory.
+        No other query may run on this connection until the iterator is
+        exhausted.
+
+        If an eid scope is set (see `set_eid_scope`) only entries of the
+        participants in the scope table are returned or inserted.
         """
 
+        sql_list = [self.scope_sql(sql) for sql in sql_list]
+
         if insert is True:
-            sql_list = [f "INSERT INTO {table} " + sql for sql in sql_list]
+            sql_list = [f"INSERT INTO {table} " + sql for sql in sql_list]
             return sum([self.query(sql).rowcount for sql in sql_list])
+        elif stream is True:
+            return chain.from_iterable(
+                chain.from_iterable(self.query_stream(sql)) for sql in sql_list
+            )
         else:
-            return sum([self.query(sql).fetchall() for sql in sql_list], ())
+            return tuple(
+                chain.from_iterable(self.query(sql).fetchall() for sql in sql_list)
+            )
+
+    def set_eid_scope(self, eid_table: str = None):
+        """
+        Restricts all extraction queries run through `query_insert`
+        to the participants listed in the `eid` column of `eid_table`
+        (e.g. created with `create_eid_table`). Pass None to remove
+        the restriction.
+        """
+
+        self.eid_table = eid_table
+
+    def scope_sql(self, sql: str) -> str:
+        """
+        Wraps an extraction query returning `phenotypes` rows so
+        that it only returns rows of participants in the current
+        eid scope.
+        """
+
+        if self.eid_table is None:
+            return sql
+
+        sql = sql.strip().rstrip(";")
+        columns = ", ".join(PHENOTYPES_COLUMNS)
+
+        return f"""
+            SELECT * FROM ({sql}) AS scoped ({columns})
+            WHERE scoped.eid IN (SELECT eid FROM {self.eid_table})
+        """
+
+    def set_typed_baseline(self, enabled: bool = True):
+        """
+        Runs the baseline extractors against the `baseline_typed`
+        table (see `pomegranate.db.derived.rebuild_baseline_typed`)
+        instead of `baseline`. Its values are compared as numbers
+        and dates without conversion, and its (field, value, eid)
+        index serves the lookups of the values of a field.
+        """
+
+        self.config["typed_baseline"] = enabled
+
+    def baseline_table(self) -> str:
+        """
+        Returns the table the baseline extractors read from.
+        """
+
+        if self.config.get("typed_baseline", False):
+            return "baseline_typed"
+
+        return "baseline"
+
+    def baseline_number_sql(self, alias: str) -> str:
+        """
+        Returns a SQL expression for the value of the baseline
+        row `alias` as a number.
+        """
+
+        if self.config.get("typed_baseline", False):
+            return f"{alias}.value_num"
+
+        return self.number_sql(f"{alias}.value")
+
+    def baseline_date_sql(self, alias: str) -> str:
+        """
+        Returns a SQL expression for the value of the baseline
+        row `alias` as a date.
+        """
+
+        if self.config.get("typed_baseline", False):
+            return f"{alias}.value_date"
+
+        return f"STR_TO_DATE({alias}.value, '%Y-%m-%d')"
+
+    def set_participant_constants(self, enabled: bool = True):
+        """
+        Looks up the year of birth and the assessment centre dates
+        of participants in the `participant_constants` table (see
+        `pomegranate.db.derived.rebuild_participant_constants`),
+        joined on its primary key, instead of joining the baseline
+        rows of fields 34 and 53 in every extraction query.
+        """
+
+        self.config["participant_constants"] = enabled
+
+    def assessment_date_sql(
+        self, alias: str, eid: str, instance: str = "0", array: str = "0"
+    ) -> tuple:
+        """
+        Returns a tuple of a JOIN clause, joining the assessment
+        centre visit (field 53) `instance` of participant `eid` as
+        `alias`, and a SQL expression for its date. `eid`,
+        `instance` and `array` are SQL expressions.
+        """
+
+        if self.config.get("participant_constants", False):
+            join = f"LEFT JOIN participant_constants {alias} ON {alias}.eid = {eid}"
+            if instance.isdigit():
+                date = f"{alias}.date_assessment_{instance}"
+            else:
+                cases = " ".join(
+                    f"WHEN {i} THEN {alias}.date_assessment_{i}"
+                    for i in ASSESSMENT_INSTANCES
+                )
+                date = f"CASE {instance} {cases} END"
+            if array != "0":
+                date = f"CASE WHEN {array} = 0 THEN {date} END"
+            return join, date
+
+        join = f"""LEFT JOIN {self.baseline_table()} {alias}
+            ON {alias}.eid = {eid}
+            AND {alias}.i = {instance}
+            AND {alias}.n = {array}
+            AND {alias}.field = 53"""
+
+        return join, self.baseline_date_sql(alias)
+
+    def yob_sql(self, alias: str, eid: str) -> tuple:
+        """
+        Returns a tuple of a JOIN clause, joining the year of birth
+        (field 34) of participant `eid` as `alias`, and a SQL
+        expression for it as a number.
+        """
+
+        if self.config.get("participant_constants", False):
+            join = f"LEFT JOIN participant_constants {alias} ON {alias}.eid = {eid}"
+            return join, f"{alias}.yob"
+
+        join = f"""LEFT OUTER JOIN {self.baseline_table()} {alias}
+            ON {alias}.eid = {eid}
+            AND {alias}.i = 0
+            AND {alias}.n = 0
+            AND {alias}.field = 34"""
+
+        return join, self.baseline_number_sql(alias)
+
+    def create_eid_table(
+        self, table: str, eids, temporary: bool = True, batch_size: int = None
+    ) -> int:
+        """
+        Creates a table `table` with a single indexed `eid` column
+        holding `eids`, for joining against large tables.
+
+        If batch_size is given, an indexed `batch` column numbers
+        consecutive groups of `batch_size` eids, so that large
+        tables can be processed a batch at a time.
+
+        Temporary tables are only visible to this connection and are
+        dropped when it is closed.
+
+        Returns the number of eids inserted.
+        """
+
+        temporary = "TEMPORARY" if temporary else ""
+        eids = sorted(set(int(x) for x in eids))
+
+        self.query(f"DROP {temporary} TABLE IF EXISTS {table}")
+        if batch_size is None:
+            self.query(
+                f"CREATE {temporary} TABLE {table} (eid INT(7) UNSIGNED NOT NULL PRIMARY KEY)"
+            )
+            rows = ((x,) for x in eids)
+            sql = f"INSERT INTO {table} (eid) VALUES (%s)"
+        else:
+            self.query(
+                f"""
+                CREATE {temporary} TABLE {table} (
+                    eid INT(7) UNSIGNED NOT NULL PRIMARY KEY,
+                    batch INT(10) UNSIGNED NOT NULL,
+                    INDEX b (batch, eid)
+                )
+                """
+            )
+            rows = ((x, i // batch_size) for i, x in enumerate(eids))
+            sql = f"INSERT INTO {table} (eid, batch) VALUES (%s, %s)"
+
+        n = 0
+        for chunk in iter_chunks(rows, 10000):
+            self.cursor.executemany(sql, chunk)
+            n += len(chunk)
+
+        return n
+
+    def query_eids(
+        self,
+        sql: str,
+        eids,
+        column: str = "eid",
+        threshold: int = EID_FILTER_THRESHOLD,
+        chunk_size: int = EID_FILTER_CHUNK_SIZE,
+    ) -> tuple:
+        """
+        Runs a SELECT statement for the participants in `eids`
+        and returns all rows.
+
+        `sql` has an `{eids}` placeholder in its WHERE clause,
+        replaced with a filter of `column` on the eids. Above
+        `threshold` eids, they are loaded into an indexed temporary
+        table (see `create_eid_table`) which the filter selects
+        from. Otherwise the statement is run once per chunk of
+        `chunk_size` eids, bound as parameters of an IN list.
+        Either way, literal '%' in `sql` must be written '%%'.
+        """
+
+        eids = sorted(set(int(x) for x in eids))
+
+        if len(eids) > threshold:
+            table = "eid_filter"
+            self.create_eid_table(table, eids)
+            try:
+                sql = sql.format(eids=f"{column} IN (SELECT eid FROM {table})")
+                # No parameters, but '%%' is unescaped as in the IN lists.
+                return tuple(self.query(sql, []).fetchall())
+            finally:
+                self.query(f"DROP TEMPORARY TABLE IF EXISTS {table}")
+
+        rows = []
+        for chunk in iter_chunks(eids, chunk_size):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            rows.extend(
+                self.query(sql.format(eids=f"{column} IN ({placeholders})"), chunk).fetchall()
+            )
+
+        return tuple(rows)
+
+    @staticmethod
+    def combine_results(results: list, insert=False, stream=False):
+        """
+        Combines the results of several extractions returned by
+        `query_insert`: rowcounts are added, entries are
+        concatenated (lazily if stream==True).
+        """
+
+        if insert is True:
+            return sum(results)
+        elif stream is True:
+            return chain.from_iterable(results)
+        else:
+            return tuple(chain.from_iterable(results))
 
     def get_individuals_by_phenotype(self, phenotype_name: str) -> set:
         """
@@ -134,10 +410,13 @@ class UKBDatabase(MySQLDatabase):
         """
         logging.info(f"Lines remaining in {table}: {self.query(sql3).fetchall()[0][0]}")
 
-    def delete_phenotype_entries_by_field(self, phenotype: str, field_id: int):
+    def delete_phenotype_entries_by_field(
+        self, phenotype: str, field_id: int, eid_table: str = None
+    ):
         """
         Delete all entries in the `phenotype` table for a given
-        phenotype by field.
+        phenotype by field, optionally only for the participants
+        listed in `eid_table`.
         """
 
         sql = """
@@ -146,16 +425,128 @@ class UKBDatabase(MySQLDatabase):
             AND phenotype = %s
         """
 
+        if eid_table is not None:
+            sql += f" AND eid IN (SELECT eid FROM {eid_table})"
+
         self.query(sql, [field_id, phenotype])
 
         return self.cursor.rowcount
 
-    def extract_field_value(self, phenotype: str, field_id, insert: bool):
+    def count_phenotype_entries_by_field(self, phenotype: str, field_id: int) -> int:
+        """
+        Count the entries in the `phenotype` table for a given
+        phenotype by field.
+        """
+
+        sql = """
+            SELECT COUNT(*) FROM phenotypes WHERE
+            phenotype = %s
+            AND field_id = %s
+        """
+
+        return self.query(sql, [phenotype, field_id]).fetchall()[0][0]
+
+    def create_extraction_manifest(self):
+        """
+        Creates the `extraction_manifest` and `source_versions`
+        tables if they do not exist.
+        """
+
+        self.query(CREATE_EXTRACTION_MANIFEST)
+        self.query(CREATE_SOURCE_VERSIONS)
+
+    def record_source_version(
+        self, table: str, release_name: str, rows_inserted: int, rows_deleted: int = 0
+    ):
+        """
+        Records in `source_versions` that `table` was loaded now
+        from `release_name` (e.g. the name of the file loaded),
+        which changes the version returned by `get_source_version`.
+        Every loader of a source table must call it.
+        """
+
+        self.query(CREATE_SOURCE_VERSIONS)
+        self.query(
+            """
+            REPLACE INTO source_versions
+            (table_name, release_name, rows_inserted, rows_deleted, loaded_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            """,
+            [table, release_name, rows_inserted, rows_deleted],
+        )
+
+    def get_source_version(self, field_id) -> str:
+        """
+        Returns a string identifying the current version of the
+        source tables a field is extracted from, built from the
+        release and time each table was last loaded from, as
+        recorded in `source_versions` (see `record_source_version`
+        and `pomegranate.db.delta`). Tables without a recorded load
+        are marked as unrecorded.
+        """
+
+        tables = FIELD_SOURCE_TABLES.get(field_id, ["baseline"])
+        tables = [self.baseline_table() if t == "baseline" else t for t in tables]
+
+        sql = f"""
+            SELECT table_name, release_name, loaded_at
+            FROM source_versions
+            WHERE table_name IN {self.list_to_sql(tables)}
+        """
+        versions = {}
+        if self.table_exists("source_versions"):
+            versions = {t: f"{r}@{l}" for t, r, l in self.query(sql).fetchall()}
+
+        return ";".join(
+            f"{t}:{versions.get(t, 'unrecorded')}" for t in sorted(set(tables))
+        )
+
+    def get_manifest_entry(self, phenotype: str, field_id: int):
+        """
+        Returns a (definition_hash, source_version) tuple recorded
+        when `field_id` of `phenotype` was last extracted, or None.
+        """
+
+        sql = """
+            SELECT definition_hash, source_version
+            FROM extraction_manifest
+            WHERE phenotype = %s
+            AND field_id = %s
+        """
+
+        r = self.query(sql, [phenotype, field_id]).fetchall()
+        if len(r) == 0:
+            return None
+        return tuple(r[0])
+
+    def update_manifest(
+        self,
+        phenotype: str,
+        field_id: int,
+        definition_hash: str,
+        source_version: str,
+        num_rows: int,
+    ):
+        """
+        Records the extraction of `field_id` of `phenotype`.
+        """
+
+        sql = """
+            REPLACE INTO extraction_manifest
+            (phenotype, field_id, definition_hash, source_version, num_rows, extracted_at)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+        """
+
+        self.query(
+            sql, [phenotype, field_id, definition_hash, source_version, num_rows]
+        )
+
+    def extract_field_value(self, phenotype: str, field_id, insert: bool, **kwargs):
         """
         For non-standard fields
         # TODO: Write better docstring
         """
-        field_metadata = Phenotype(phenotype).get_field_definition(field_id)["metadata"]
+        field_metadata = get_phenotype(phenotype).get_field_definition(field_id)["metadata"]
 
         assert "time_qualifier" in field_metadata
         time_qual_type = field_metadata["time_qualifier"]["type"]
@@ -167,10 +558,14 @@ class UKBDatabase(MySQLDatabase):
                 phenotype=phenotype,
                 field_id=field_id,
                 insert=insert,
+                stream=kwargs.get("stream", False),
             )
         elif time_qual_type == "baseline":
             n = self.extract_field_value_with_baseline_qualifier(
-                phenotype=phenotype, field_id=field_id, insert=insert
+                phenotype=phenotype,
+                field_id=field_id,
+                insert=insert,
+                stream=kwargs.get("stream", False),
             )
         return n
 
@@ -188,7 +583,8 @@ class UKBDatabase(MySQLDatabase):
 
         insert = kwargs.get("insert", False)
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field_id)
+            values = get_phenotype(phenotype).get_values_for_field(field_id)
+        join, eventdate = self.assessment_date_sql("b2", "b1.eid")
 
         sql = f"""
         SELECT
@@ -196,22 +592,20 @@ class UKBDatabase(MySQLDatabase):
             '{phenotype}' AS 'phenotype',
             {field_id} AS 'field_id',
             b1.value AS field_value,
-            STR_TO_DATE(b2.value, '%Y-%m-%d') AS eventdate,
+            {eventdate} AS eventdate,
             NULL as data_value
         FROM
-            baseline b1
-        LEFT JOIN baseline b2
-            ON b2.eid = b1.eid
-            AND b2.i = 0
-            AND b2.n = 0
-            AND b2.field = 53
+            {self.baseline_table()} b1
+        {join}
         WHERE
             b1.value IN {UKBDatabase.list_to_sql(values)}
         AND
             b1.field = {field_id}
         """
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_field_value_with_date_qualifier(
         self, phenotype: str, field_id: int, values: list, date_field_id: int, **kwargs
@@ -222,6 +616,8 @@ class UKBDatabase(MySQLDatabase):
         """
 
         insert = kwargs.get("insert", False)
+        baseline = self.baseline_table()
+        year = self.baseline_number_sql("b2")
 
         sql = f"""
         SELECT
@@ -230,14 +626,14 @@ class UKBDatabase(MySQLDatabase):
             {field_id} AS 'field_id',
             b1.value AS field_value,
             IF (
-                b2.value > 0,
-                STR_TO_DATE(CONCAT(ROUND(b2.value),'-01-01'), "%Y-%m-%d"),
+                {year} > 0,
+                STR_TO_DATE(CONCAT(ROUND({year}),'-01-01'), "%Y-%m-%d"),
                 STR_TO_DATE('1900-01-01', "%Y-%m-%d")
             ) AS eventdate,
             NULL as data_value
         FROM
-             baseline b1
-        LEFT OUTER JOIN baseline b2
+             {baseline} b1
+        LEFT OUTER JOIN {baseline} b2
             ON b2.eid = b1.eid
             AND b2.i = b1.i
             AND b2.n = b1.n
@@ -248,7 +644,9 @@ class UKBDatabase(MySQLDatabase):
             b1.field = {field_id}
         """
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_field_value_with_age_qualifier(
         self,
@@ -263,11 +661,14 @@ class UKBDatabase(MySQLDatabase):
         from the `baseline` table using a age qualified field.
         """
         insert = kwargs.get("insert", False)
-        phen = Phenotype(phenotype)
+        phen = get_phenotype(phenotype)
         if not values:
             values = phen.get_values_for_field(field_id)
         if not age_field_id:
             age_field_id = phen.get_age_field_id(field_id)
+        baseline = self.baseline_table()
+        age = self.baseline_number_sql("b2")
+        yob_join, yob = self.yob_sql("b3", "b1.eid")
 
         sql = f"""
         SELECT
@@ -276,30 +677,28 @@ class UKBDatabase(MySQLDatabase):
             {field_id} AS 'field_id',
             b1.value AS field_value,
             IF (
-                b2.value > 0,
-                STR_TO_DATE(CONCAT(ROUND(b2.value+b3.value),'-01-01'), '%Y-%m-%d'),
+                {age} > 0,
+                STR_TO_DATE(CONCAT(ROUND({age}+{yob}),'-01-01'), '%Y-%m-%d'),
                 STR_TO_DATE('1900-01-01', '%Y-%m-%d')
             ) AS eventdate,
             NULL as data_value
         FROM
-             baseline b1
-        LEFT OUTER JOIN baseline b2
+             {baseline} b1
+        LEFT OUTER JOIN {baseline} b2
             ON b2.eid = b1.eid
             AND b2.i = b1.i
             AND b2.n = b1.n
             AND b2.field = {age_field_id}
-        LEFT OUTER JOIN baseline b3
-            ON b3.eid = b1.eid
-            AND b3.i = 0
-            AND b3.n = 0
-            AND b3.field = 34
+        {yob_join}
         WHERE
             b1.value IN {UKBDatabase.list_to_sql(values)}
         AND
             b1.field = {field_id}
         """
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_field_value_without_date_qualifier(
         self, phenotype: str, field_id: int, values: list, **kwargs
@@ -320,14 +719,16 @@ class UKBDatabase(MySQLDatabase):
             NULL AS eventdate,
             NULL as data_value
         FROM
-            baseline b1
+            {self.baseline_table()} b1
         WHERE
             b1.value IN {UKBDatabase.list_to_sql(values)}
         AND
             b1.field = {field_id}
         """
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_cancer_registry_data(
         self,
@@ -344,9 +745,13 @@ class UKBDatabase(MySQLDatabase):
 
         insert = kwargs.get("insert", False)
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field_id)
+            values = get_phenotype(phenotype).get_values_for_field(field_id)
+        baseline = self.baseline_table()
 
-        placeholders = "|".join(values)
+        # Registry dates are ISO dates, used verbatim from `baseline`.
+        eventdate = "b2.value"
+        if baseline == "baseline_typed":
+            eventdate = "b2.value_date"
 
         sql = """
         SELECT
@@ -354,28 +759,33 @@ class UKBDatabase(MySQLDatabase):
             '%s' AS 'phenotype',
             '%s' AS 'field_id',
             b1.value AS field_value,
-            b2.value AS eventdate,
+            %s AS eventdate,
             NULL as data_value
         FROM
-             baseline b1
-        LEFT OUTER JOIN baseline b2
+             %s b1
+        LEFT OUTER JOIN %s b2
             ON b2.eid = b1.eid
             AND b2.i = b1.i
             AND b2.n = b1.n
             AND b2.field = %s
         WHERE
-            b1.value REGEXP '^(%s)'
+            %s
         AND
             b1.field = %s
         """ % (
             phenotype,
             field_id,
+            eventdate,
+            baseline,
+            baseline,
             date_field_id,
-            placeholders,
+            prefix_ranges_to_sql("b1.value", values),
             field_id,
         )
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_non_cancer_self_report(
         self, phenotype: str, values: list = None, **kwargs
@@ -387,7 +797,7 @@ class UKBDatabase(MySQLDatabase):
         insert = kwargs.get("insert", False)
         field = 20002
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field)
+            values = get_phenotype(phenotype).get_values_for_field(field)
         logging.info(
             f"Extracting {len(values)} values from phenotype {phenotype} with field {field}."
         )
@@ -398,6 +808,7 @@ class UKBDatabase(MySQLDatabase):
             values=values,
             date_field_id=20008,
             insert=insert,
+            stream=kwargs.get("stream", False),
         )
 
     def extract_procedures_self_report(
@@ -412,7 +823,7 @@ class UKBDatabase(MySQLDatabase):
         insert = kwargs.get("insert", False)
         field = 20004
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field)
+            values = get_phenotype(phenotype).get_values_for_field(field)
         logging.info(
             f"Extracting {len(values)} values from phenotype {phenotype} with field {field}."
         )
@@ -423,6 +834,7 @@ class UKBDatabase(MySQLDatabase):
             values=values,
             date_field_id=20010,
             insert=insert,
+            stream=kwargs.get("stream", False),
         )
 
     def extract_cancer_self_report(self, phenotype: str, values: list = None, **kwargs):
@@ -433,7 +845,7 @@ class UKBDatabase(MySQLDatabase):
         insert = kwargs.get("insert", False)
         field = 20001
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field)
+            values = get_phenotype(phenotype).get_values_for_field(field)
         logging.info(
             f"Extracting {len(values)} values for phenotype {phenotype} and field {field}."
         )
@@ -444,6 +856,7 @@ class UKBDatabase(MySQLDatabase):
             values=values,
             date_field_id=20006,
             insert=insert,
+            stream=kwargs.get("stream", False),
         )
 
     def extract_all_hospital_primary_diagnoses(self, phenotype: str, **kwargs):
@@ -452,28 +865,32 @@ class UKBDatabase(MySQLDatabase):
         """
         field = 41202  # Diagnoses - main ICD10
         insert = kwargs.get("insert", False)
-        n = 0 if insert else ()
+        results = []
 
-        pheno = Phenotype(phenotype)
+        pheno = get_phenotype(phenotype)
         incident_field_values = pheno.get_values_for_field(field)
         if len(incident_field_values) > 0:
-            n += self.extract_hospital_primary_diagnoses(
-                phenotype=phenotype,
-                values=incident_field_values,
-                prevalent=False,
-                **kwargs,
+            results.append(
+                self.extract_hospital_primary_diagnoses(
+                    phenotype=phenotype,
+                    values=incident_field_values,
+                    prevalent=False,
+                    **kwargs,
+                )
             )
 
         prevalent_field_values = pheno.get_values_for_field(field, type="prevalent")
         if len(prevalent_field_values) > 0:
-            n += self.extract_hospital_primary_diagnoses(
-                phenotype=phenotype,
-                values=prevalent_field_values,
-                prevalent=True,
-                **kwargs,
+            results.append(
+                self.extract_hospital_primary_diagnoses(
+                    phenotype=phenotype,
+                    values=prevalent_field_values,
+                    prevalent=True,
+                    **kwargs,
+                )
             )
 
-        return n
+        return self.combine_results(results, insert, kwargs.get("stream", False))
 
     def extract_all_hospital_secondary_diagnoses(self, phenotype: str, **kwargs):
         """
@@ -482,28 +899,32 @@ class UKBDatabase(MySQLDatabase):
 
         field = 41204  # Diagnoses - secondary ICD10
         insert = kwargs.get("insert", False)
-        n = 0 if insert else ()
+        results = []
 
-        phen = Phenotype(phenotype)
+        phen = get_phenotype(phenotype)
         incident_field_values = phen.get_values_for_field(field)
         if len(incident_field_values) > 0:
-            n += self.extract_hospital_secondary_diagnoses(
-                phenotype=phenotype,
-                values=incident_field_values,
-                prevalent=False,
-                **kwargs,
+            results.append(
+                self.extract_hospital_secondary_diagnoses(
+                    phenotype=phenotype,
+                    values=incident_field_values,
+                    prevalent=False,
+                    **kwargs,
+                )
             )
 
         prevalent_field_values = phen.get_values_for_field(field, type="prevalent")
 
         if len(prevalent_field_values) > 0:
-            n += self.extract_hospital_secondary_diagnoses(
-                phenotype=phenotype,
-                values=prevalent_field_values,
-                prevalent=True,
-                **kwargs,
+            results.append(
+                self.extract_hospital_secondary_diagnoses(
+                    phenotype=phenotype,
+                    values=prevalent_field_values,
+                    prevalent=True,
+                    **kwargs,
+                )
             )
-        return n
+        return self.combine_results(results, insert, kwargs.get("stream", False))
 
     def extract_hospital_primary_diagnoses(
         self, phenotype: str, values: list, prevalent: bool = False, **kwargs
@@ -562,13 +983,15 @@ class UKBDatabase(MySQLDatabase):
             AND
                 hd.level = 1
             AND
-                hd.diag_icd10 REGEXP '^(%s)' """ % (
+                %s """ % (
             phenotype,
             date_column,
-            "|".join(values),
+            prefix_ranges_to_sql("hd.diag_icd10", values),
         )
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     # TODO: refactor this now that new HES data have all info in one table.
     def extract_hospital_secondary_diagnoses(
@@ -625,13 +1048,15 @@ class UKBDatabase(MySQLDatabase):
             AND
                 hd.level = 2
             AND
-                hd.diag_icd10 REGEXP '^(%s)' """ % (
+                %s """ % (
             phenotype,
             date_column,
-            "|".join(values),
+            prefix_ranges_to_sql("hd.diag_icd10", values),
         )
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_hospital_primary_procedures(
         self, phenotype: str, values: list = None, **kwargs
@@ -658,7 +1083,7 @@ class UKBDatabase(MySQLDatabase):
         insert = kwargs.get("insert", False)
         field = 41200
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field)
+            values = get_phenotype(phenotype).get_values_for_field(field)
         logging.info(
             f"Extracting {len(values)} values from phenotype {phenotype} with field {field}."
         )
@@ -686,12 +1111,14 @@ class UKBDatabase(MySQLDatabase):
             AND
                 ho.level = 1
             AND
-                ho.oper4 REGEXP '^(%s)' """ % (
+                %s """ % (
             phenotype,
-            "|".join(values),
+            prefix_ranges_to_sql("ho.oper4", values),
         )
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_hospital_secondary_procedures(
         self, phenotype: str, values: list = None, **kwargs
@@ -725,7 +1152,7 @@ class UKBDatabase(MySQLDatabase):
         insert = kwargs.get("insert", False)
         field = 41210
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field)
+            values = get_phenotype(phenotype).get_values_for_field(field)
 
         sql = """
           SELECT
@@ -750,12 +1177,14 @@ class UKBDatabase(MySQLDatabase):
             AND
                 ho.level = 2
             AND
-                ho.oper4 REGEXP '^(%s)' """ % (
+                %s """ % (
             phenotype,
-            "|".join(values),
+            prefix_ranges_to_sql("ho.oper4", values),
         )
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_primary_mortality(self, phenotype: str, values: list = None, **kwargs):
         """
@@ -765,7 +1194,7 @@ class UKBDatabase(MySQLDatabase):
         insert = kwargs.get("insert", False)
         field = 40001
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field)
+            values = get_phenotype(phenotype).get_values_for_field(field)
 
         sql = """
             SELECT
@@ -783,13 +1212,15 @@ class UKBDatabase(MySQLDatabase):
             AND
                 b2.level = 1
             AND
-                b2.cause_icd10 REGEXP '^(%s)'
+                %s
             """ % (
             phenotype,
-            "|".join(values),
+            prefix_ranges_to_sql("b2.cause_icd10", values),
         )
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_secondary_mortality(
         self, phenotype: str, values: list = None, **kwargs
@@ -801,7 +1232,7 @@ class UKBDatabase(MySQLDatabase):
         insert = kwargs.get("insert", False)
         field = 40002
         if not values:
-            values = Phenotype(phenotype).get_values_for_field(field)
+            values = get_phenotype(phenotype).get_values_for_field(field)
 
         sql = """
             SELECT
@@ -819,13 +1250,15 @@ class UKBDatabase(MySQLDatabase):
             AND
                 b2.level = 2
             AND
-                b2.cause_icd10 REGEXP '^(%s)'
+                %s
             """ % (
             phenotype,
-            "|".join(values),
+            prefix_ranges_to_sql("b2.cause_icd10", values),
         )
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_all_primary_care_diagnoses(self, phenotype: str, **kwargs):
         """
@@ -835,12 +1268,12 @@ class UKBDatabase(MySQLDatabase):
 
         gp_field = 42040
         insert = kwargs.get("insert", False)
-        n = 0 if insert else ()
-        phen = Phenotype(phenotype)
+        results = []
+        phen = get_phenotype(phenotype)
 
         if phen.is_biomarker:
             biomarker = BiomarkerPhenotype(phenotype)
-            n += self.extract_biomarker(biomarker, insert)
+            results.append(self.extract_biomarker(biomarker, insert))
         else:
             incident_field_values = phen.get_values_for_field(gp_field)
             logging.info(
@@ -848,8 +1281,10 @@ class UKBDatabase(MySQLDatabase):
                 for phenotype {phenotype} in field {gp_field}."""
             )
             if len(incident_field_values) > 0:
-                n += self.extract_incident_primary_care_diagnoses(
-                    phenotype=phenotype, values=incident_field_values, **kwargs
+                results.append(
+                    self.extract_incident_primary_care_diagnoses(
+                        phenotype=phenotype, values=incident_field_values, **kwargs
+                    )
                 )
 
             prevalent_field_values = phen.get_values_for_field(
@@ -860,11 +1295,13 @@ class UKBDatabase(MySQLDatabase):
                 for phenotype {phenotype} in field {gp_field}."""
             )
             if len(prevalent_field_values) > 0:
-                n += self.extract_prevalent_primary_care_diagnoses(
-                    phenotype=phenotype, values=prevalent_field_values, **kwargs
+                results.append(
+                    self.extract_prevalent_primary_care_diagnoses(
+                        phenotype=phenotype, values=prevalent_field_values, **kwargs
+                    )
                 )
 
-        return n
+        return self.combine_results(results, insert, kwargs.get("stream", False))
 
     def extract_prevalent_primary_care_diagnoses(
         self, phenotype: str, values: list, **kwargs
@@ -903,7 +1340,9 @@ class UKBDatabase(MySQLDatabase):
                 read_code IN {UKBDatabase.list_to_sql(values)};
             """
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def extract_incident_primary_care_diagnoses(
         self, phenotype: str, values: list, **kwargs
@@ -946,7 +1385,9 @@ class UKBDatabase(MySQLDatabase):
                 read_code IN {UKBDatabase.list_to_sql(values)};
             """
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def get_hospital_diagnoses_for_patients(self, eids: list):
         """
@@ -988,6 +1429,7 @@ class UKBDatabase(MySQLDatabase):
         """
 
         insert = kwargs.get("insert", False)
+        join, eventdate = self.assessment_date_sql("b2", "b1.eid", "b1.i", "b1.n")
 
         sql = """
         SELECT
@@ -995,24 +1437,25 @@ class UKBDatabase(MySQLDatabase):
             '%s' AS 'phenotype',
             '%s' AS 'field_id',
             b1.value AS field_value,
-            STR_TO_DATE(b2.value, "%%Y-%%m-%%d") AS eventdate,
+            %s AS eventdate,
             NULL as data_value
         FROM
-             baseline b1
-        LEFT OUTER JOIN baseline b2
-            ON b2.eid = b1.eid
-            AND b2.i = b1.i
-            AND b2.n = b1.n
-            AND b2.field = 53
+             %s b1
+        %s
         WHERE
             b1.field = %s
         """ % (
             phenotype,
             field_id,
+            eventdate,
+            self.baseline_table(),
+            join,
             field_id,
         )
 
-        return self.query_insert([sql], "phenotypes", insert)
+        return self.query_insert(
+            [sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
     def get_patient_cohort(self, eids: list):
         """
@@ -1024,13 +1467,13 @@ class UKBDatabase(MySQLDatabase):
             eids (list) : list of eids
         """
 
-        sql = f"""
+        sql = """
         SELECT *
         FROM baseline_cohort b
-        WHERE b.eid IN {UKBDatabase.list_to_sql(eids)}
+        WHERE {eids}
         """
 
-        return self.query(sql, eids).fetchall()
+        return self.query_eids(sql, eids, column="b.eid")
 
     def extract_biomarker_ehr(
         self, pheno_tag: str, serum_codes: list, plasma_codes: list, **kwargs
@@ -1089,7 +1532,9 @@ class UKBDatabase(MySQLDatabase):
         plasma_sql = sql_struct % (pheno_tag + "_plasma", plasma_place, null_mmol_units)
         serum_sql = sql_struct % (pheno_tag + "_serum", serum_place, null_mmol_units)
 
-        return self.query_insert([plasma_sql, serum_sql], "phenotypes", insert)
+        return self.query_insert(
+            [plasma_sql, serum_sql], "phenotypes", insert, kwargs.get("stream", False)
+        )
 
 
     def extract_diagnosis_entries(self, phenotype: str, test_dir: str = None):
@@ -1117,10 +1562,10 @@ class UKBDatabase(MySQLDatabase):
         # Extract phenotype name from metadata - this is just needed to work w existing db fxns
         # call Phenotype to explore YAML
         if test_dir is None:
-            pheno = Phenotype(phenotype)
+            pheno = get_phenotype(phenotype)
         # in a temporary folder for testing
         else:
-            pheno = Phenotype(phenotype, input_dir=test_dir)
+            pheno = get_phenotype(phenotype, input_dir=test_dir)
         phenotype_name = pheno.metadata["variable_name"]
         phenotype_definition_fields = pheno.get_definition_fields()
         for f in phenotype_definition_fields:
@@ -1333,28 +1778,29 @@ class UKBDatabase(MySQLDatabase):
 
         return diagnosis_entries
 
-    def insert_from_df(self, df: pd.DataFrame, table_name: str):
+    def insert_from_df(
+        self,
+        df: pd.DataFrame,
+        table_name: str,
+        method: str = "executemany",
+        chunk_size: int = 10000,
+    ):
         """
         Inserts entries from a pandas DataFrame `df` into a table `table_name`.
         `df` must have the same columns as the table.
 
+        Rows are loaded in chunks of `chunk_size` using parameterized
+        INSERTs (method='executemany') or LOAD DATA LOCAL INFILE
+        (method='infile'). Missing values are stored as NULL.
+
         This is useful for ComplexPhenotypes which undergo processing in Python
         """
 
         if len(df) == 0:
             logging.error("Empty dataframe can't be loaded into table")
             return None
-        sql = f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES "
-        for i in range(len(df)):
-            if i != 0:
-                sql += ", "
-            sql += (
-                "("
-                + ", ".join([f"'{x}'" if x is not None else "NULL" for x in df.iloc[i]])
-                + ")"
-            )
-        sql += ";"
-        return self.query(sql).rowcount
+
+        return self.bulk_insert(table_name, df, method=method, chunk_size=chunk_size)
 
     def get_baseline_cohort_eids(self):
         """
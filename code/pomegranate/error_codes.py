@@ -10,5 +10,8 @@ class ErrorCode(Enum):
     """
 
     DB_CONNECTION_FAILED = auto()
+    DB_POOL_EXHAUSTED = auto()
     NO_ACTION_SPECIFIED = auto()
     PHENOTYPE_NOT_FOUND = auto()
+    TABLE_VALIDATION_FAILED = auto()
+    TABLE_NOT_FOUND = auto()
@@ -1,8 +1,14 @@
 """ A module to abstract phenotypes. """
 
+import hashlib
+import json
 import pkg_resources
 from yaml import load, dump
 import os
+import re
+import threading
+from collections import OrderedDict
+from functools import cached_property
 
 try:
     from yaml import CLoader as Loader, CDumper as Dumper
@@ -16,6 +22,11 @@ from pomegranate.error_codes import ErrorCode
 from pomegranate.phenotype_config import CODE_FIELDS
 from pomegranate.etl_config import STANDARD_FIELDS
 
+PHENOTYPE_CACHE_SIZE = 512
+
+# Start of the top-level `definitions` block in a YAML file.
+DEFINITIONS_RE = re.compile(r"^definitions:", re.MULTILINE)
+
 
 class Phenotype:
     """
@@ -23,34 +34,91 @@ class Phenotype:
     functions for introspecting phenotypes.
     """
 
-    def __init__(self, phenotype: str, input_dir=None, db_str: str = 'ukbiobank'):
-        """Create a new object."""
-        # TODO: Add docstrings
+    def __init__(
+        self,
+        phenotype: str,
+        input_dir=None,
+        db_str: str = 'ukbiobank',
+        metadata_only: bool = False,
+    ):
+        """
+        Create a new object.
 
-        assert db_str in ['ukbiobank', 'genesandhealth']
+        Code tables, prescriptions and flags are computed on first
+        access. With metadata_only=True the `definitions` block of
+        the YAML file is only parsed when it is first accessed.
+        """
 
-        if input_dir is None:
-            self.file = pkg_resources.resource_filename(
-                "pomegranate.data", f"phenotypes/{db_str}/{phenotype}.yaml"
-            )
-        # for testing
-        else:
-            self.file = os.path.join(input_dir, f'{phenotype}.yaml')
+        self.file = Phenotype.get_file(phenotype, input_dir, db_str)
 
         try:
             with open(self.file, "r") as f:
-                self.yaml = load(f, Loader=Loader)
+                text = f.read()
         except FileNotFoundError as e:
             not_found_exception = GenericException(ErrorCode.PHENOTYPE_NOT_FOUND, e)
             raise not_found_exception
 
+        self.yaml = None
+        if metadata_only:
+            match = DEFINITIONS_RE.search(text)
+            if match is not None:
+                self.yaml = load(text[:match.start()], Loader=Loader)
+                if not isinstance(self.yaml, dict) or 'metadata' not in self.yaml:
+                    self.yaml = None
+        if self.yaml is None:
+            self.yaml = load(text, Loader=Loader)
+
         for k in self.yaml.keys():
             setattr(self, k, self.yaml[k])
         self.name = self.metadata['variable_name']
 
-        self.prescriptions = self.init_prescriptions()
-        self.is_cancer, self.is_biomarker, self.is_complex = self.init_flags()
-        self.codes_df = self.get_codes_df()
+    @cached_property
+    def definitions(self) -> dict:
+        """
+        Field definitions, parsed on first access when the
+        object was created with metadata_only=True.
+        """
+
+        with open(self.file, "r") as f:
+            self.yaml = load(f, Loader=Loader)
+
+        return self.yaml['definitions']
+
+    @cached_property
+    def prescriptions(self) -> dict:
+        return self.init_prescriptions()
+
+    @cached_property
+    def codes_df(self) -> pd.DataFrame:
+        return self.get_codes_df()
+
+    @cached_property
+    def is_cancer(self) -> bool:
+        return self.init_flags()[0]
+
+    @cached_property
+    def is_biomarker(self) -> bool:
+        return self.init_flags()[1]
+
+    @cached_property
+    def is_complex(self) -> bool:
+        return self.init_flags()[2]
+
+    @staticmethod
+    def get_file(phenotype: str, input_dir=None, db_str: str = 'ukbiobank') -> str:
+        """
+        Returns the path of the YAML definition file of a phenotype.
+        """
+
+        assert db_str in ['ukbiobank', 'genesandhealth']
+
+        if input_dir is None:
+            return pkg_resources.resource_filename(
+                "pomegranate.data", f"phenotypes/{db_str}/{phenotype}.yaml"
+            )
+        # for testing
+        else:
+            return os.path.join(input_dir, f'{phenotype}.yaml')
 
     def get_codes_df(self):
         columns = list(CODE_FIELDS.keys())
@@ -147,6 +215,26 @@ class Phenotype:
 
         return self.definitions[field_id]
 
+    def get_field_hash(self, field_id) -> str:
+        """
+        Returns a SHA-256 digest of the definition of a field
+        (codes and field metadata), used to detect definitions
+        which changed since they were last extracted.
+        """
+
+        if field_id not in ["SNOMED-CT", 'baseline_fields']:
+            field_id = int(field_id)
+
+        definition = {
+            "phenotype": self.name,
+            "field_id": field_id,
+            "is_biomarker": self.is_biomarker,
+            "definition": self.definitions.get(field_id),
+        }
+        text = json.dumps(definition, sort_keys=True, default=str)
+
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
     def get_metadata(self) -> dict:
         """
         Returns metadata information for the phenotype.
@@ -174,18 +262,9 @@ class Phenotype:
         field_definition = self.definitions[field_id]
         field_values = field_definition["values"]
 
-        values = [x["code"] for x in field_values if x["type"] == type]
-
-        # For primary care diagnoses, we keep the
-        # first five characters of the Read code.
-        # For everything else, we remove any dot
-        # characters.
-        # For example, ICD-10 I44.0 -> I440
-
-        if field_id == 42040:
-            values = [x[0:5] for x in values]
-        else:
-            values = [x.replace(".", "") for x in values]
+        values = [
+            normalise_code(x["code"], field_id) for x in field_values if x["type"] == type
+        ]
 
         return values
 
@@ -223,3 +302,127 @@ class Phenotype:
             return bnf_v, dmd_v, read_v
         else:
             return None
+
+
+def normalise_code(code: str, field_id) -> str:
+    """
+    Returns a code in the form it is stored in the source tables.
+
+    For primary care diagnoses, we keep the
+    first five characters of the Read code.
+    For everything else, we remove any dot
+    characters.
+    For example, ICD-10 I44.0 -> I440
+    """
+
+    if field_id == 42040:
+        return code[0:5]
+
+    return code.replace(".", "")
+
+
+class PhenotypeRegistry:
+    """
+    Least-recently-used cache of parsed phenotypes.
+
+    Entries are keyed by phenotype name and location and are
+    re-parsed when the modification time or size of the YAML
+    file changes.
+    """
+
+    def __init__(self, maxsize: int = PHENOTYPE_CACHE_SIZE) -> None:
+        """
+        Creates a new, empty registry.
+        """
+
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        phenotype: str,
+        input_dir=None,
+        db_str: str = 'ukbiobank',
+        metadata_only: bool = False,
+    ) -> Phenotype:
+        """
+        Returns the Phenotype object for `phenotype`, parsing the
+        YAML file only if it is not cached or has changed.
+
+        metadata_only is passed on to Phenotype when the file is
+        parsed; cached objects load their definitions on demand
+        either way.
+        """
+
+        key = (phenotype, input_dir, db_str)
+        file = Phenotype.get_file(phenotype, input_dir, db_str)
+        try:
+            stat = os.stat(file)
+        except FileNotFoundError as e:
+            raise GenericException(ErrorCode.PHENOTYPE_NOT_FOUND, e)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == version:
+                self._cache.move_to_end(key)
+                return entry[1]
+
+        obj = Phenotype(
+            phenotype, input_dir=input_dir, db_str=db_str, metadata_only=metadata_only
+        )
+
+        with self._lock:
+            self._cache[key] = (version, obj)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+        return obj
+
+    def invalidate(self, phenotype: str = None):
+        """
+        Removes `phenotype` (all locations) from the cache, or
+        empties the cache if no phenotype is given.
+        """
+
+        with self._lock:
+            if phenotype is None:
+                self._cache.clear()
+                return
+            for key in [k for k in self._cache if k[0] == phenotype]:
+                del self._cache[key]
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+REGISTRY = PhenotypeRegistry()
+
+
+def get_phenotype(
+    phenotype: str,
+    input_dir=None,
+    db_str: str = 'ukbiobank',
+    metadata_only: bool = False,
+) -> Phenotype:
+    """
+    Returns a Phenotype from the process-wide registry.
+
+    The returned object is shared between callers and
+    must not be modified.
+    """
+
+    return REGISTRY.get(
+        phenotype, input_dir=input_dir, db_str=db_str, metadata_only=metadata_only
+    )
+
+
+def invalidate_phenotype(phenotype: str = None):
+    """
+    Removes a phenotype (or all phenotypes) from the
+    process-wide registry.
+    """
+
+    REGISTRY.invalidate(phenotype)
@@ -1,19 +1,32 @@
 """ Script to load UK Biobank baseline to MySQL. """
 
 import argparse
-import MySQLdb
 import csv
-from tqdm import tqdm
+import logging
 import os
 
+from tqdm import tqdm
+
+from pomegranate.db.bulk_loader import bulk_insert, iter_chunks
+from pomegranate.db.db_config import DB_TABLES
+from pomegranate.db.ukbdb import UKBDatabase
+from pomegranate.db.raw_loader import bulk_load_session, get_add_indexes_sql, split_schema
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)-8s %(message)s',
+    datefmt='%m-%d-%Y %H:%M'
+)
+
 # Parse arguments
 argparser = argparse.ArgumentParser()
 argparser.add_argument('-input', type=str, required=True)
+argparser.add_argument('-chunk-size', type=int, default=1000000, required=False)
 args = argparser.parse_args()
 
 # Setup DB connection
 db_host = os.getenv('POMEGRANATE_DEVEL_DB_HOST')
-db_port = int(os.getenv('POMEGRANATE_DEVEL_DB_PORT'))
+db_port = os.getenv('POMEGRANATE_DEVEL_DB_PORT')
 db_dbname = os.getenv('POMEGRANATE_DEVEL_DB_DB')
 db_username = os.getenv('POMEGRANATE_DEVEL_DB_USERNAME')
 db_password = os.getenv('POMEGRANATE_DEVEL_DB_PASSWD')
@@ -43,56 +56,64 @@ def infer_field_info(field_name):
     return [int(field_id), int(field_instance), int(field_n)]
 
 
-if __name__ == "__main__":
-
-    # Connect to database
-    db_connection = MySQLdb.connect(
-        host=db_host,
-        user=db_username,
-        passwd=db_password,
-        port=db_port,
-        db=db_dbname)
-
-    with db_connection.cursor() as c:
+def iter_baseline_rows(file):
+    """
+    Yields the (eid, field, i, n, value) rows of the wide
+    baseline file, skipping missing values.
+    """
 
-        # Load data
-        with open(args.input, mode='r') as f:
-            reader = csv.reader(f)
+    with open(file, mode='r') as f:
+        reader = csv.reader(f)
 
-            n = 0
-            file_columns = []
-            rows_to_insert = []
+        # Parse the column names once.
+        file_columns = [infer_field_info(c) for c in next(reader)[1:]]
 
-            for row in tqdm(reader):
+        for row in tqdm(reader):
+            eid = int(row[0])
+            for column_value, field_info in zip(row[1:], file_columns):
 
-                # First row of file, store
-                # column names and skip.
-                if row[0] == 'eid':
-                    file_columns = row
+                # Skip column if value is empty or is missing
+                if column_value == '' or column_value is None:
                     continue
 
-                for y, column_value in enumerate(row[1:]):
-
-                    # Skip column if value is empty or is missing
-                    if column_value == '' or column_value is None:
-                        continue
-
-                    # Process column
-                    column_name = file_columns[y + 1]
-                    field_id, field_instance, field_n = infer_field_info(column_name)
+                yield (eid, *field_info, column_value)
 
-                    # Insert records
-                    row_to_insert = (int(row[0]), field_id, field_instance, field_n, column_value)
-                    rows_to_insert.append(row_to_insert)
 
-                    if len(rows_to_insert) == 1000:
-                        c.executemany('INSERT INTO baseline VALUES (%s, %s, %s, %s, %s)', rows_to_insert)
-                        rows_to_insert = []
-                        continue
-
-            # Flush remaining records
-            c.executemany('INSERT INTO baseline VALUES (%s, %s, %s, %s, %s)', rows_to_insert)
+if __name__ == "__main__":
 
-        db_connection.commit()
+    table_sql, indexes = split_schema(DB_TABLES['baseline'])
 
-    db_connection.close()
+    with UKBDatabase(
+        host=db_host,
+        port=int(db_port),
+        db=db_dbname,
+        username=db_username,
+        passwd=db_password,
+        local_infile=True,
+    ) as db:
+
+        # Create the table without its index, which is
+        # built once all rows are loaded.
+        db.execute_multiple(table_sql)
+
+        # Commit after each chunk to keep transactions small.
+        n = 0
+        with bulk_load_session(db):
+            rows = iter_baseline_rows(args.input)
+            for chunk in iter_chunks(rows, args.chunk_size):
+                bulk_insert(
+                    db,
+                    'baseline',
+                    chunk,
+                    columns=['eid', 'field', 'i', 'n', 'value'],
+                    method='infile',
+                    chunk_size=args.chunk_size,
+                )
+                db.commit()
+                n += len(chunk)
+
+        logging.info("Building index.")
+        db.query(get_add_indexes_sql('baseline', indexes))
+
+        db.record_source_version('baseline', os.path.basename(args.input), n)
+        db.commit()
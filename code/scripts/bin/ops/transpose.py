@@ -1,50 +1,55 @@
 """
-Transpose the UK Biobank baseline file from wide to long format.
+Transpose the UK Biobank baseline file from wide to long format
+(see pomegranate.db.transpose).
+
+Run like python transpose.py -input ukb.csv -output baseline.csv
+Or to keep only the fields used by the phenotype catalogue and the
+baseline cohort, and write Parquet with 16 processes:
+python transpose.py -input ukb.csv -output baseline -format parquet
+-catalogue-fields -workers 16
 
 Note: in order to save space, this script will not output
 rows where the value is missing.
 
 """
 
-import csv
 import argparse
-from tqdm import tqdm
-import gzip
+import logging
+
+from pomegranate.catalogue import Catalogue
+from pomegranate.db.db_config import BASELINE_COHORT_FIELDS
+from pomegranate.db.transpose import TRANSPOSE_FORMATS, transpose_baseline
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)-8s %(message)s',
+    datefmt='%m-%d-%Y %H:%M'
+)
 
 argparser = argparse.ArgumentParser()
-argparser.add_argument('-input', type=str)
-argparser.add_argument('-output', type=str)
+argparser.add_argument('-input', type=str, required=True)
+argparser.add_argument('-output', type=str, required=True)
+argparser.add_argument('-format', type=str, choices=TRANSPOSE_FORMATS, default='gzip')
+argparser.add_argument('-workers', type=int, default=None)
+argparser.add_argument('-fields', type=int, nargs='+', default=None)
+argparser.add_argument('-catalogue-fields', action='store_true')
 args = argparser.parse_args()
 
-finput = args.input
-foutput = args.output + ".gz"
-
-with open(finput, errors='ignore', encoding="utf-8") as csv_input:
-    csv_reader = csv.reader(csv_input, delimiter=",")
-    line = 0
-
-    with gzip.open(foutput, 'wt', encoding="utf-8") as csv_output:
-        csv_writer = csv.writer(csv_output, delimiter=",")
-
-        for row in tqdm(csv_reader, total=5000000):
-            if line == 0:
-                cols = row
-                csv_writer.writerow(['eid', 'field', 'i', 'n', 'value'])
-            else:
-                eid = row[0]
-                # Skip fields where the value is missing to save space
-                for i, col_value in enumerate(row[1:]):
-                    if col_value == '' or col_value is None:
-                        continue
-                    col_name = cols[i+1]
-                    try:
-                        field_id, instance = col_name.split('.')[0].split('-')
-                    except ValueError:
-                        field_id = col_name.split('-')[0]
-                        instance = 0
-                        n = 0
-
-                    n = col_name.split('.')[1]
-                    csv_writer.writerow([eid, field_id, instance, n, col_value])
-
-            line += 1
+
+if __name__ == "__main__":
+
+    fields = None
+    if args.fields is not None or args.catalogue_fields:
+        fields = set(args.fields or [])
+        if args.catalogue_fields:
+            # Fields of the phenotype definitions, plus
+            # those used to build the baseline cohort.
+            fields |= Catalogue().get_field_ids()
+            fields |= {field for field, _, _ in BASELINE_COHORT_FIELDS}
+        logging.info(f"Keeping {len(fields)} fields.")
+
+    output = args.output
+    if args.format == 'gzip':
+        output += ".gz"
+
+    transpose_baseline(args.input, output, args.format, fields, args.workers)
@@ -1,38 +1,59 @@
-""" Script to create and populate the `phenotype_first` table. """
+"""
+Script to create and populate the `phenotype_first` table.
 
-from pomegranate.db.schemas.phenotype_first import SCHEMA_PHENOTYPE_FIRST
-from pomegranate.db.schemas.phenotype_first import INDEX_PHENOTYPE_FIRST
-from pomegranate.db.schemas.phenotype_first import POST_CREATE_PHENOTYPE_FIRST
-from pomegranate.db.schemas.cohort_phenotype_first import SCHEMA_COHORT_PHENOTYPE_FIRST_INDEX
+Run like python define_first_events.py to rebuild the whole table.
+Or to only recompute some phenotypes:
+python define_first_events.py -p asthma copd
+Or to recompute the phenotypes extracted since the last build:
+python define_first_events.py --changed
+"""
 
-from pomegranate.analytics.cohort_maker import extract_population
-from pomegranate.etl_config import NAME_COHORT_EVENTS
+import argparse
+import logging
+
+from pomegranate.db.first_events import build_phenotype_first, get_changed_phenotypes
 from pomegranate.db.ukbdb import UKBDatabase
 
-import pandas as pd 
-import logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)-8s %(message)s',
-    datefmt='%m-%d-%Y %H:%M'
-)
-
-Database = UKBDatabase()
-
-logging.info(f"Identifying first events.")
-
-try:
-    Database.drop_table_if_exists('phenotype_first')
-    n = Database.query(SCHEMA_PHENOTYPE_FIRST).rowcount
-    logging.info(f"\tIdentified {n} events.")
-    Database.query(INDEX_PHENOTYPE_FIRST)
-    logging.info(f"\tGenerating index.")
-    Database.query(POST_CREATE_PHENOTYPE_FIRST)
-    logging.info(f"\tPost-processing complete.")
-except Exception as e:
-    print(f"Failed to identify first events: {e}")
-finally:
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(message)s",
+        datefmt="%m-%d-%Y %H:%M",
+    )
+
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "-p",
+        "--phenotypes",
+        nargs="+",
+        required=False,
+        help="Phenotypes to recompute (default: all)",
+    )
+    argparser.add_argument(
+        "--changed",
+        action="store_true",
+        required=False,
+        help="Only recomputes the phenotypes extracted since the last build.",
+    )
+
+    args = argparser.parse_args()
+
+    with UKBDatabase() as db:
+        phenotypes = args.phenotypes
+        if args.changed:
+            phenotypes = get_changed_phenotypes(db)
+            if phenotypes is None:
+                logging.info("No previous build recorded, rebuilding all phenotypes.")
+            elif len(phenotypes) == 0:
+                logging.info("No phenotypes extracted since the last build.")
+                return
+
+        logging.info("Identifying first events.")
+        n = build_phenotype_first(db, phenotypes)
+
     logging.info(f"Wrote {n} events.")
 
 
+if __name__ == "__main__":
+    main()
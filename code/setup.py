@@ -22,10 +22,17 @@ setup(
     entry_points = {
         'console_scripts': [
             'build_yaml = pomegranate.cli.build_yaml:main',
+            'build_catalogue = pomegranate.cli.build_catalogue:main',
             # ETL:
             'extract_phenotype = pomegranate.cli.etl.extract_phenotype:main',
             'extract_complex_phenotype = pomegranate.cli.etl.extract_complex_phenotype:main',
             'extract_exacerbations = pomegranate.cli.etl.extract_exacerbations:main',
+            'ingest_delta = pomegranate.cli.etl.ingest_delta:main',
+            'purge_participants = pomegranate.cli.etl.purge_participants:main',
+            'export_parquet = pomegranate.cli.etl.export_parquet:main',
+            'load_duckdb = pomegranate.cli.etl.load_duckdb:main',
+            'load_tables = pomegranate.cli.etl.load_tables:main',
+            'rebuild_tables = pomegranate.cli.etl.rebuild_tables:main',
 
         ],
     },
@@ -0,0 +1,36 @@
+""" Tests for the bulk loader module. """
+
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from pomegranate.db.bulk_loader import iter_chunks
+from pomegranate.db.bulk_loader import iter_rows
+from pomegranate.db.bulk_loader import to_tsv_field
+
+
+def test_iter_rows_nulls_and_dates():
+    df = pd.DataFrame({
+        'eid': [1, 2],
+        'eventdate': pd.to_datetime(['2020-01-02', None]),
+        'data_value': [1.5, np.nan],
+        'field_value': ['I440', None],
+    })
+    rows = list(iter_rows(df))
+    assert rows[0] == (1, datetime(2020, 1, 2), 1.5, 'I440')
+    assert rows[1] == (2, None, None, None)
+    assert type(rows[0][0]) is int
+
+
+def test_tsv_field():
+    assert to_tsv_field(None) == '\\N'
+    assert to_tsv_field(float('nan')) == '\\N'
+    assert to_tsv_field(date(1900, 1, 1)) == '1900-01-01'
+    assert to_tsv_field("a\tb\\c\nd") == 'a\\tb\\\\c\\nd'
+    assert to_tsv_field(np.int64(3)) == '3'
+
+
+def test_chunks():
+    assert list(iter_chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_chunks([], 2)) == []
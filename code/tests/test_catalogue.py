@@ -0,0 +1,31 @@
+""" Tests for the catalogue snapshot. """
+
+import pomegranate.catalogue
+from pomegranate.catalogue import build_snapshot, load_snapshot, read_catalogue_rows
+
+
+def test_snapshot_roundtrip(tmp_path):
+    snapshot_file = str(tmp_path / "catalogue.pkl")
+    build_snapshot(snapshot_file)
+
+    assert load_snapshot(snapshot_file) == read_catalogue_rows()
+
+
+def test_snapshot_stale(tmp_path, monkeypatch):
+    snapshot_file = str(tmp_path / "catalogue.pkl")
+    build_snapshot(snapshot_file)
+
+    monkeypatch.setattr(pomegranate.catalogue, "get_catalogue_hash", lambda: "changed")
+    assert load_snapshot(snapshot_file) is None
+
+
+def test_snapshot_missing(tmp_path):
+    assert load_snapshot(str(tmp_path / "missing.pkl")) is None
+
+
+def test_snapshot_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pomegranate.catalogue, "CACHE_DIR", str(tmp_path / "cache"))
+    assert load_snapshot() is None
+
+    assert build_snapshot() == str(tmp_path / "cache" / "ukbiobank_catalogue.pkl")
+    assert load_snapshot() == read_catalogue_rows()
@@ -0,0 +1,25 @@
+""" Tests for the code -> phenotype index. """
+
+from pomegranate.code_index import CodeIndex
+
+
+def test_lookup():
+    index = CodeIndex.from_phenotypes(['asthma', 'av_block_1', 'av_block_2'])
+
+    df = index.lookup('I44.0')
+    assert set(df['phenotype']) == {'av_block_1'}
+    assert sorted(df['field']) == [40001, 40002, 41202, 41204]
+
+    assert index.get_phenotypes('I44', prefix=True) == ['av_block_1', 'av_block_2']
+    assert index.get_phenotypes('I44') == []
+
+    assert list(index.lookup('14B4.', 42040)['phenotype']) == ['asthma']
+    assert len(index.lookup('I440', 42040)) == 0
+
+
+def test_covering():
+    index = CodeIndex.from_phenotypes(['av_block_1'])
+
+    df = index.covering('I4400', 41202)
+    assert list(df['code']) == ['I440']
+    assert len(index.covering('I45', 41202)) == 0
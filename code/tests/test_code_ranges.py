@@ -0,0 +1,60 @@
+""" Tests for the code prefix range module. """
+
+import duckdb
+
+from pomegranate.db.code_ranges import collapse_prefixes
+from pomegranate.db.code_ranges import prefix_successor
+from pomegranate.db.code_ranges import prefix_ranges
+from pomegranate.db.code_ranges import prefix_ranges_to_sql
+
+
+def test_successor():
+    assert prefix_successor('I44') == 'I45'
+    assert prefix_successor('C9') == 'C:'
+    assert prefix_successor('') is None
+
+
+def test_ranges_merge_and_dedup():
+    assert prefix_ranges(['I45', 'I44', 'I441', 'I44']) == [('I44', 'I46')]
+    assert prefix_ranges(['I4', 'I44', 'J45']) == [('I4', 'I5'), ('J45', 'J46')]
+    assert prefix_ranges([]) == []
+    assert prefix_ranges(['', 'I44']) == [('', None)]
+
+
+def test_ranges_match_like_regexp():
+    prefixes = ['I44', 'I45', 'I470', 'K7']
+    codes = ['I44', 'I440', 'I459', 'I46', 'I470', 'I471', 'K70', 'K8', 'I4']
+    ranges = prefix_ranges(prefixes)
+    for code in codes:
+        expected = any(code.startswith(p) for p in prefixes)
+        assert any(low <= code < high for low, high in ranges) == expected
+
+
+def test_collapse():
+    assert collapse_prefixes(['I45', 'I44', 'I441', 'I44']) == ['I44', 'I45']
+    assert collapse_prefixes(['', 'I44']) == ['']
+
+
+def test_sql():
+    assert prefix_ranges_to_sql('c', ['I44', 'I45', 'I441']) == (
+        "(c LIKE 'I44%' OR c LIKE 'I45%')"
+    )
+    assert prefix_ranges_to_sql('c', ['A_1']) == "(c LIKE 'A!_1%' ESCAPE '!')"
+    assert prefix_ranges_to_sql('c', []) == "(1 = 0)"
+
+
+def test_sql_collation():
+    # In linguistic collations (as MySQL's utf8mb4_0900_ai_ci)
+    # ':' and '[' sort before digits and letters, so the ranges
+    # ending in 'C:' or '[' would be empty.
+    db = duckdb.connect()
+    db.execute("CREATE TABLE t (c VARCHAR COLLATE en_us)")
+    codes = ['C9', 'C90', 'C91', 'C8', 'Z00', 'Z999', 'Y99', 'A_1', 'AB1']
+    db.execute("INSERT INTO t VALUES " + ", ".join(f"('{c}')" for c in codes))
+
+    prefixes = ['C9', 'Z', 'A_']
+    sql = f"SELECT c FROM t WHERE {prefix_ranges_to_sql('c', prefixes)} ORDER BY c"
+
+    assert [c for c, in db.execute(sql).fetchall()] == sorted(
+        c for c in codes if any(c.startswith(p) for p in prefixes)
+    )
@@ -0,0 +1,49 @@
+""" Tests for the Parquet export. """
+
+import datetime
+
+import pandas as pd
+
+from pomegranate.db.columnar import read_phenotype_first, read_table, write_table
+
+
+def get_phenotype_first_df():
+    return pd.DataFrame(
+        {
+            "eid": [1, 1, 2, 3],
+            "phenotype": ["asthma", "asthma", "copd", "asthma"],
+            "field_id": [41270, 42040, 41270, 20002],
+            "field_id_label": [
+                "ehr_hospital",
+                "ehr_primary_care",
+                "ehr_hospital",
+                "selfreport",
+            ],
+            "eventdate": [
+                datetime.date(2001, 1, 1),
+                datetime.date(1999, 5, 1),
+                None,
+                datetime.date(2010, 3, 4),
+            ],
+        }
+    )
+
+
+def test_phenotype_first_roundtrip(tmp_path):
+    df = get_phenotype_first_df()
+    assert write_table([df.iloc[:2], df.iloc[2:]], "phenotype_first", str(tmp_path)) == 4
+
+    result = read_table("phenotype_first", str(tmp_path), columns=list(df.columns))
+    result = result.sort_values(["eid", "field_id"]).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(result, df, check_dtype=False)
+
+
+def test_read_phenotype_first_filters(tmp_path):
+    write_table([get_phenotype_first_df()], "phenotype_first", str(tmp_path))
+
+    result = read_phenotype_first(str(tmp_path), "asthma", fields=[41270, 20002])
+
+    assert list(result.columns) == ["eid", "phenotype", "eventdate", "field_id"]
+    assert sorted(result.eid) == [1, 3]
+    assert set(result.phenotype) == {"asthma"}
@@ -0,0 +1,75 @@
+""" Tests for the date functions. """
+
+import numpy as np
+import pandas as pd
+
+import pomegranate.dates
+from pomegranate.dates import _first_events, get_phenotype_first
+
+
+def test_first_events():
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame(
+        {
+            "eid": rng.integers(1, 50, n),
+            "phenotype": rng.choice(["asthma", "copd", "AAA"], n),
+            # Few distinct dates, so that there are equal dates.
+            "eventdate": pd.to_datetime("2000-01-01")
+            + pd.to_timedelta(rng.integers(0, 20, n), unit="D"),
+            "field_id": rng.integers(0, 1000, n),
+        }
+    )
+
+    expected = df.loc[df.groupby(["eid", "phenotype"])["eventdate"].idxmin()]
+    pd.testing.assert_frame_equal(_first_events(df), expected)
+
+    # Reducing in chunks, the first events so far first, gives the same rows.
+    first = _first_events(df.iloc[:700])
+    first = _first_events(pd.concat([first, df.iloc[700:]]))
+    pd.testing.assert_frame_equal(first, expected)
+
+
+def test_phenotype_first_chunks(monkeypatch):
+    rng = np.random.default_rng(1)
+    n = 500
+    rows = [
+        (int(eid), phenotype, f"2000-01-{day:02d}", int(field_id))
+        for eid, phenotype, day, field_id in zip(
+            rng.integers(1, 30, n),
+            rng.choice(["asthma", "copd"], n),
+            rng.integers(1, 10, n),
+            rng.integers(0, 1000, n),
+        )
+    ]
+
+    class FakeDatabase:
+        def __init__(self, **kwargs):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def query(self, sql):
+            class Cursor:
+                def fetchall(self):
+                    return rows
+            return Cursor()
+
+        def query_stream(self, sql, chunk_size):
+            for i in range(0, len(rows), chunk_size):
+                yield rows[i:i + chunk_size]
+
+    monkeypatch.setattr(pomegranate.dates, "UKBDatabase", FakeDatabase)
+
+    # Streaming in chunks returns the same frame, index included.
+    for first_only in [True, False]:
+        expected = get_phenotype_first(first_only=first_only)
+        for chunk_size in [1, 70, n]:
+            pd.testing.assert_frame_equal(
+                get_phenotype_first(first_only=first_only, chunk_size=chunk_size),
+                expected,
+            )
@@ -0,0 +1,207 @@
+""" Tests for the DuckDB extraction backend. """
+
+import datetime
+import gzip
+
+import pytest
+
+import pomegranate.db.first_events as first_events
+from pomegranate.db.duckdb_backend import (
+    DuckDBDatabase,
+    create_table,
+    load_raw_tables,
+    translate_sql,
+)
+from pomegranate.db.schemas.participant_constants import SCHEMA_PARTICIPANT_CONSTANTS
+
+
+def write_raw(path, columns, rows, delimiter="\t"):
+    with gzip.open(path, "wt") if str(path).endswith(".gz") else open(path, "w") as f:
+        f.write(delimiter.join(columns) + "\n")
+        for row in rows:
+            f.write(delimiter.join(row.get(c, "") for c in columns) + "\n")
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DuckDBDatabase()
+
+    write_raw(
+        tmp_path / "baseline.csv.gz",
+        ["eid", "field", "i", "n", "value"],
+        [
+            {"eid": "1", "field": "34", "i": "0", "n": "0", "value": "1950"},
+            {"eid": "1", "field": "20002", "i": "0", "n": "0", "value": "1065"},
+            {"eid": "1", "field": "20008", "i": "0", "n": "0", "value": "2001.5"},
+            {"eid": "2", "field": "20002", "i": "0", "n": "0", "value": "1065"},
+            {"eid": "2", "field": "20008", "i": "0", "n": "0", "value": "-1"},
+        ],
+        delimiter=",",
+    )
+
+    columns = {}
+    for table in ["hesin", "hesin_diag", "gp_clinical"]:
+        create_table(db, table)
+        columns[table] = db.get_column_names("main", table)
+
+    write_raw(
+        tmp_path / "hesin.txt",
+        columns["hesin"],
+        [
+            {"eid": "1", "ins_index": "0", "epistart": "02/03/2010"},
+            {"eid": "2", "ins_index": "0", "admidate": "05/06/2011"},
+        ],
+    )
+    write_raw(
+        tmp_path / "hesin_diag.txt",
+        columns["hesin_diag"],
+        [
+            {"eid": "1", "ins_index": "0", "arr_index": "0", "level": "1", "diag_icd10": "I441"},
+            {"eid": "2", "ins_index": "0", "arr_index": "0", "level": "2", "diag_icd10": "I10"},
+        ],
+    )
+    write_raw(
+        tmp_path / "gp_clinical.txt",
+        columns["gp_clinical"][:-1],
+        [{"eid": "1", "data_provider": "3", "eventdate": "01/01/1902", "read_2": "C10.."}],
+    )
+
+    load_raw_tables(db, str(tmp_path))
+    yield db
+    db.disconnect()
+
+
+def test_translate_sql():
+    sql = translate_sql("""SELECT STR_TO_DATE("1900-01-01", "%Y-%m-%d") AS 'x'""")
+
+    assert sql == (
+        "SELECT CAST(TRY_STRPTIME(CAST('1900-01-01' AS VARCHAR), '%Y-%m-%d') AS DATE)"
+        " AS 'x'"
+    )
+    assert translate_sql("REPLACE INTO t VALUES (NOW())") == (
+        "INSERT OR REPLACE INTO t VALUES (LOCALTIMESTAMP)"
+    )
+
+
+def test_hospital_diagnoses(db):
+    rows = db.extract_hospital_primary_diagnoses(phenotype="test", values=["I44"])
+
+    assert rows == ((1, "test", 41202, "I441", datetime.date(2010, 3, 2), None),)
+
+
+def test_self_report_rounding(db):
+    rows = db.extract_non_cancer_self_report(phenotype="test", values=["1065"])
+
+    # Years are rounded half to even, as MySQL rounds numbers converted from text.
+    assert sorted(rows) == [
+        (1, "test", 20002, "1065", datetime.date(2002, 1, 1), None),
+        (2, "test", 20002, "1065", datetime.date(1900, 1, 1), None),
+    ]
+
+
+def test_primary_care_insert(db):
+    n = db.extract_incident_primary_care_diagnoses(
+        phenotype="test", values=["C10.."], insert=True
+    )
+
+    assert n == 1
+    assert db.get_phenotype_events_by_field([42040]) == [
+        (1, "test", 42040, "C10..", datetime.date(1950, 7, 1), None)
+    ]
+
+
+def test_typed_baseline(db):
+    db.query(
+        """
+        CREATE TABLE baseline_typed AS
+        SELECT
+            *,
+            TRY_CAST(value AS DOUBLE) AS value_num,
+            TRY_CAST(value AS DATE) AS value_date
+        FROM baseline
+        """
+    )
+    rows = db.extract_non_cancer_self_report(phenotype="test", values=["1065"])
+
+    db.set_typed_baseline()
+    assert db.baseline_table() == "baseline_typed"
+    assert db.clone().baseline_table() == "baseline_typed"
+    typed_rows = db.extract_non_cancer_self_report(phenotype="test", values=["1065"])
+    assert sorted(typed_rows) == sorted(rows)
+
+
+def test_participant_constants(db):
+    db.query(
+        """
+        INSERT INTO baseline VALUES
+            (1, 53, 0, 0, '2008-05-01'),
+            (1, 53, 1, 0, '2013-06-02'),
+            (1, 52, 0, 0, '7'),
+            (1, 20009, 0, 0, '40'),
+            (1, 30000, 1, 0, '5.1'),
+            (2, 30000, 0, 0, '6.2')
+        """
+    )
+    db.execute_multiple(SCHEMA_PARTICIPANT_CONSTANTS.format(table="participant_constants"))
+
+    def extract():
+        # The phenotype is loaded even if the values are given.
+        age = db.extract_field_value_with_age_qualifier(
+            phenotype="asthma", field_id=20002, values=["1065"], age_field_id=20009
+        )
+        biomarker = db.extract_baseline_biomarker(phenotype="test", field_id=30000)
+        assessment = db.extract_field_value_with_baseline_qualifier(
+            phenotype="test", field_id=20002, values=["1065"]
+        )
+        return sorted(age), sorted(biomarker), sorted(assessment)
+
+    rows = extract()
+    db.set_participant_constants()
+    assert db.clone().config["participant_constants"]
+    assert extract() == rows
+    assert rows[0][0][4] == datetime.date(1990, 1, 1)
+    assert rows[1] == [
+        (1, "test", "30000", "5.1", datetime.date(2013, 6, 2), None),
+        (2, "test", "30000", "6.2", None, None),
+    ]
+    assert rows[2][0][4] == datetime.date(2008, 5, 1)
+
+
+def test_query_eids(db):
+    sql = "SELECT eid, value FROM baseline WHERE field = 20008 AND {eids}"
+
+    # A single eid, chunked IN lists and a temporary table of eids.
+    assert db.query_eids(sql, ["2"]) == ((2, "-1"),)
+    assert sorted(db.query_eids(sql, [1, 2, 3], chunk_size=2)) == [(1, "2001.5"), (2, "-1")]
+    assert sorted(db.query_eids(sql, [1, 2, 3], threshold=2)) == [(1, "2001.5"), (2, "-1")]
+    assert db.query_eids(sql, []) == ()
+
+
+def test_source_version(db):
+    # Only the loads recorded in source_versions version a field.
+    version = db.get_source_version(41202)
+    assert version.startswith("hesin:hesin.txt@")
+    assert ";hesin_diag:hesin_diag.txt@" in version
+    assert db.get_source_version(40001) == "death:unrecorded;death_cause:unrecorded"
+
+    db.record_source_version("hesin_diag", "2024-06", 1)
+    assert ";hesin_diag:2024-06@" in db.get_source_version(41202)
+
+
+def test_phenotype_first_builds(db, monkeypatch):
+    monkeypatch.setattr(first_events, "_build_full", lambda db: 3)
+    db.create_extraction_manifest()
+    assert first_events.get_changed_phenotypes(db) is None
+
+    # Builds are recorded apart from the source table versions.
+    versions = db.query("SELECT * FROM source_versions").fetchall()
+    assert first_events.build_phenotype_first(db) == 3
+    assert db.query("SELECT * FROM source_versions").fetchall() == versions
+    built_at = db.query("SELECT built_at FROM table_builds").fetchall()[0][0]
+
+    db.query(
+        "INSERT INTO extraction_manifest (phenotype, field_id, extracted_at) "
+        "VALUES ('asthma', 41202, %s), ('copd', 41202, %s)",
+        [built_at - datetime.timedelta(days=1), built_at],
+    )
+    assert first_events.get_changed_phenotypes(db) == ["copd"]
@@ -0,0 +1,106 @@
+""" Tests for the cache of the participant constants. """
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import pomegranate.dates
+import pomegranate.db.participant_constants as cache
+from pomegranate.db.participant_constants import ParticipantConstants
+
+
+def test_lookup():
+    constants = ParticipantConstants(
+        pd.DataFrame(
+            {
+                "eid": [3, 1, 2],
+                "yob": [1960, 1950, None],
+                "dod": [None, datetime.date(2015, 2, 3), None],
+            }
+        )
+    )
+
+    assert constants.eids.tolist() == [1, 2, 3]
+    assert np.isnan(constants.lookup("yob", ["2", "4"])).all()
+    assert constants.lookup("dod", [1, 0, 3]).tolist() == [
+        datetime.date(2015, 2, 3),
+        None,
+        None,
+    ]
+
+    df = constants.to_frame(["yob", "dod"], eids=[3, 1, 3, 5])
+    assert df.eid.tolist() == [1, 3]
+    assert df.yob.tolist() == [1950, 1960]
+    assert df.dod.dtype == "datetime64[ns]"
+    assert df.dod.tolist()[0] == pd.Timestamp("2015-02-03")
+
+
+def test_time_since_baseline(monkeypatch):
+    constants = ParticipantConstants(
+        pd.DataFrame(
+            {
+                "eid": [1, 2],
+                "date_assessment_0": [datetime.date(2010, 1, 1), None],
+            }
+        )
+    )
+    monkeypatch.setattr(pomegranate.dates, "get_participant_constants", lambda: constants)
+
+    events = pd.DataFrame(
+        {
+            "eid": [2, 3, 1, 1],
+            "eventdate": pd.to_datetime(
+                ["2011-01-01", "2011-01-01", "2009-12-31", "2010-01-11"]
+            ),
+        }
+    )
+    df = pomegranate.dates.get_time_since_baseline(events)
+
+    assert df.eid.tolist() == [2, 1, 1]
+    assert df.time_since_baseline.tolist()[1:] == [-1, 10]
+    assert pd.isna(df.time_since_baseline[0])
+
+
+class FakeDatabase:
+    def __init__(self, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def test_cache(monkeypatch):
+    loads = []
+
+    def load(db):
+        loads.append(db)
+        return ParticipantConstants(pd.DataFrame({"eid": [len(loads)]}))
+
+    now = [1000.0]
+    monkeypatch.setattr(cache, "UKBDatabase", FakeDatabase)
+    monkeypatch.setattr(cache, "load_participant_constants", load)
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    cache.clear_participant_constants()
+
+    constants = cache.get_participant_constants()
+    assert cache.get_participant_constants() is constants
+    assert len(loads) == 1
+
+    cache.clear_participant_constants()
+    assert cache.get_participant_constants().eids.tolist() == [2]
+
+    cache.get_participant_constants(refresh=True)
+    assert len(loads) == 3
+
+    now[0] += 60
+    cache.get_participant_constants(ttl=120)
+    assert len(loads) == 3
+    now[0] += 61
+    cache.get_participant_constants(ttl=120)
+    assert len(loads) == 4
+
+    cache.clear_participant_constants()
@@ -1,7 +1,10 @@
 """ Tests for phenotype module wrapper. """
 
 import pytest
-from pomegranate.phenotype import Phenotype
+import os
+import shutil
+
+from pomegranate.phenotype import Phenotype, get_phenotype, invalidate_phenotype
 from pomegranate.exceptions import GenericException
 
 
@@ -38,3 +41,33 @@ def test_incident_prevalent():
     # Ptosis does not have any prevalent primary care diagnosis terms.
     phenotype = Phenotype('ptosis')
     assert phenotype.get_values_for_field(42040, type='prevalent') == []
+
+
+def test_get_phenotype_cached(tmp_path):
+    assert get_phenotype('asthma') is get_phenotype('asthma')
+
+    shutil.copy(Phenotype.get_file('asthma'), tmp_path / 'asthma.yaml')
+    first = get_phenotype('asthma', input_dir=str(tmp_path))
+    assert first is not get_phenotype('asthma')
+
+    # a modified file is parsed again
+    stat = os.stat(first.file)
+    os.utime(first.file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = get_phenotype('asthma', input_dir=str(tmp_path))
+    assert second is not first
+
+    invalidate_phenotype('asthma')
+    assert get_phenotype('asthma', input_dir=str(tmp_path)) is not second
+
+    with pytest.raises(GenericException):
+        get_phenotype('NOPE')
+
+
+def test_metadata_only():
+    phenotype = Phenotype('asthma', metadata_only=True)
+    assert phenotype.name == 'asthma'
+    assert 'definitions' not in phenotype.__dict__
+
+    # definitions are loaded on first access
+    assert phenotype.get_values_for_field(20002) == ['1111']
+    assert phenotype.codes_df.equals(Phenotype('asthma').codes_df)
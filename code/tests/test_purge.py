@@ -0,0 +1,111 @@
+""" Tests for the removal of withdrawn participants. """
+
+import re
+
+from pomegranate.db.mysql import MySQLDatabase
+from pomegranate.db.purge import PURGE_TABLE, purge_eids
+from pomegranate.db.ukbdb import UKBDatabase
+
+
+class FakeCursor:
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeDatabase:
+    """
+    Tables held as lists of eids, running the statements
+    issued by the purge and by `restore_previous_table`.
+    """
+
+    list_to_sql = staticmethod(UKBDatabase.list_to_sql)
+    restore_previous_table = MySQLDatabase.restore_previous_table
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.connection = FakeConnection()
+
+    def create_eid_table(self, table, eids, batch_size=None):
+        eids = sorted(set(eids))
+        self.tables[table] = [(x, i // batch_size) for i, x in enumerate(eids)]
+        return len(eids)
+
+    def table_exists(self, table):
+        return table in self.tables
+
+    def drop_table_if_exists(self, table):
+        self.tables.pop(table, None)
+
+    def query(self, sql, sql_params=None):
+        if "information_schema" in sql:
+            names = re.findall(r"'(\w+)'", sql.split("TABLE_NAME IN")[1])
+            return FakeCursor((t, 1) for t in names if t in self.tables)
+
+        match = re.match(r"\s*DELETE t FROM (\w+) t", sql)
+        if match:
+            table = match.group(1)
+            purged = {
+                eid for eid, batch in self.tables[PURGE_TABLE]
+                if sql_params is None or batch == sql_params[0]
+            }
+            before = len(self.tables[table])
+            self.tables[table] = [x for x in self.tables[table] if x not in purged]
+            return FakeCursor(rowcount=before - len(self.tables[table]))
+
+        match = re.match(r"\s*DROP (?:TEMPORARY )?TABLE IF EXISTS (\w+)", sql)
+        if match:
+            self.drop_table_if_exists(match.group(1))
+            return FakeCursor()
+
+        if "RENAME TABLE" in sql:
+            for old, new in re.findall(r"(\w+) TO (\w+)", sql):
+                self.tables[new] = self.tables.pop(old)
+            return FakeCursor()
+
+        raise NotImplementedError(sql)
+
+
+def test_purge_previous_tables():
+    db = FakeDatabase(
+        {
+            "phenotypes": [1, 2, 3],
+            "phenotype_first": [1, 2, 3],
+            "phenotype_first_old": [1, 2],
+            "hesin_diag": [2, 3],
+            "hesin_diag_staging": [2, 3, 3],
+        }
+    )
+
+    counts = purge_eids(db, [2], batch_size=1)
+    assert counts == {
+        "hesin_diag": 1,
+        "hesin_diag_staging": 1,
+        "phenotypes": 1,
+        "phenotype_first": 1,
+        "phenotype_first_old": 1,
+    }
+    assert PURGE_TABLE not in db.tables
+
+    # Rolling back to the previous version does not bring eid 2 back.
+    db.restore_previous_table("phenotype_first")
+    assert db.tables["phenotype_first"] == [1]
+    assert db.tables["phenotype_first_old"] == [1, 3]
+
+    # Purging selected tables purges their copies too.
+    counts = purge_eids(db, [3], tables=["hesin_diag"], batch_size=10)
+    assert counts == {"hesin_diag": 1, "hesin_diag_staging": 2}
@@ -0,0 +1,31 @@
+""" Tests for the raw export loader. """
+
+import gzip
+
+from pomegranate.db.raw_loader import get_add_indexes_sql, iter_file_chunks, split_schema
+from pomegranate.db.schemas.hesin_diag import SCHEMA_HESIN_DIAG
+
+
+def test_split_schema():
+    table_sql, indexes = split_schema(SCHEMA_HESIN_DIAG)
+
+    assert "CREATE INDEX" not in table_sql
+    assert "CREATE TABLE IF NOT EXISTS hesin_diag" in table_sql
+    assert get_add_indexes_sql("hesin_diag", indexes) == (
+        "ALTER TABLE hesin_diag "
+        "ADD INDEX hesr (eid, ins_index, level, diag_icd10), "
+        "ADD INDEX hesc (level, diag_icd10, eid, ins_index)"
+    )
+
+
+def test_file_chunks(tmp_path):
+    file = str(tmp_path / "baseline.csv.gz")
+    with gzip.open(file, "wt") as f:
+        f.write('eid,field,i,n,value\n1,20001,0,0,a\n1,41270,0,0,"b\nc"\n2,31,0,0,1\n')
+
+    chunks = [(open(name).read(), n) for name, n in iter_file_chunks(file, 2)]
+
+    assert chunks == [
+        ('1,20001,0,0,a\n1,41270,0,0,"b\nc"\n', 2),
+        ("2,31,0,0,1\n", 1),
+    ]
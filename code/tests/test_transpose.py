@@ -0,0 +1,36 @@
+""" Tests for the baseline transposer. """
+
+import pandas as pd
+
+from pomegranate.db.transpose import parse_field_name, parse_header, transpose_baseline
+
+
+def test_parse_field_name():
+    assert parse_field_name("20002-1.3") == (20002, 1, 3)
+    assert parse_field_name("31") == (31, 0, 0)
+
+
+def test_transpose_baseline(tmp_path):
+    wide = tmp_path / "wide.csv"
+    wide.write_text(
+        '"eid","31-0.0","20002-0.0","20002-0.1"\n'
+        '"1","0","1065",""\n'
+        '"2","","NA","1074"\n'
+        '"3","1","",""\n'
+    )
+
+    _, positions, _ = parse_header(str(wide), {20002})
+    assert positions == [2, 3]
+
+    output = str(tmp_path / "baseline.csv.gz")
+    n = transpose_baseline(str(wide), output, workers=2, num_ranges=3)
+
+    df = pd.read_csv(output, dtype=str, keep_default_na=False)
+    assert n == 5
+    assert df.values.tolist() == [
+        ["1", "31", "0", "0", "0"],
+        ["1", "20002", "0", "0", "1065"],
+        ["2", "20002", "0", "0", "NA"],
+        ["2", "20002", "0", "1", "1074"],
+        ["3", "31", "0", "0", "1"],
+    ]